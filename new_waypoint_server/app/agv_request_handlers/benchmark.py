@@ -0,0 +1,255 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.config import DeploymentConfig
+from app.database import db
+from app.task_scheduler.benchmark import BENCHMARK_AREA_SIZE, generate_backlog, generate_fleet
+from app.tasks.constants import TaskStatus
+from app.tasks.models import Task
+from sqlalchemy import create_engine, func, select
+
+from .controllers import TaskAssignmentController
+
+UPDATE_STATE_URL = "/agv_request_handlers/update_state/"
+
+# seconds between the task requests of AGVs without a task (and between task arrivals) while tasks churn
+CHURN_POLL_INTERVAL = 0.01
+
+
+def run_update_state_benchmark(app, num_agvs, num_threads, updates_per_thread, seed=0):
+    """
+    Registers num_agvs AGVs, then posts READY update_state requests from num_threads threads at once (like
+    the threaded server does), each thread updating its own share of the fleet. Returns the throughput and
+    latency percentiles of the requests, must be called within an app context of the benchmarked app
+    """
+    num_threads = min(num_threads, num_agvs)
+    rng = np.random.default_rng(seed)
+    fleet = generate_fleet(rng, num_agvs)
+    db.session.bulk_insert_mappings(AGV, fleet)
+    db.session.commit()
+    db.session.remove()
+
+    poses = rng.uniform(0.0, BENCHMARK_AREA_SIZE, size=(num_threads, updates_per_thread, 2))
+    latencies = [[] for _ in range(num_threads)]
+    failures = [0] * num_threads
+    start_barrier = threading.Barrier(num_threads + 1)
+
+    def post_updates(thread_ind):
+        client = app.test_client()
+        agv_ids = [agv["id"] for agv in fleet[thread_ind::num_threads]]
+        start_barrier.wait()
+        for update_ind, (x, y) in enumerate(poses[thread_ind]):
+            data = {
+                "id": agv_ids[update_ind % len(agv_ids)],
+                "status": AGVState.READY.value,
+                "x": float(x),
+                "y": float(y),
+                "theta": 0.0,
+            }
+            request_start = time.perf_counter()
+            response = client.post(UPDATE_STATE_URL, json=data)
+            latencies[thread_ind].append(time.perf_counter() - request_start)
+            failures[thread_ind] += response.status_code != 200
+
+    threads = [
+        threading.Thread(target=post_updates, args=(thread_ind,))
+        for thread_ind in range(num_threads)
+    ]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = (
+        np.concatenate([np.asarray(thread_latencies) for thread_latencies in latencies]) * 1e3
+    )
+    return {
+        "agvs": num_agvs,
+        "threads": num_threads,
+        "updates": len(latencies_ms),
+        "failed_updates": sum(failures),
+        "updates_per_sec": len(latencies_ms) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+    }
+
+
+def _claim_tasks_worker(database_uri, agv_ids, start_barrier, churn_done, idle_timeout, results):
+    from app.app import create_app
+    from app.config import ConfigType
+
+    # every worker is a separate server process, with its own task index built from the shared database
+    app = create_app(ConfigType.DEPLOYMENT, {"SQLALCHEMY_DATABASE_URI": database_uri})
+    claims = []
+    with app.app_context():
+        start_barrier.wait()
+        idle_since = None
+        while True:
+            num_claimed = 0
+            for agv_id in agv_ids:
+                data = {"id": agv_id, "status": AGVState.READY}
+                status_code, response_data = TaskAssignmentController.get_task_for_agv(data)
+                db.session.commit()
+                db.session.remove()
+                if status_code == 200:
+                    claims.append(response_data["id"])
+                    num_claimed += 1
+            if num_claimed or not churn_done.is_set():
+                idle_since = None
+                if not num_claimed:
+                    time.sleep(CHURN_POLL_INTERVAL)
+                continue
+            # tasks changed by other processes are only seen once the task index is refreshed
+            if idle_since is None:
+                idle_since = time.monotonic()
+            if time.monotonic() - idle_since >= idle_timeout:
+                break
+            time.sleep(CHURN_POLL_INTERVAL)
+        db.get_engine(app).dispose()
+    results.put(claims)
+
+
+def _churn_tasks_worker(database_uri, num_arrivals, seed, start_barrier, churn_done, results):
+    from app.app import create_app
+    from app.config import ConfigType
+
+    # a separate server process creating tasks, cancelling some of them before they are claimed and returning
+    # claimed tasks to the pool (as cancelling the task of an AGV does)
+    app = create_app(ConfigType.DEPLOYMENT, {"SQLALCHEMY_DATABASE_URI": database_uri})
+    rng = np.random.default_rng(seed)
+    client = app.test_client()
+    deleted_task_ids, released_task_ids = [], []
+    with app.app_context():
+        start_barrier.wait()
+        for arrival in range(num_arrivals):
+            x, y = rng.uniform(0.0, BENCHMARK_AREA_SIZE, size=2)
+            response = client.post(
+                "/tasks/", json={"waypoints": [{"x": float(x), "y": float(y), "order": 0}]}
+            )
+            task_id = response.get_json()["id"]
+            if arrival % 4 == 1:
+                num_deleted = Task.query.filter_by(id=task_id, status=TaskStatus.INCOMPLETE).delete(
+                    synchronize_session=False
+                )
+                if num_deleted:
+                    deleted_task_ids.append(task_id)
+            elif arrival % 4 == 3:
+                task = Task.query.filter_by(status=TaskStatus.IN_PROGRESS).first()
+                if task is not None:
+                    task.reset_progress()
+                    task.update(status=TaskStatus.INCOMPLETE)
+                    AGV.query.filter_by(id=task.agv_id).update({"current_task_id": None})
+                    released_task_ids.append(task.id)
+            db.session.commit()
+            db.session.remove()
+            time.sleep(CHURN_POLL_INTERVAL)
+        db.get_engine(app).dispose()
+    churn_done.set()
+    results.put((deleted_task_ids, released_task_ids))
+
+
+def run_task_claim_benchmark(num_workers, num_agvs, num_tasks, seed=0, num_arrivals=0):
+    """
+    Has num_workers server processes (sharing one SQLite database file, with the deployment settings) hand
+    out tasks to their share of num_agvs READY AGVs until the backlog of num_tasks is drained. Every worker
+    builds its task index before any starts claiming, so all of them compete for the same tasks.
+
+    Meanwhile another server process creates num_arrivals more tasks, deleting every fourth one before it is
+    claimed and returning a claimed task to the pool for every other fourth one, the workers only learn of those
+    changes through the database. Returns the claim throughput together with the number of tasks handed out
+    more than once (per time they were returned to the pool) and left unclaimed
+    """
+    rng = np.random.default_rng(seed)
+    fleet = generate_fleet(rng, num_agvs)
+    backlog, _ = generate_backlog(rng, num_tasks, num_agvs)
+    context = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f"sqlite:///{os.path.join(directory, 'benchmark.db')}"
+        engine = create_engine(database_uri)
+        db.Model.metadata.create_all(engine)
+        with engine.begin() as connection:
+            connection.execute(AGV.__table__.insert(), fleet)
+            connection.execute(Task.__table__.insert(), backlog)
+
+        num_processes = num_workers + (1 if num_arrivals else 0)
+        start_barrier, results = context.Barrier(num_processes + 1), context.Queue()
+        churn_done, churn_results = context.Event(), context.Queue()
+        # without churn the backlog is drained as soon as nothing is left to claim
+        idle_timeout = 0.0
+        if num_arrivals:
+            idle_timeout = 2 * DeploymentConfig.TASK_INDEX_REFRESH_INTERVAL
+        else:
+            churn_done.set()
+        workers = [
+            context.Process(
+                target=_claim_tasks_worker,
+                args=(
+                    database_uri,
+                    [agv["id"] for agv in fleet[worker_ind::num_workers]],
+                    start_barrier,
+                    churn_done,
+                    idle_timeout,
+                    results,
+                ),
+            )
+            for worker_ind in range(num_workers)
+        ]
+        if num_arrivals:
+            workers.append(
+                context.Process(
+                    target=_churn_tasks_worker,
+                    args=(
+                        database_uri,
+                        num_arrivals,
+                        seed,
+                        start_barrier,
+                        churn_done,
+                        churn_results,
+                    ),
+                )
+            )
+        for worker in workers:
+            worker.start()
+        start_barrier.wait()
+        start = time.perf_counter()
+        claims = [task_id for _ in range(num_workers) for task_id in results.get()]
+        elapsed = time.perf_counter() - start
+        deleted_task_ids, released_task_ids = churn_results.get() if num_arrivals else ([], [])
+        for worker in workers:
+            worker.join()
+
+        with engine.connect() as connection:
+            num_incomplete = connection.execute(
+                select(func.count()).where(Task.status == TaskStatus.INCOMPLETE)
+            ).scalar()
+        engine.dispose()
+
+    # a task returned to the pool is rightfully handed out once more
+    num_releases = Counter(released_task_ids)
+    double_claims = sum(
+        max(0, num_claims - 1 - num_releases[task_id])
+        for task_id, num_claims in Counter(claims).items()
+    )
+    return {
+        "workers": num_workers,
+        "agvs": num_agvs,
+        "tasks": num_tasks,
+        "arrivals": num_arrivals,
+        "deleted": len(deleted_task_ids),
+        "released": len(released_task_ids),
+        "claims": len(claims),
+        "double_claims": double_claims,
+        "unclaimed_tasks": num_incomplete,
+        "claims_per_sec": len(claims) / elapsed,
+    }
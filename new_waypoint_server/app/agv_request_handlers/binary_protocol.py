@@ -0,0 +1,104 @@
+import math
+import struct
+
+from app.agvs.constants import AGVState
+from app.core import validators
+
+# a message is a header (magic, protocol version, number of samples) followed by that many fixed layout
+# samples (id, status code, x, y, theta, current task id, current waypoint order), little endian
+MESSAGE_MAGIC = b"WP"
+PROTOCOL_VERSION = 1
+HEADER = struct.Struct("<2sBH")
+SAMPLE = struct.Struct("<IBfffii")
+# encodes a missing current task id / current waypoint order
+NO_VALUE = -1
+MAX_SAMPLES = 2**16 - 1
+
+STATUS_CODES = {
+    AGVState.READY: 0,
+    AGVState.BUSY: 1,
+    AGVState.DONE: 2,
+    AGVState.STOPPED: 3,
+}
+CODE_STATUSES = {code: agv_status for agv_status, code in STATUS_CODES.items()}
+
+
+class MalformedMessage(ValueError):
+    pass
+
+
+def encode_updates(updates):
+    """Packs AGV update dictionaries (as loaded by AGVUpdateSerializer) into a single message"""
+    if len(updates) > MAX_SAMPLES:
+        raise MalformedMessage(f"A message holds at most {MAX_SAMPLES} samples")
+    samples = [
+        SAMPLE.pack(
+            data["id"],
+            STATUS_CODES[data["status"]],
+            data["x"],
+            data["y"],
+            data["theta"],
+            data.get("current_task_id", NO_VALUE),
+            data.get("current_waypoint_order", NO_VALUE),
+        )
+        for data in updates
+    ]
+    return HEADER.pack(MESSAGE_MAGIC, PROTOCOL_VERSION, len(samples)) + b"".join(samples)
+
+
+def decode_updates(message):
+    """
+    Unpacks a message into AGV update dictionaries shaped like AGVUpdateSerializer output, raises
+    MalformedMessage when the message does not follow the protocol
+    """
+    if len(message) < HEADER.size:
+        raise MalformedMessage("Message is shorter than its header")
+    magic, version, num_samples = HEADER.unpack_from(message)
+    if magic != MESSAGE_MAGIC or version != PROTOCOL_VERSION:
+        raise MalformedMessage(f"Expected a version {PROTOCOL_VERSION} telemetry message")
+    if len(message) != HEADER.size + num_samples * SAMPLE.size:
+        raise MalformedMessage(f"Message length does not match its {num_samples} samples")
+
+    updates = []
+    for agv_id, status_code, x, y, theta, task_id, waypoint_order in SAMPLE.iter_unpack(
+        memoryview(message)[HEADER.size :]
+    ):
+        agv_status = CODE_STATUSES.get(status_code)
+        if agv_status is None:
+            raise MalformedMessage(f"Unknown AGV status code: {status_code}")
+        data = {"id": agv_id, "status": agv_status, "x": x, "y": y, "theta": theta}
+        if task_id != NO_VALUE:
+            data["current_task_id"] = task_id
+        if waypoint_order != NO_VALUE:
+            data["current_waypoint_order"] = waypoint_order
+        updates.append(data)
+    return updates
+
+
+def latest_samples(updates):
+    """Keeps the latest (last) sample of every AGV, preserving the order AGVs first appear in"""
+    latest = {}
+    for data in updates:
+        latest[data["id"]] = data
+    return list(latest.values())
+
+
+def validate_updates(updates, registered_agv_ids):
+    """
+    Performs the checks of AGVUpdateSerializer without marshmallow, returns errors keyed by the position of
+    the invalid samples (like the errors of a many=True schema)
+    """
+    errors = {}
+    for ind, data in enumerate(updates):
+        if data["id"] not in registered_agv_ids:
+            message = "AGV with provided ROS_DOMAIN_ID is not registered!"
+        elif not all(math.isfinite(data[field]) for field in ("x", "y", "theta")):
+            message = "X, Y and theta must be finite numbers"
+        elif not validators.validate_2d_coordinates(data["x"], data["y"]):
+            message = "X or Y coordinate is out of bounds for the allowable range of navigatable coordinates"
+        elif not validators.validate_theta(data["theta"]):
+            message = "theta is out of bounds from the allowable range of values: [-pi, pi]"
+        else:
+            continue
+        errors[ind] = {"_schema": [message]}
+    return errors
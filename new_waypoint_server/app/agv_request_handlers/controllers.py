@@ -1,17 +1,42 @@
-import sys
+import time
+from collections import defaultdict
 
 from app.agvs.constants import AGVState
 from app.agvs.models import AGV
+from app.agvs.state_store import agv_state_store
+from app.agvs.telemetry import fleet_telemetry
 from app.commands.constants import CommandTypes
 from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.commands.serializers import CommandSerializer
 from app.core import validators
-from app.task_scheduler.scheduler import TASK_SCHEDULER_MAP
+from app.database import db, on_commit
+from app.task_scheduler.scheduler import TASK_SCHEDULER_MAP, TaskScheduler
+from app.tasks import packed_route
 from app.tasks.constants import TaskStatus
+from app.tasks.index import (
+    agv_scope_keys,
+    load_indexed_tasks,
+    refresh_task_index,
+    task_index,
+    task_scope_key,
+)
 from app.tasks.models import Task, Waypoint
+from app.tasks.reservations import (
+    release_expired_reservations,
+    release_reservation,
+    task_reservations,
+)
 from app.tasks.serializers import TaskDetailSerializer
 from flask import current_app
 from flask_api import status
+from sqlalchemy.orm import lazyload
+from sqlalchemy.orm.attributes import set_committed_value
+
+from . import binary_protocol
+
+# debug message answering the updates of AGVs whose pending commands were left queued (see update_agvs)
+COMMAND_PENDING_MESSAGE = "Command pending, request it through update_state or wait_for_command"
 
 
 class CommandProcessingController:
@@ -20,76 +45,89 @@ class CommandProcessingController:
         agv_commands = (
             Command.query.filter_by(processed=False, agv_id=agv.id).order_by(Command.id.asc())
         ).all()
-        task_commands = (
-            Command.query.filter_by(processed=False, task_id=agv.current_task_id).order_by(
-                Command.id.asc()
-            )
-        ).all()
+        # an AGV without a task would otherwise match every command without a task (ie - other AGV's commands)
+        task_commands = []
+        if agv.current_task_id is not None:
+            task_commands = (
+                Command.query.filter_by(processed=False, task_id=agv.current_task_id).order_by(
+                    Command.id.asc()
+                )
+            ).all()
         result = agv_commands + task_commands
         return list(sorted(result, key=lambda command: command.id))
 
     @classmethod
-    def _retrieve_stop_agv_command(cls, agv):
-        # returns the latest STOP command
-        stop_commands = (
-            Command.query.filter_by(
-                agv_id=agv.id, processed=False, type=CommandTypes.STOP_AGV
-            ).order_by(Command.id.asc())
-        ).all()
-        if not stop_commands:
-            return None
-        return stop_commands[-1]
-
-    @classmethod
-    def _retrieve_start_agv_command(cls, agv):
-        # returns the latest START command
-        start_commands = (
-            Command.query.filter_by(
-                agv_id=agv.id, processed=False, type=CommandTypes.START_AGV
-            ).order_by(Command.id.asc())
-        ).all()
-        if not start_commands:
-            return None
-        return start_commands[-1]
-
-    @classmethod
-    def _remove_invalid_relavent_commands(cls, agv):
-        # process all relavent commands to be in a "valid state", removal occurs by marking the command as "processed"
+    def _sync_pending_commands(cls, agv):
+        """
+        Queues the unprocessed commands of the AGV found within the database (at most once per
+        COMMAND_QUEUE_SYNC_INTERVAL), returns whether any was found
+        """
+        interval = current_app.config["COMMAND_QUEUE_SYNC_INTERVAL"]
+        if interval is None or not command_queues.sync_due(agv.id, interval):
+            return False
         commands = cls._retrieve_all_relavent_commands_query(agv)
-        if not commands:
-            return
         for command in commands:
-            command_type, agv_id, task_id = command.type, command.agv_id, command.task_id
-            valid_command = validators.validate_command(command_type, agv_id, task_id)
-            if not valid_command:
-                command.update(processed=True)
-                command.save()
+            command_queues.push(command)
+        return bool(commands)
 
     @classmethod
     def get_next_command(cls, agv):
-        commands = cls._retrieve_all_relavent_commands_query(agv)
-        if not commands:
-            return None
+        # the command queues answer "any command for this AGV?" without touching the database, the
+        # commands themselves are only loaded when one is pending
+        while True:
+            command_id = command_queues.peek(agv)
+            if command_id is None:
+                if cls._sync_pending_commands(agv):
+                    continue
+                return None
+            command = Command.query.filter_by(id=command_id, processed=False).first()
+            if command is None:
+                # the command was deleted (or processed) without going through the queues
+                command_queues.remove(command_id)
+                continue
+
+            # stop and start commands take precedence and are always valid, any other command may no longer
+            # be relavent (ie - the AGV finished the task it was meant to cancel), those are marked as processed
+            if command.type in (CommandTypes.STOP_AGV, CommandTypes.START_AGV):
+                return command
+            if validators.validate_command(command.type, command.agv_id, command.task_id):
+                return command
+            command.update(processed=True)
+            command_queues.remove(command.id)
 
-        # process stop and start commands first, they take precedence
-        latest_start_command, latest_stop_command = cls._retrieve_start_agv_command(
-            agv
-        ), cls._retrieve_stop_agv_command(agv)
-        if latest_stop_command:
-            return latest_stop_command
-        if latest_start_command:
-            return latest_start_command
-
-        # reaching here means we have not detected a start or stop command, we also guarantee that all commands will be relavent with command creation validation
-        cls._remove_invalid_relavent_commands(agv)
-        updated_commands = cls._retrieve_all_relavent_commands_query(agv)
-        if not updated_commands:
-            return None
-        return updated_commands[0]
+    @classmethod
+    def wait_for_command(cls, agv_id, timeout=None):
+        """
+        Blocks until a command is queued for the AGV (or its current task) and processes it, returning the same
+        (process_successful, debug_message, command json) tuple as process_command, or None once timeout seconds
+        (capped to COMMAND_LONG_POLL_MAX_TIMEOUT) pass without a command
+        """
+        max_timeout = current_app.config["COMMAND_LONG_POLL_MAX_TIMEOUT"]
+        timeout = max_timeout if timeout is None else min(timeout, max_timeout)
+        deadline = time.monotonic() + timeout
+        while True:
+            agv = AGV.query.filter_by(id=agv_id).first()
+            if agv is None:
+                return None
+            command = cls.get_next_command(agv)
+            if command is not None:
+                return cls.process_command(agv, command)
+            task_id = agv.current_task_id
+            # end the transaction, a waiting request holds no database connection, and reload whatever
+            # other requests change meanwhile
+            db.session.commit()
+            db.session.expire_all()
+            # commands issued by other server processes are only found by looking them up again
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            sync_interval = current_app.config["COMMAND_QUEUE_SYNC_INTERVAL"]
+            command_queues.wait(agv_id, task_id, min(remaining, sync_interval or remaining))
 
     @classmethod
     def process_command(cls, agv, command):
         command.update(processed=True)
+        command_queues.remove(command.id)
         command_type_to_process_function = {
             CommandTypes.CANCEL_AGV: cls.process_cancel_agv_or_task,
             CommandTypes.CANCEL_TASK: cls.process_cancel_agv_or_task,
@@ -98,38 +136,38 @@ class CommandProcessingController:
         }
         process_funciton = command_type_to_process_function[command.type]
         process_funciton(agv)
+        fleet_telemetry.publish(agv)
         return True, None, CommandSerializer().dump(command)
 
     @classmethod
     def process_cancel_agv_or_task(cls, agv):
+        # the task may have been deleted meanwhile, which already returned the AGV to READY
         task = Task.query.filter_by(id=agv.current_task_id).first()
-        for waypoint in task.waypoints:
-            waypoint.update(visited=False)
-            waypoint.save()
-        task.update(status=TaskStatus.INCOMPLETE)
-        task.save()
+        if task is not None:
+            task.reset_progress()
+            task.update(status=TaskStatus.INCOMPLETE)
+            on_commit(task_index.sync, task)
+        release_reservation(agv.id)
         agv.update(current_task_id=None, status=AGVState.READY)
-        agv.save()
 
     @classmethod
     def process_stop_agv(cls, agv):
         # "cancel" the current task the AGV is processing (however, the AGV may be in the ready state)
         task = Task.query.filter_by(id=agv.current_task_id).first()
         if task is not None:
-            for waypoint in task.waypoints:
-                waypoint.update(visited=False)
-                waypoint.save()
+            task.reset_progress()
             task.update(status=TaskStatus.INCOMPLETE)
-            task.save()
+            on_commit(task_index.sync, task)
+        release_reservation(agv.id)
 
         # place the AGV into the "Stop" Loop
         agv.update(current_task_id=None, status=AGVState.STOPPED)
-        agv.save()
 
         # remove all other commands for the AGV
         commands = cls._retrieve_all_relavent_commands_query(agv)
         for command in commands:
             command.update(processed=True)
+        command_queues.discard_agv(agv.id)
 
     @classmethod
     def process_start_agv(cls, agv):
@@ -160,16 +198,125 @@ class AGVUpdateController:
         }
         update_function = state_to_update_function[agv_status]
         update_successful, update_debug_message, update_output_json = update_function(agv, data)
+        fleet_telemetry.publish(agv)
         return update_successful, update_debug_message, update_output_json
 
     @classmethod
-    def _basic_agv_state_update(cls, agv, data):
+    def update_agvs(cls, updates, process_commands=True):
+        """
+        Applies a batch of validated AGV updates (at most one per AGV), returning an (update_successful,
+        debug_message, command json) tuple per update in the same order. AGVs with pending commands go
+        through update_agv, the remaining updates are applied with a handful of set based queries. Without
+        process_commands every update is applied as is, the pending commands stay queued and the AGVs are
+        answered with COMMAND_PENDING_MESSAGE instead
+        """
+        agv_ids = [data.get("id") for data in updates]
+        agvs = {
+            agv.id: agv
+            for agv in AGV.query.options(lazyload(AGV.tasks)).filter(AGV.id.in_(agv_ids))
+        }
+        commanded_agv_ids = {agv.id for agv in agvs.values() if command_queues.has_pending(agv)}
+        pending_agv_ids = set()
+        if not process_commands:
+            pending_agv_ids, commanded_agv_ids = commanded_agv_ids, set()
+
+        batched_updates = [data for data in updates if data.get("id") not in commanded_agv_ids]
+        task_ids = {
+            data.get("current_task_id")
+            for data in batched_updates
+            if data.get("status") in (AGVState.BUSY, AGVState.DONE)
+        } - {None}
+        tasks = {task.id: task for task in Task.query.filter(Task.id.in_(task_ids))}
+        # only the reservation of the next task of BUSY AGVs needs the waypoints of their tasks
+        busy_task_ids = {
+            data.get("current_task_id")
+            for data in batched_updates
+            if data.get("status") is AGVState.BUSY
+        } & set(tasks)
+        task_waypoints = defaultdict(list)
+        for waypoint in Waypoint.query.filter(Waypoint.task_id.in_(busy_task_ids)):
+            task_waypoints[waypoint.task_id].append(waypoint)
+
+        results, completed_tasks = {}, []
+        for data in batched_updates:
+            agv, agv_status = agvs[data.get("id")], data.get("status")
+            cls._basic_agv_state_update(agv, data, write_due_poses=False)
+            task = tasks.get(data.get("current_task_id"))
+            if agv_status is AGVState.BUSY and task is not None:
+                task.visit_waypoints_before(data.get("current_waypoint_order"))
+                TaskAssignmentController.reserve_next_task(agv, task, task_waypoints[task.id])
+            elif agv_status is AGVState.DONE and task is not None:
+                task.visit_waypoints_before()
+                task.status = TaskStatus.COMPLETE
+                agv.current_task_id = None
+                completed_tasks.append(task)
+            results[agv.id] = (
+                True,
+                COMMAND_PENDING_MESSAGE if agv.id in pending_agv_ids else None,
+                None,
+            )
+            fleet_telemetry.publish(agv)
+        # the poses due to be written are written once for the whole batch
+        durability_window = current_app.config["AGV_STATE_DURABILITY_WINDOW"]
+        if durability_window and agv_state_store.flush_due(durability_window):
+            agv_state_store.write_pending()
+        for task in completed_tasks:
+            on_commit(task_index.sync, task)
+        if any(data.get("status") in (AGVState.READY, AGVState.DONE) for data in batched_updates):
+            release_expired_reservations()
+
+        # commands are rare (they are issued by operators), they are processed exactly as single updates
+        for data in updates:
+            if data.get("id") in commanded_agv_ids:
+                results[data.get("id")] = cls.update_agv(data)
+        return [results[agv_id] for agv_id in agv_ids]
+
+    @classmethod
+    def ingest_telemetry_message(cls, message, process_commands=True):
+        """
+        Decodes, validates and applies a binary telemetry message (see binary_protocol), returns a status code
+        and either the validation errors or the response of every AGV the message updated. process_commands is
+        passed on to update_agvs
+        """
+        try:
+            updates = binary_protocol.decode_updates(message)
+        except binary_protocol.MalformedMessage as error:
+            return status.HTTP_400_BAD_REQUEST, {"message": str(error)}
+        registered_agv_ids = {agv_id for (agv_id,) in AGV.query.with_entities(AGV.id)}
+        errors = binary_protocol.validate_updates(updates, registered_agv_ids)
+        if errors:
+            return status.HTTP_400_BAD_REQUEST, errors
+
+        # samples of the same AGV are coalesced, only its latest state is applied
+        updates = binary_protocol.latest_samples(updates)
+        results = cls.update_agvs(updates, process_commands)
+        return status.HTTP_200_OK, [
+            {
+                "id": data["id"],
+                "update_successful": update_successful,
+                "debug_message": debug_message,
+                "command": command_json,
+            }
+            for data, (update_successful, debug_message, command_json) in zip(updates, results)
+        ]
+
+    @classmethod
+    def _basic_agv_state_update(cls, agv, data, write_due_poses=True):
         x, y, theta, agv_status = (
             data.get("x"),
             data.get("y"),
             data.get("theta"),
             data.get("status"),
         )
+        durability_window = current_app.config["AGV_STATE_DURABILITY_WINDOW"]
+        if durability_window and agv_status is agv.status:
+            # pose only telemetry stays in memory, until the pending poses of the fleet are due to be written
+            agv_state_store.record(agv, x, y, theta)
+            if write_due_poses and agv_state_store.flush_due(durability_window):
+                agv_state_store.write_pending()
+            return
+        # status transitions are written through, every pending pose is written along with them
+        agv_state_store.write_pending()
         agv.update(
             x=x,
             y=y,
@@ -181,24 +328,19 @@ class AGVUpdateController:
     def update_agv_ready(cls, agv, data):
         # we have a route which handles an AGV being in the READY state, so we don't need to handle that here
         cls._basic_agv_state_update(agv, data)
+        release_expired_reservations()
         return True, None, None
 
     @classmethod
     def update_agv_busy(cls, agv, data):
         # TODO: consider adding validation: account for factors like current task_id is not the one registered to the agv?
         cls._basic_agv_state_update(agv, data)
-        task_id, waypoint_order = data.get("current_task_id"), data.get(
-            "current_waypoint_order", sys.maxsize
-        )
-        task = Task.query.filter_by(id=task_id).first()
-
-        visited_waypoints = Waypoint.query.filter_by(task_id=task.id, visited=False).filter(
-            Waypoint.order < waypoint_order
-        )
-        for waypoint in visited_waypoints:
-            waypoint.update(visited=True)
-            waypoint.save()
+        task = Task.query.filter_by(id=data.get("current_task_id")).first()
+        # the waypoints preceding the AGV's current waypoint (all of them if it is not reported) are visited
+        task.visit_waypoints_before(data.get("current_waypoint_order"))
 
+        # far enough along its route, the AGV gets its next task reserved ahead of requesting it
+        TaskAssignmentController.reserve_next_task(agv, task)
         return True, None, None
 
     @classmethod
@@ -208,15 +350,13 @@ class AGVUpdateController:
         task = Task.query.filter_by(id=task_id).first()
 
         # mark all task waypoints as visited
-        for waypoint in task.waypoints:
-            waypoint.update(visited=True)
-            waypoint.save()
+        task.visit_waypoints_before()
         # update task to be complete
         task.update(status=TaskStatus.COMPLETE)
-        task.save()
+        on_commit(task_index.sync, task)
         # set agv current task to be none
         agv.update(current_task_id=None)
-        agv.save()
+        release_expired_reservations()
 
         return True, None, None
 
@@ -245,9 +385,12 @@ class TaskAssignmentController:
 
         agv = AGV.query.filter_by(id=data.get("id")).first()
 
-        tasks = cls.retrieve_relavent_tasks(agv)
-
-        task = scheduler.generate_optimal_assignment(agv, tasks)
+        # the tasks reserved for AGVs that never claimed them are returned to the pool first
+        release_expired_reservations()
+        cls._refresh_task_index()
+        task = cls._claim_reserved_task(agv)
+        if task is None:
+            task = cls._claim_scheduled_task(agv, scheduler)
 
         if task is None:
             return status.HTTP_202_ACCEPTED, {"message": "No tasks available at this time"}
@@ -256,27 +399,109 @@ class TaskAssignmentController:
         return status.HTTP_200_OK, TaskDetailSerializer().dump(task)
 
     @classmethod
-    def retrieve_relavent_tasks(cls, agv):
-        # get tasks that were directly assigned to the requesting agv
-        agv_assigned_tasks = Task.query.filter_by(
-            status=TaskStatus.INCOMPLETE, agv_id=agv.id
-        ).all()
+    def _refresh_task_index(cls):
+        # tasks created, claimed or returned to the pool by other server processes only reach the index this way
+        refresh_task_index(
+            current_app.config["TASK_INDEX_REFRESH_INTERVAL"], task_reservations.task_ids()
+        )
 
-        # get tasks associated with the drive train of the agv that were not directly assigned to the agv
-        drive_train_assigned_tasks = Task.query.filter_by(
-            status=TaskStatus.INCOMPLETE, agv_id=None, drive_train_type=agv.drive_train_type
-        ).all()
+    @classmethod
+    def retrieve_relavent_tasks(cls, agv, scheduler=TaskScheduler):
+        # the task index holds (per priority) the tasks directly assigned to the requesting agv, the tasks
+        # associated with the drive train of the agv, and the tasks possessing neither an assigned drive train or agv,
+        # the scheduler decides which of those it needs to consider
+        task_ids = scheduler.retrieve_candidate_task_ids(agv)
+        return load_indexed_tasks(task_ids)
 
-        # get all tasks that are neither possess an assigned drive train or assigned agv
-        general_tasks = Task.query.filter_by(
-            status=TaskStatus.INCOMPLETE, agv_id=None, drive_train_type=None
-        ).all()
-        tasks = agv_assigned_tasks + drive_train_assigned_tasks + general_tasks
-        return tasks
+    @classmethod
+    def reserve_next_task(cls, agv, current_task, task_waypoints=None):
+        # once the AGV has visited TASK_PREASSIGNMENT_ROUTE_FRACTION of its current task's waypoints, the
+        # scheduler picks its next task as if the AGV was already READY at the task's final waypoint,
+        # task_waypoints may be provided when the waypoints of the current task are already loaded
+        route_fraction = current_app.config["TASK_PREASSIGNMENT_ROUTE_FRACTION"]
+        scheduler = TASK_SCHEDULER_MAP.get(current_app.config["TASK_SCHEDULER"], None)
+        if route_fraction is None or scheduler is None:
+            return None
+        if agv.id in task_reservations:
+            # the AGV is still making its way towards its reserved task
+            task_reservations.touch(agv.id, current_app.config["TASK_RESERVATION_TTL"])
+            return None
+        if task_reservations.is_deferred(agv.id):
+            return None
+        if not current_task.num_waypoints:
+            return None
+        route = current_task.route_array(task_waypoints)
+        num_visited = packed_route.num_visited(route, current_task.next_waypoint_order)
+        if not len(route) or num_visited < route_fraction * current_task.num_waypoints:
+            return None
+
+        cls._refresh_task_index()
+        # a transient stand in for the AGV, it is never added to the session
+        projected_agv = AGV(
+            id=agv.id,
+            x=float(route["x"][-1]),
+            y=float(route["y"][-1]),
+            status=AGVState.READY,
+            drive_train_type=agv.drive_train_type,
+        )
+        tasks = cls.retrieve_relavent_tasks(projected_agv, scheduler)
+        task = scheduler.generate_projected_assignment(projected_agv, tasks)
+        if task is None:
+            # nothing to reserve, the scheduler is not run again on every update meanwhile
+            task_reservations.defer(agv.id, current_app.config["TASK_RESERVATION_RETRY_INTERVAL"])
+            return None
+        task_reservations.reserve(agv.id, task.id, current_app.config["TASK_RESERVATION_TTL"])
+        return task
+
+    @classmethod
+    def _claim_reserved_task(cls, agv):
+        task_id = task_reservations.pop(agv.id)
+        if task_id is None:
+            return None
+        # the reserved task may have been deleted or reassigned since it was reserved
+        task = Task.query.filter_by(id=task_id, status=TaskStatus.INCOMPLETE).first()
+        if task is None:
+            return None
+        if task_scope_key(task) not in agv_scope_keys(agv):
+            task_index.sync(task)
+            return None
+        if not cls._claim_task(task):
+            return None
+        return task
+
+    @classmethod
+    def _claim_scheduled_task(cls, agv, scheduler):
+        # tasks claimed elsewhere (ie - by another server process) are dropped from the task index as they are
+        # found, candidates are retrieved again until a claim succeeds or every candidate is still INCOMPLETE
+        while True:
+            task_ids = scheduler.retrieve_candidate_task_ids(agv)
+            tasks = load_indexed_tasks(task_ids)
+            task = scheduler.generate_optimal_assignment(agv, tasks)
+            if task is None and len(tasks) == len(task_ids):
+                return None
+            if task is not None and cls._claim_task(task):
+                return task
+
+    @classmethod
+    def _claim_task(cls, task):
+        """
+        Moves the task from INCOMPLETE to IN_PROGRESS with a single conditional UPDATE, so however many
+        threads or server processes try to hand out the same task only one succeeds. Returns False (dropping
+        the task from the task index) when the task was claimed or deleted elsewhere first
+        """
+        num_claimed = Task.query.filter_by(id=task.id, status=TaskStatus.INCOMPLETE).update(
+            {"status": TaskStatus.IN_PROGRESS}, synchronize_session=False
+        )
+        if not num_claimed:
+            task_index.discard(task.id)
+            return False
+        set_committed_value(task, "status", TaskStatus.IN_PROGRESS)
+        return True
 
     @classmethod
     def _register_task_to_agv(cls, agv, task):
-        task.update(status=TaskStatus.IN_PROGRESS)
+        # the task was already claimed (see _claim_task), the claim is committed together with the AGV
+        on_commit(task_index.sync, task)
         agv.update(current_task_id=task.id, status=AGVState.BUSY)
         agv.tasks.append(task)
-        agv.save()
+        fleet_telemetry.publish(agv)
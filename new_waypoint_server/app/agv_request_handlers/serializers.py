@@ -3,7 +3,7 @@ from app.agvs.models import AGV
 from app.core import validators
 from app.extentions import ma
 from app.tasks.constants import Priority, TaskStatus
-from marshmallow import ValidationError, fields, pre_load, validates_schema
+from marshmallow import ValidationError, fields, pre_load, validate, validates_schema
 from marshmallow_enum import EnumField
 
 
@@ -15,6 +15,10 @@ class AGVUpdateSerializer(ma.Schema):
     theta = fields.Float(required=True)
     current_task_id = fields.Integer(required=False)
     current_waypoint_order = fields.Integer(required=False)
+    # optional, increasing with every update an AGV sends (see UpdateSequences)
+    seq = fields.Integer(required=False, validate=validate.Range(min=0))
+    # optional, increasing whenever an AGV restarts numbering its updates (ie - on reboot)
+    epoch = fields.Integer(required=False, validate=validate.Range(min=0))
 
     @pre_load
     def remove_has_default_key_if_none(self, data: dict, **kwargs):
@@ -22,12 +26,22 @@ class AGVUpdateSerializer(ma.Schema):
             data.pop("current_task_id", None)
         if data.get("current_waypoint_order") is None:
             data.pop("current_waypoint_order", None)
+        if data.get("seq") is None:
+            data.pop("seq", None)
+        if data.get("epoch") is None:
+            data.pop("epoch", None)
         return data
 
     @validates_schema
     def perform_valdiation(self, data, **kwargs):
         ros_domain_id = data.get("id")
-        if not AGV.query.filter_by(id=ros_domain_id).count():
+        # batches of updates provide the ids of all registered AGVs up front, rather than querying per update
+        registered_agv_ids = self.context.get("registered_agv_ids", None)
+        if registered_agv_ids is not None:
+            is_registered = ros_domain_id in registered_agv_ids
+        else:
+            is_registered = AGV.query.filter_by(id=ros_domain_id).count()
+        if not is_registered:
             raise ValidationError("AGV with provided ROS_DOMAIN_ID is not registered!")
 
         if not validators.validate_2d_coordinates(data.get("x"), data.get("y")):
@@ -42,3 +56,13 @@ class AGVUpdateSerializer(ma.Schema):
         state = self.context.get("state", None)
         if state and not validators.validate_agv_update_data(state, data):
             raise ValidationError(f"Invalid data for AGV:{state} Update")
+
+
+class AGVCommandWaitSerializer(ma.Schema):
+    id = fields.Integer(required=True)
+    timeout = fields.Float(required=False, validate=validate.Range(min=0))
+
+    @validates_schema
+    def perform_valdiation(self, data, **kwargs):
+        if not AGV.query.filter_by(id=data.get("id")).count():
+            raise ValidationError("AGV with provided ROS_DOMAIN_ID is not registered!")
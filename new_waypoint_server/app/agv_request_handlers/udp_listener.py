@@ -0,0 +1,54 @@
+import json
+import socketserver
+import threading
+
+from app.database import db
+from flask_api import status
+
+from .controllers import AGVUpdateController
+
+
+class TelemetryDatagramHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        message, sock = self.request
+        with self.server.app.app_context():
+            # a lost reply must not lose a command, commands are left for the AGV to request over HTTP
+            status_code, response_data = AGVUpdateController.ingest_telemetry_message(
+                message, process_commands=False
+            )
+            # a datagram is a unit of work, like a request
+            db.session.commit()
+
+        # only rejected messages and AGVs with pending commands are answered, acknowledging every datagram would
+        # double the traffic
+        if status_code != status.HTTP_200_OK:
+            reply = {"errors": response_data}
+        else:
+            reply = [
+                response for response in response_data if response["debug_message"] is not None
+            ]
+            if not reply:
+                return
+        sock.sendto(json.dumps(reply).encode(), self.client_address)
+
+
+class TelemetryUDPServer(socketserver.UDPServer):
+    """
+    Ingests binary telemetry messages (see binary_protocol, one message per datagram) one at a time, replying
+    to the sender for those of its AGVs that have a command pending. Every server process may listen on the
+    same port, the datagrams are spread across them
+    """
+
+    allow_reuse_address = True
+    allow_reuse_port = True
+
+    def __init__(self, app, address):
+        super().__init__(address, TelemetryDatagramHandler)
+        self.app = app
+
+
+def start_telemetry_listener(app, host, port):
+    """Serves TelemetryUDPServer from a daemon thread of the process serving HTTP requests"""
+    server = TelemetryUDPServer(app, (host, port))
+    threading.Thread(target=server.serve_forever, name="telemetry-listener", daemon=True).start()
+    return server
@@ -1,10 +1,18 @@
+from collections import Counter
+
 from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.agvs.update_sequences import answer_update, claim_update, update_sequences
 from flask import jsonify, make_response, request
 from flask_api import status
 
 from . import agv_request_handlers
-from .controllers import AGVUpdateController, TaskAssignmentController
-from .serializers import AGVUpdateSerializer
+from .controllers import (
+    AGVUpdateController,
+    CommandProcessingController,
+    TaskAssignmentController,
+)
+from .serializers import AGVCommandWaitSerializer, AGVUpdateSerializer
 
 
 @agv_request_handlers.route("/test_connection/", methods=["GET"])
@@ -34,15 +42,54 @@ def create_update_status_response(success, debug_message, data):
     }
 
 
+def create_sequenced_update_response(agv_id, seq, epoch=0):
+    """
+    Returns the (status code, response) for an update whose seq is not above the AGV's latest: the original
+    response when the update is a retry of the latest one, a rejection otherwise. None for a newer update
+    """
+    cached_response = update_sequences.cached_response(agv_id, seq, epoch)
+    if cached_response is not None:
+        return cached_response
+    latest = update_sequences.latest(agv_id)
+    if latest is None or (epoch, seq) > latest:
+        return None
+    latest_epoch, latest_seq = latest
+    if epoch == latest_epoch:
+        debug_message = f"Update {seq} is stale, update {latest_seq} was already received"
+    else:
+        debug_message = f"Update {seq} of epoch {epoch} is stale, epoch {latest_epoch} has started"
+    return status.HTTP_409_CONFLICT, create_update_status_response(False, debug_message, None)
+
+
 @agv_request_handlers.route("/update_state/", methods=["POST"])
 def handle_agv_update_state():
     serializer = AGVUpdateSerializer()
     data = request.get_json()
+    # stale updates and retries are answered before the update is validated (or the database queried)
+    if (
+        isinstance(data, dict)
+        and type(data.get("id")) is int
+        and type(data.get("seq")) is int
+        and type(data.get("epoch", 0)) is int
+    ):
+        sequenced_response = create_sequenced_update_response(
+            data["id"], data["seq"], data.get("epoch", 0)
+        )
+        if sequenced_response is not None:
+            return make_response(jsonify(sequenced_response[1]), sequenced_response[0])
+
     errors = serializer.validate(data)
     if errors:
         return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
 
     validated_data = serializer.load(data)
+    agv_id, seq = validated_data.get("id"), validated_data.get("seq")
+    epoch = validated_data.get("epoch", 0)
+    # a concurrent request may have delivered the same (or a newer) update meanwhile
+    if seq is not None and not claim_update(agv_id, seq, epoch):
+        status_code, response = create_sequenced_update_response(agv_id, seq, epoch)
+        return make_response(jsonify(response), status_code)
+
     update_successful, update_debug_message, update_output_json = AGVUpdateController.update_agv(
         validated_data
     )
@@ -51,8 +98,87 @@ def handle_agv_update_state():
         "debug_message": update_debug_message,
         "command": update_output_json,
     }
+    status_code = status.HTTP_200_OK if update_successful else status.HTTP_400_BAD_REQUEST
+    # the response is only recorded once the update is committed, a failed update can be retried
+    if seq is not None:
+        answer_update(agv_id, status_code, response)
+
+    return make_response(jsonify(response), status_code)
+
+
+@agv_request_handlers.route("/update_state/batch/", methods=["POST"])
+def handle_agv_batch_update_state():
+    data = request.get_json()
+    if not isinstance(data, list):
+        return make_response(
+            jsonify({"message": "Expected a list of AGV updates"}), status.HTTP_400_BAD_REQUEST
+        )
+
+    registered_agv_ids = {agv_id for (agv_id,) in AGV.query.with_entities(AGV.id)}
+    serializer = AGVUpdateSerializer(many=True, context={"registered_agv_ids": registered_agv_ids})
+    errors = serializer.validate(data)
+    if errors:
+        return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
+    validated_data = serializer.load(data)
 
-    if not update_successful:
-        return make_response(jsonify(response), status.HTTP_400_BAD_REQUEST)
+    duplicate_ids = [
+        agv_id
+        for agv_id, count in Counter(update.get("id") for update in validated_data).items()
+        if count > 1
+    ]
+    if duplicate_ids:
+        return make_response(
+            jsonify({"message": f"Multiple updates provided for AGVs: {duplicate_ids}"}),
+            status.HTTP_400_BAD_REQUEST,
+        )
 
+    # stale updates and retries are answered from the update sequences, only the remaining ones are applied
+    responses, applied_updates = {}, []
+    for update in validated_data:
+        agv_id, seq, epoch = update.get("id"), update.get("seq"), update.get("epoch", 0)
+        if seq is not None and not claim_update(agv_id, seq, epoch):
+            responses[agv_id] = create_sequenced_update_response(agv_id, seq, epoch)[1]
+        else:
+            applied_updates.append(update)
+
+    results = AGVUpdateController.update_agvs(applied_updates) if applied_updates else []
+    for update, result in zip(applied_updates, results):
+        agv_id, seq = update.get("id"), update.get("seq")
+        responses[agv_id] = create_update_status_response(*result)
+        if seq is not None:
+            status_code = status.HTTP_200_OK if result[0] else status.HTTP_400_BAD_REQUEST
+            answer_update(agv_id, status_code, responses[agv_id])
+
+    response = [
+        {"id": update.get("id"), **responses[update.get("id")]} for update in validated_data
+    ]
     return make_response(jsonify(response), status.HTTP_200_OK)
+
+
+@agv_request_handlers.route("/wait_for_command/", methods=["GET"])
+def handle_wait_for_command():
+    # long-poll: responds as soon as a command is issued for the AGV, so AGVs need not post updates just to
+    # receive commands
+    serializer = AGVCommandWaitSerializer()
+    data = request.args.to_dict()
+    errors = serializer.validate(data)
+    if errors:
+        return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
+    validated_data = serializer.load(data)
+
+    result = CommandProcessingController.wait_for_command(
+        validated_data.get("id"), validated_data.get("timeout")
+    )
+    if result is None:
+        return make_response(
+            jsonify(create_update_status_response(True, "No command issued", None)),
+            status.HTTP_202_ACCEPTED,
+        )
+    return make_response(jsonify(create_update_status_response(*result)), status.HTTP_200_OK)
+
+
+@agv_request_handlers.route("/update_state/binary/", methods=["POST"])
+def handle_agv_binary_update_state():
+    # compact alternative to /update_state/batch/, the body is a binary telemetry message (see binary_protocol)
+    status_code, response_data = AGVUpdateController.ingest_telemetry_message(request.get_data())
+    return make_response(jsonify(response_data), status_code)
@@ -0,0 +1,158 @@
+import atexit
+import threading
+import time
+
+from app.database import db
+from sqlalchemy import event
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .models import AGV
+
+POSE_FIELDS = ("x", "y", "theta")
+
+# session.info key of the poses written within the session's current transaction
+WRITTEN_POSES_KEY = "agv_state_store.written_poses"
+
+
+class AGVStateStore:
+    """
+    Process-local, authoritative record of the latest pose (x, y, theta) reported by each AGV that is not yet
+    written to the agv table. Pose only telemetry is recorded here instead of being committed per message, the
+    pending poses of the whole fleet are written in a single statement once the oldest of them is
+    AGV_STATE_DURABILITY_WINDOW seconds old, or along with the next committed status transition. A background
+    thread (see start_flusher) writes the poses that fall due while no further update reaches the process, and
+    the remaining ones when the process exits. Poses only leave the store once the transaction writing them is
+    committed, a rolled back write leaves them pending.
+
+    Every AGV loaded (or refreshed) from the database has its pending pose applied to it, so readers never see
+    the stale pose stored in the table.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._poses = {}
+        self._pending_since = None
+        self._app = None
+        self._flusher = None
+
+    def record(self, agv, x, y, theta):
+        """Records the pose of a loaded AGV, without marking the AGV as modified in the session"""
+        with self._lock:
+            self._poses[agv.id] = (x, y, theta)
+            if self._pending_since is None:
+                self._pending_since = time.monotonic()
+        self.apply(agv)
+
+    def apply(self, agv):
+        pose = self._poses.get(agv.id)
+        if pose is not None:
+            for field, value in zip(POSE_FIELDS, pose):
+                set_committed_value(agv, field, value)
+        return agv
+
+    def flush_due(self, durability_window):
+        pending_since = self._pending_since
+        return pending_since is not None and time.monotonic() - pending_since >= durability_window
+
+    def write_pending(self):
+        """
+        Writes every pending pose within the current transaction (the caller commits it), once committed the
+        poses stored in the table are the latest ones
+        """
+        written_poses = db.session.info.setdefault(WRITTEN_POSES_KEY, {})
+        with self._lock:
+            poses = {
+                agv_id: pose
+                for agv_id, pose in self._poses.items()
+                if written_poses.get(agv_id) != pose
+            }
+        if poses:
+            db.session.bulk_update_mappings(
+                AGV,
+                [{"id": agv_id, **dict(zip(POSE_FIELDS, pose))} for agv_id, pose in poses.items()],
+            )
+            written_poses.update(poses)
+
+    def confirm_written(self, poses):
+        """Drops the committed poses, unless a newer pose of the same AGV was recorded in the meantime"""
+        with self._lock:
+            for agv_id, pose in poses.items():
+                if self._poses.get(agv_id) == pose:
+                    del self._poses[agv_id]
+            if not self._poses:
+                self._pending_since = None
+
+    def flush(self, app, due_only=False):
+        """Writes (and commits) the pending poses on a session of its own"""
+        if not self._poses:
+            return
+        with app.app_context():
+            if due_only and not self.flush_due(app.config["AGV_STATE_DURABILITY_WINDOW"]):
+                return
+            try:
+                self.write_pending()
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                app.logger.exception("unable to write the pending AGV poses")
+
+    def start_flusher(self, app):
+        """Starts the background thread writing the pending poses of the app once due (once per process)"""
+        with self._lock:
+            self._app = app
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(
+                target=self._run_flusher, name="agv-state-flusher", daemon=True
+            )
+        self._flusher.start()
+        atexit.register(self._flush_at_exit)
+
+    def _run_flusher(self):
+        while True:
+            # pending poses are written at most half a window after they fall due
+            time.sleep(self._app.config["AGV_STATE_DURABILITY_WINDOW"] / 2 or 1.0)
+            self.flush(self._app, due_only=True)
+
+    def _flush_at_exit(self):
+        self.flush(self._app)
+
+    def discard(self, agv_id):
+        with self._lock:
+            self._poses.pop(agv_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._poses, self._pending_since = {}, None
+
+    def __contains__(self, agv_id):
+        return agv_id in self._poses
+
+
+agv_state_store = AGVStateStore()
+
+
+@event.listens_for(AGV, "load")
+def _apply_pending_pose_on_load(agv, context):
+    agv_state_store.apply(agv)
+
+
+@event.listens_for(AGV, "refresh")
+def _apply_pending_pose_on_refresh(agv, context, attrs):
+    agv_state_store.apply(agv)
+
+
+@event.listens_for(Session, "after_commit")
+def _confirm_written_poses(session):
+    poses = session.info.pop(WRITTEN_POSES_KEY, None)
+    if poses:
+        agv_state_store.confirm_written(poses)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_written_poses(session, transaction):
+    # poses written by a transaction that is rolled back (or closed) without committing stay pending
+    if transaction.parent is None:
+        session.info.pop(WRITTEN_POSES_KEY, None)
@@ -0,0 +1,103 @@
+import json
+import threading
+import time
+
+
+def agv_telemetry(agv):
+    """The subset of the AGV streamed to telemetry subscribers, shaped like AGVDetailSerializer output"""
+    return {
+        "id": agv.id,
+        "status": str(agv.status) if agv.status is not None else None,
+        "x": agv.x,
+        "y": agv.y,
+        "theta": agv.theta,
+        "current_task_id": agv.current_task_id,
+    }
+
+
+def format_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class FleetTelemetry:
+    """
+    Process-local latest telemetry of every AGV, published as AGV updates are ingested and fanned out to any
+    number of stream subscribers without querying the database. Each change bumps a global version,
+    subscribers remember the version they last sent and collect the AGVs changed since, so however many
+    updates an AGV posts between two events a subscriber only receives its latest state.
+    """
+
+    def __init__(self):
+        self._changed = threading.Condition()
+        self._states = {}
+        self._versions = {}
+        self._version = 0
+
+    def publish(self, agv):
+        state = agv_telemetry(agv)
+        with self._changed:
+            self._version += 1
+            self._states[agv.id] = state
+            self._versions[agv.id] = self._version
+            self._changed.notify_all()
+
+    def remove(self, agv_id):
+        with self._changed:
+            if self._states.get(agv_id) is None:
+                return
+            self._version += 1
+            # removed AGVs are kept as None, so subscribers behind this version learn of the removal
+            self._states[agv_id] = None
+            self._versions[agv_id] = self._version
+            self._changed.notify_all()
+
+    def rebuild(self, agvs):
+        with self._changed:
+            self._version += 1
+            self._states = {agv.id: agv_telemetry(agv) for agv in agvs}
+            self._versions = {agv_id: self._version for agv_id in self._states}
+            self._changed.notify_all()
+
+    def clear(self):
+        self.rebuild([])
+
+    def snapshot(self):
+        """Returns (version, [telemetry of every AGV])"""
+        with self._changed:
+            return self._version, [state for state in self._states.values() if state is not None]
+
+    def wait_for_changes(self, version, timeout):
+        """
+        Blocks until telemetry changed after version or timeout seconds pass, returns (latest version, [latest
+        telemetry of every AGV changed since version]), removed AGVs are reported as {"id", "removed": True}
+        """
+        with self._changed:
+            self._changed.wait_for(lambda: self._version > version, timeout)
+            changes = [
+                self._states[agv_id] or {"id": agv_id, "removed": True}
+                for agv_id, agv_version in self._versions.items()
+                if agv_version > version
+            ]
+            return self._version, changes
+
+    def stream(self, min_interval, keepalive_interval):
+        """
+        Generates server-sent events: a "snapshot" of the whole fleet, then an "update" with the AGVs changed
+        since the previous event at most every min_interval seconds (a comment is sent every keepalive_interval
+        seconds without changes, so idle connections are not dropped by proxies)
+        """
+        version, states = self.snapshot()
+        yield format_event("snapshot", states)
+        last_event = time.monotonic()
+        while True:
+            # changes published while sleeping are coalesced into the next event
+            time.sleep(max(0.0, last_event + min_interval - time.monotonic()))
+            version, changes = self.wait_for_changes(version, keepalive_interval)
+            if not changes:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_event("update", changes)
+            last_event = time.monotonic()
+
+
+fleet_telemetry = FleetTelemetry()
@@ -0,0 +1,123 @@
+import threading
+
+from app.database import db
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# session.info key of the updates claimed within the session's current transaction
+CLAIMED_UPDATES_KEY = "update_sequences.claimed_updates"
+
+
+class UpdateSequences:
+    """
+    Process-local record of the highest sequence number (seq) of the updates received from each AGV, together
+    with the response sent for it. AGVs may number their updates: an update is only applied when its seq is
+    above every seq received from the AGV, so updates delivered late (ie - retried over a flaky link) never
+    rewind an AGV, and a retry of the latest update is answered with the response of the original (including
+    any command it delivered) without any database work.
+
+    AGVs that restart numbering their updates (ie - on reboot) also send a higher epoch with them, the updates
+    of a newer epoch are accepted whatever their seq, and those of an older one are stale. Updates without an
+    epoch belong to epoch 0.
+
+    AGVs that do not number their updates are never tracked. The record is lost on restart, after which the
+    first update received from an AGV is accepted whatever its seq.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (epoch, seq), the (status code, response) sent for it (or None while it is being applied) and the
+        # latest answered entry it replaced (restored when the update is released)
+        self._latest = {}
+
+    def latest(self, agv_id):
+        """Returns the highest (epoch, seq) received from the AGV (or None)"""
+        entry = self._latest.get(agv_id)
+        return entry[0] if entry is not None else None
+
+    def cached_response(self, agv_id, seq, epoch=0):
+        """Returns the (status code, response) sent for the AGV's update seq, if it is the latest and answered"""
+        entry = self._latest.get(agv_id)
+        if entry is None or entry[0] != (epoch, seq):
+            return None
+        return entry[1]
+
+    def claim(self, agv_id, seq, epoch=0):
+        """
+        Claims seq before the update is applied, returns False when an update with the same or a higher seq
+        was received (or is being applied) already
+        """
+        with self._lock:
+            entry = self._latest.get(agv_id)
+            if entry is not None and (epoch, seq) <= entry[0]:
+                return False
+            previous = entry if entry is None or entry[1] is not None else entry[2]
+            self._latest[agv_id] = ((epoch, seq), None, previous)
+            return True
+
+    def record(self, agv_id, seq, status_code, response, epoch=0):
+        """Stores the response sent for the AGV's update seq, unless a newer update was claimed meanwhile"""
+        with self._lock:
+            if self.latest(agv_id) == (epoch, seq):
+                self._latest[agv_id] = ((epoch, seq), (status_code, response), None)
+
+    def release(self, agv_id, seq, epoch=0):
+        """
+        Releases the claim of an update that was not applied (ie - its request failed), so a retry of it is
+        applied rather than rejected as stale. Claims superseded by a newer update are left as they are
+        """
+        with self._lock:
+            entry = self._latest.get(agv_id)
+            if entry is None or entry[0] != (epoch, seq) or entry[1] is not None:
+                return
+            if entry[2] is None:
+                del self._latest[agv_id]
+            else:
+                self._latest[agv_id] = entry[2]
+
+    def discard(self, agv_id):
+        with self._lock:
+            self._latest.pop(agv_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._latest = {}
+
+
+update_sequences = UpdateSequences()
+
+
+def claim_update(agv_id, seq, epoch=0):
+    """
+    Claims the AGV's update seq (see UpdateSequences.claim) for the current transaction: its response (see
+    answer_update) is only recorded once the transaction commits, otherwise the claim is released
+    """
+    if not update_sequences.claim(agv_id, seq, epoch):
+        return False
+    db.session.info.setdefault(CLAIMED_UPDATES_KEY, {})[agv_id] = (seq, epoch, None)
+    return True
+
+
+def answer_update(agv_id, status_code, response):
+    """Sets the response of the update claimed for the AGV within the current transaction"""
+    claimed_updates = db.session.info.get(CLAIMED_UPDATES_KEY, {})
+    if agv_id in claimed_updates:
+        seq, epoch, _ = claimed_updates[agv_id]
+        claimed_updates[agv_id] = (seq, epoch, (status_code, response))
+
+
+@event.listens_for(Session, "after_commit")
+def _record_claimed_updates(session):
+    for agv_id, (seq, epoch, answer) in session.info.pop(CLAIMED_UPDATES_KEY, {}).items():
+        if answer is None:
+            update_sequences.release(agv_id, seq, epoch)
+        else:
+            update_sequences.record(agv_id, seq, *answer, epoch=epoch)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _release_claimed_updates(session, transaction):
+    # the updates of a transaction that is rolled back (or closed) without committing were never applied
+    if transaction.parent is None:
+        for agv_id, (seq, epoch, _) in session.info.pop(CLAIMED_UPDATES_KEY, {}).items():
+            update_sequences.release(agv_id, seq, epoch)
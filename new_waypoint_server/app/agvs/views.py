@@ -1,13 +1,20 @@
 from app.core import validators
-from app.database import db
-from flask import current_app, jsonify, make_response, request
+from app.database import db, delete_in_chunks, on_commit
+from app.tasks.index import task_index
+from app.tasks.models import Task
+from app.tasks.reservations import release_reservation
+from flask import Response, current_app, jsonify, make_response, request
 from flask_api import status
 from flask_restful import Resource
 
 from . import agvs_api
+from .constants import AGVState
 from .controllers import PoseAssignmentController
 from .models import AGV
 from .serializers import AGVCreateSerializer, AGVDetailSerializer
+from .state_store import agv_state_store
+from .telemetry import fleet_telemetry
+from .update_sequences import update_sequences
 
 
 class AGVCreateView(Resource):
@@ -20,6 +27,7 @@ class AGVCreateView(Resource):
             return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
         agv = serializer.load(data, session=db.session)
         agv.save()
+        fleet_telemetry.publish(agv)
 
         # TODO: Add Pose Assignment / Coordinate Standarization
         # PoseAssignmentController.perform_pose_assignment(agv)
@@ -49,19 +57,48 @@ class AGVListView(Resource):
         return make_response(jsonify(data), status.HTTP_200_OK)
 
     def delete(self):
-        agvs = AGV.query.all()
-        if not agvs:
+        agv_state = request.args.get("status", None)
+        if not self._query_parameters_valid(agv_state):
             return make_response(
-                jsonify({"message": "No AGVs currently exist to delete"}), status.HTTP_202_ACCEPTED
+                jsonify({"message": "Invalid query parameters"}), status.HTTP_400_BAD_REQUEST
             )
-
-        for agv in agvs:
-            agv.delete()
-
-        return make_response(
-            jsonify({"message": "All AGVs successfully deleted"}), status.HTTP_200_OK
+        criteria = [AGV.status == AGVState(agv_state)] if agv_state is not None else []
+
+        chunk_size = current_app.config["BULK_DELETE_CHUNK_SIZE"]
+        num_tasks_released, released_task_ids = 0, []
+
+        def release_tasks(agv_ids):
+            # deleting an AGV releases its tasks to the general / drive train pools
+            tasks = Task.query.filter(Task.agv_id.in_(agv_ids))
+            released_task_ids[:] = [task_id for (task_id,) in tasks.with_entities(Task.id)]
+            tasks.update({Task.agv_id: None}, synchronize_session=False)
+
+        def discard_agvs(agv_ids):
+            nonlocal num_tasks_released
+            for agv_id in agv_ids:
+                release_reservation(agv_id)
+                agv_state_store.discard(agv_id)
+                update_sequences.discard(agv_id)
+                fleet_telemetry.remove(agv_id)
+            for start in range(0, len(released_task_ids), chunk_size):
+                task_ids = released_task_ids[start : start + chunk_size]
+                for task in Task.query.filter(Task.id.in_(task_ids)):
+                    task_index.sync(task)
+            num_tasks_released += len(released_task_ids)
+
+        num_deleted = delete_in_chunks(
+            AGV, criteria, chunk_size, before_delete=release_tasks, after_commit=discard_agvs
         )
 
+        counts = {"num_deleted": num_deleted, "num_tasks_released": num_tasks_released}
+        if not num_deleted:
+            message = (
+                "No AGVs currently exist to delete" if not criteria else "No AGVs match the filters"
+            )
+            return make_response(jsonify({"message": message, **counts}), status.HTTP_202_ACCEPTED)
+        message = "All AGVs successfully deleted" if not criteria else "AGVs successfully deleted"
+        return make_response(jsonify({"message": message, **counts}), status.HTTP_200_OK)
+
 
 class AGVDetailView(Resource):
     def _get_queryset(self):
@@ -93,10 +130,44 @@ class AGVDetailView(Resource):
                 ),
                 status.HTTP_400_BAD_REQUEST,
             )
+        agv_tasks = list(agv.tasks)
+        release_reservation(agv.id)
+        agv_state_store.discard(agv.id)
+        update_sequences.discard(agv.id)
+        fleet_telemetry.remove(agv.id)
         agv.delete()
+        # deleting the AGV releases its tasks to the general / drive train pools, they are indexed as such once
+        # the delete (clearing their agv_id) is committed
+        for task in agv_tasks:
+            on_commit(task_index.sync, task)
         return make_response(jsonify({"message": "AGV successfully deleted"}), status.HTTP_200_OK)
 
 
+class AGVTelemetryStreamView(Resource):
+    def get(self):
+        # server-sent events of fleet telemetry, at most max_rate events per second (capped to
+        # TELEMETRY_STREAM_MAX_RATE) coalescing the updates in between
+        max_rate = current_app.config["TELEMETRY_STREAM_MAX_RATE"]
+        try:
+            max_rate = min(float(request.args.get("max_rate", max_rate)), max_rate)
+        except ValueError:
+            max_rate = 0
+        if not max_rate > 0:
+            return make_response(
+                jsonify({"message": "max_rate must be a positive number of events per second"}),
+                status.HTTP_400_BAD_REQUEST,
+            )
+        events = fleet_telemetry.stream(
+            1.0 / max_rate, current_app.config["TELEMETRY_STREAM_KEEPALIVE_INTERVAL"]
+        )
+        return Response(
+            events,
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+
 agvs_api.add_resource(AGVCreateView, "/")
 agvs_api.add_resource(AGVDetailView, "/<int:id>/")
 agvs_api.add_resource(AGVListView, "/agvs/")
+agvs_api.add_resource(AGVTelemetryStreamView, "/stream/")
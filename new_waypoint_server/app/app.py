@@ -1,35 +1,62 @@
 import app.cli_commands as cli_commands
 import click
 from app.config import ConfigType, DeploymentConfig, DevelopmentConfig, TestingConfig
+from app.database import commit_unit_of_work
 from app.extentions import db, ma, migrate
 from flask import Flask
 from flask.cli import with_appcontext
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
 
 
-def create_app(conf_type=ConfigType.DEVELOPMENT):
+def create_app(conf_type=ConfigType.DEVELOPMENT, config_overrides=None):
     app = Flask(__name__)
     # sync config
-    initialize_config(app, conf_type)
+    initialize_config(app, conf_type, config_overrides)
     # set up all flask extensions
     initialize_extensions(app)
     # register routes and blueprints
     register_blueprints(app)
     # set up flask cli commands
     register_commands(app)
+    # ingest binary telemetry over UDP
+    initialize_telemetry_listener(app)
 
     return app
 
 
-def initialize_config(app, conf_type):
+def initialize_config(app, conf_type, config_overrides=None):
     conf_dict = {conf.name: conf.value for conf in ConfigType}
     conf_class = conf_dict.get(conf_type.name, DevelopmentConfig)
     app.config.from_object(conf_class)
+    app.config.update(config_overrides or {})
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if uses_sqlite_file(app) and app.config["SQLITE_POOL_SIZE"] is not None:
+        # Flask-SQLAlchemy opens (and closes) a connection per request to SQLite database files by default
+        app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+            "poolclass": QueuePool,
+            "pool_size": app.config["SQLITE_POOL_SIZE"],
+            # requests beyond the pool size (ie - long polls) get short lived connections instead of waiting
+            "max_overflow": -1,
+            "connect_args": {"check_same_thread": False},
+        }
+
+
+def uses_sqlite_file(app):
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
 
 
 def initialize_extensions(app):
     db.init_app(app)
+    app.after_request(commit_unit_of_work)
     initialize_database(app)
+    initialize_task_index(app)
+    initialize_command_queues(app)
+    initialize_fleet_telemetry(app)
+    initialize_agv_state_store(app)
     ma.init_app(app)
     migrate.init_app(app, db)
 
@@ -68,11 +95,91 @@ def initialize_database(app):
     from app.tasks.models import Task, Waypoint
 
     with app.app_context():
+        if uses_sqlite_file(app) and app.config["SQLITE_PRAGMAS"]:
+            set_sqlite_pragmas(db.get_engine(app), app.config["SQLITE_PRAGMAS"])
         # db.drop_all()
         db.create_all()
         db.session.commit()
 
 
+def set_sqlite_pragmas(engine, pragmas):
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def initialize_task_index(app):
+    from app.tasks.constants import TaskStatus
+    from app.tasks.index import task_index
+    from app.tasks.models import Task
+
+    with app.app_context():
+        try:
+            task_index.rebuild(
+                Task.query.filter_by(status=TaskStatus.INCOMPLETE).all(),
+                cell_size=app.config["TASK_INDEX_CELL_SIZE"],
+            )
+        except OperationalError:
+            # the database schema is behind the models, the index is rebuilt once migrations are applied
+            db.session.rollback()
+            app.logger.warning("unable to build the task index, run: flask db upgrade")
+
+
+def initialize_command_queues(app):
+    from app.commands.models import Command
+    from app.commands.queues import command_queues
+
+    with app.app_context():
+        try:
+            command_queues.rebuild(
+                Command.query.filter_by(processed=False).order_by(Command.id.asc())
+            )
+        except OperationalError:
+            db.session.rollback()
+            app.logger.warning("unable to load the pending commands, run: flask db upgrade")
+
+
+def initialize_fleet_telemetry(app):
+    from app.agvs.models import AGV
+    from app.agvs.telemetry import fleet_telemetry
+
+    with app.app_context():
+        try:
+            fleet_telemetry.rebuild(AGV.query.all())
+        except OperationalError:
+            db.session.rollback()
+            app.logger.warning("unable to load the fleet telemetry, run: flask db upgrade")
+
+
+def initialize_agv_state_store(app):
+    from app.agvs.state_store import agv_state_store
+
+    # pose telemetry held in memory must reach the database even when no further update arrives
+    if app.config["AGV_STATE_DURABILITY_WINDOW"]:
+        agv_state_store.start_flusher(app)
+
+
+def initialize_telemetry_listener(app):
+    from app.agv_request_handlers.udp_listener import start_telemetry_listener
+
+    udp_port = app.config["TELEMETRY_UDP_PORT"]
+    if udp_port is None:
+        return
+    try:
+        start_telemetry_listener(app, app.config["HOST"], udp_port)
+    except OSError as error:
+        app.logger.warning(f"unable to listen for telemetry on UDP port {udp_port}: {error}")
+
+
 def register_commands(app):
     app.cli.add_command(cli_commands.init_db)
     app.cli.add_command(cli_commands.test)
+    app.cli.add_command(cli_commands.backfill_task_metrics)
+    app.cli.add_command(cli_commands.import_tasks)
+    app.cli.add_command(cli_commands.benchmark_schedulers)
+    app.cli.add_command(cli_commands.benchmark_update_state)
+    app.cli.add_command(cli_commands.benchmark_task_claims)
+    app.cli.add_command(cli_commands.simulate_fleet)
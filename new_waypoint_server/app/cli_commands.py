@@ -1,11 +1,22 @@
+import json
 import os
+import tempfile
 import unittest
 
 import app
 import click
 from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy.orm import selectinload, undefer
 
+from .agvs.state_store import agv_state_store
+from .agvs.telemetry import fleet_telemetry
+from .agvs.update_sequences import update_sequences
+from .commands.queues import command_queues
 from .extentions import db
+from .tasks.index import task_index
+from .tasks.models import Task
+from .tasks.reservations import task_reservations
 
 
 @click.command()
@@ -25,3 +36,248 @@ def init_db():
         db.drop_all()
         db.create_all()
         db.session.commit()
+        task_index.clear()
+        task_reservations.clear()
+        agv_state_store.clear()
+        update_sequences.clear()
+        fleet_telemetry.clear()
+        command_queues.clear()
+
+
+@click.command()
+@click.option("--batch-size", default=500, show_default=True, help="Tasks processed per commit")
+@with_appcontext
+def backfill_task_metrics(batch_size):
+    """Flask CLI command to (re)compute the stored path metrics of every existing task"""
+    last_task_id, num_updated = 0, 0
+    while True:
+        tasks = (
+            Task.query.options(selectinload(Task.waypoints), undefer(Task.route))
+            .filter(Task.id > last_task_id)
+            .order_by(Task.id.asc())
+            .limit(batch_size)
+            .all()
+        )
+        if not tasks:
+            break
+        for task in tasks:
+            task.compute_path_metrics()
+        db.session.commit()
+        last_task_id, num_updated = tasks[-1].id, num_updated + len(tasks)
+    click.echo(f"Backfilled path metrics for {num_updated} tasks")
+
+
+@click.command()
+@click.argument("tasks_file", type=click.File("rb"))
+@click.option("--chunk-size", default=None, type=int, help="Tasks inserted per commit")
+@with_appcontext
+def import_tasks(tasks_file, chunk_size):
+    """Flask CLI command to bulk import the tasks of an NDJSON file (or a JSON array of tasks)"""
+    from app.tasks.bulk_import import import_tasks as import_task_stream
+
+    chunk_size = chunk_size or current_app.config["TASK_IMPORT_CHUNK_SIZE"]
+    num_created, errors = import_task_stream(tasks_file, chunk_size)
+    for position, error in errors.items():
+        click.echo(f"{position}: {error}", err=True)
+    click.echo(f"Imported {num_created} tasks ({len(errors)} rejected)")
+
+
+def _parse_sizes(ctx, param, value):
+    try:
+        return [int(size) for size in value.split(",")]
+    except ValueError:
+        raise click.BadParameter("expected a comma separated list of integers")
+
+
+@click.command()
+@click.option("--fleet-sizes", default="10,100,1000", show_default=True, callback=_parse_sizes)
+@click.option(
+    "--backlog-sizes", default="100,1000,10000,100000", show_default=True, callback=_parse_sizes
+)
+@click.option("--decisions", default=200, show_default=True, help="Task requests simulated per run")
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--output", type=click.File("w"), default=None, help="Write the JSON results to a file"
+)
+def benchmark_schedulers(fleet_sizes, backlog_sizes, decisions, seed, output):
+    """Flask CLI command to benchmark every task scheduler against synthetic fleets and backlogs"""
+    # runs against a separate in memory database, the server's database is never touched
+    from app.app import create_app
+    from app.config import ConfigType
+    from app.task_scheduler.benchmark import run_scheduler_benchmarks
+    from app.task_scheduler.scheduler import TASK_SCHEDULER_MAP
+
+    with create_app(ConfigType.TESTING).app_context():
+        results = run_scheduler_benchmarks(
+            TASK_SCHEDULER_MAP, fleet_sizes, backlog_sizes, decisions, seed
+        )
+        task_index.clear()
+
+    # a human readable summary goes to stderr whenever the JSON results are written to stdout
+    for result in results:
+        run = f"{result['scheduler']} {result['mode']} agvs={result['fleet_size']} tasks={result['backlog_size']}"
+        if "skipped" in result:
+            click.echo(f"{run}: skipped, {result['skipped']}", err=output is None)
+            continue
+        click.echo(
+            f"{run}: {result['decisions_per_sec']:.1f} decisions/s, p50={result['p50_ms']:.3f}ms, "
+            f"p99={result['p99_ms']:.3f}ms, travel distance={result['travel_distance']:.1f}",
+            err=output is None,
+        )
+    json.dump({"results": results}, output or click.get_text_stream("stdout"), indent=2)
+
+
+@click.command()
+@click.option("--agvs", default=100, show_default=True, help="Fleet size")
+@click.option("--threads", default=8, show_default=True, help="Concurrent AGV connections")
+@click.option("--updates", default=250, show_default=True, help="update_state requests per thread")
+@click.option(
+    "--output", type=click.File("w"), default=None, help="Write the JSON results to a file"
+)
+def benchmark_update_state(agvs, threads, updates, output):
+    """Flask CLI command to benchmark update_state throughput with default and tuned SQLite settings"""
+    # runs against a temporary database file, the server's database is never touched
+    from app.agv_request_handlers.benchmark import run_update_state_benchmark
+    from app.app import create_app
+    from app.config import ConfigType, DeploymentConfig
+
+    profiles = {
+        "default": {"SQLITE_POOL_SIZE": None, "SQLITE_PRAGMAS": {}},
+        "tuned": {
+            "SQLITE_POOL_SIZE": DeploymentConfig.SQLITE_POOL_SIZE,
+            "SQLITE_PRAGMAS": DeploymentConfig.SQLITE_PRAGMAS,
+        },
+    }
+    results = []
+    for profile, profile_config in profiles.items():
+        with tempfile.TemporaryDirectory() as directory:
+            config_overrides = {
+                **profile_config,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{directory}/benchmark.db",
+                # every update is written through, as without the AGV state store
+                "AGV_STATE_DURABILITY_WINDOW": 0,
+            }
+            benchmark_app = create_app(ConfigType.DEPLOYMENT, config_overrides)
+            with benchmark_app.app_context():
+                result = run_update_state_benchmark(benchmark_app, agvs, threads, updates)
+                db.session.remove()
+                db.get_engine(benchmark_app).dispose()
+            fleet_telemetry.clear()
+        results.append({"profile": profile, **result})
+
+    # a human readable summary goes to stderr whenever the JSON results are written to stdout
+    for result in results:
+        click.echo(
+            f"{result['profile']} agvs={result['agvs']} threads={result['threads']}: "
+            f"{result['updates_per_sec']:.1f} updates/s, p50={result['p50_ms']:.3f}ms, "
+            f"p99={result['p99_ms']:.3f}ms, failed={result['failed_updates']}",
+            err=output is None,
+        )
+    json.dump({"results": results}, output or click.get_text_stream("stdout"), indent=2)
+
+
+@click.command()
+@click.option("--workers", default="1,2,4", show_default=True, callback=_parse_sizes)
+@click.option("--agvs", default=32, show_default=True, help="Fleet size")
+@click.option("--tasks", default=1000, show_default=True, help="Backlog size")
+@click.option(
+    "--arrivals",
+    default=0,
+    show_default=True,
+    help="Tasks created (and cancelled) by another process while the workers claim",
+)
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--output", type=click.File("w"), default=None, help="Write the JSON results to a file"
+)
+def benchmark_task_claims(workers, agvs, tasks, arrivals, seed, output):
+    """Flask CLI command to benchmark task claiming by concurrent server processes"""
+    # runs against a temporary database file, the server's database is never touched
+    from app.agv_request_handlers.benchmark import run_task_claim_benchmark
+
+    results = [
+        run_task_claim_benchmark(num_workers, agvs, tasks, seed, arrivals) for num_workers in workers
+    ]
+
+    # a human readable summary goes to stderr whenever the JSON results are written to stdout
+    for result in results:
+        click.echo(
+            f"workers={result['workers']} agvs={result['agvs']} tasks={result['tasks']} "
+            f"arrivals={result['arrivals']}: "
+            f"{result['claims_per_sec']:.1f} claims/s, double claims={result['double_claims']}, "
+            f"unclaimed={result['unclaimed_tasks']}",
+            err=output is None,
+        )
+    json.dump({"results": results}, output or click.get_text_stream("stdout"), indent=2)
+
+
+def _format_wait(seconds):
+    # queue waits are None when the run claimed no task at all
+    return "n/a" if seconds is None else f"{seconds:.1f}s"
+
+
+@click.command()
+@click.option("--schedulers", default=None, help="Comma separated TASK_SCHEDULERs [default: all]")
+@click.option("--agvs", default=10, show_default=True, help="Fleet size")
+@click.option(
+    "--speeds", default="1.0", show_default=True, help="AGV speeds (m/s), cycled over the fleet"
+)
+@click.option("--hours", default=8.0, show_default=True, help="Simulated hours of operation")
+@click.option(
+    "--tasks-per-hour", default=120.0, show_default=True, help="Synthetic task arrival rate"
+)
+@click.option(
+    "--trace", type=click.File("r"), default=None, help="JSON task arrival trace to replay"
+)
+@click.option("--dwell-time", default=5.0, show_default=True, help="Seconds spent at each waypoint")
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--output", type=click.File("w"), default=None, help="Write the JSON results to a file"
+)
+def simulate_fleet(
+    schedulers, agvs, speeds, hours, tasks_per_hour, trace, dwell_time, seed, output
+):
+    """Flask CLI command to compare task schedulers in a discrete-event simulation of the fleet"""
+    # runs against a separate in memory database, the server's database is never touched
+    import numpy as np
+    from app.app import create_app
+    from app.config import ConfigType
+    from app.task_scheduler.scheduler import TASK_SCHEDULER_MAP
+    from app.task_scheduler.simulator import generate_arrival_trace, simulate_schedulers
+
+    scheduler_names = schedulers.split(",") if schedulers else list(TASK_SCHEDULER_MAP)
+    unknown_schedulers = set(scheduler_names) - set(TASK_SCHEDULER_MAP)
+    if unknown_schedulers:
+        raise click.BadParameter(f"unknown schedulers: {', '.join(sorted(unknown_schedulers))}")
+    speeds = [float(speed) for speed in speeds.split(",")]
+    agv_speeds = [speeds[agv % len(speeds)] for agv in range(agvs)]
+    duration = hours * 3600.0
+    if trace is not None:
+        arrivals = json.load(trace)
+    else:
+        arrivals = generate_arrival_trace(
+            np.random.default_rng(seed), duration, tasks_per_hour, agvs
+        )
+
+    with create_app(ConfigType.TESTING).app_context():
+        results = simulate_schedulers(
+            scheduler_names, agv_speeds, arrivals, duration, dwell_time=dwell_time, seed=seed
+        )
+        task_index.clear()
+        task_reservations.clear()
+        agv_state_store.clear()
+        update_sequences.clear()
+        fleet_telemetry.clear()
+        command_queues.clear()
+
+    # a human readable summary goes to stderr whenever the JSON results are written to stdout
+    for result in results:
+        click.echo(
+            f"{result['scheduler']}: {result['tasks_completed']}/{result['tasks_arrived']} tasks, "
+            f"{result['throughput_per_hour']:.1f} tasks/h, utilization={result['agv_utilization']:.1%}, "
+            f"wait p50/p99={_format_wait(result['queue_wait_p50_s'])}/"
+            f"{_format_wait(result['queue_wait_p99_s'])}, "
+            f"distance={result['total_distance']:.0f}",
+            err=output is None,
+        )
+    json.dump({"results": results}, output or click.get_text_stream("stdout"), indent=2)
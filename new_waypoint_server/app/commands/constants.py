@@ -6,3 +6,13 @@ class CommandTypes(BaseEnum):
     CANCEL_AGV = "CANCEL_AGV"
     STOP_AGV = "STOP_AGV"
     START_AGV = "START_AGV"
+
+
+# order in which the pending commands of an AGV are processed (lowest first), commands of the same
+# precedence are processed in the order they were created
+COMMAND_PRECEDENCE = {
+    CommandTypes.STOP_AGV: 0,
+    CommandTypes.START_AGV: 1,
+    CommandTypes.CANCEL_AGV: 2,
+    CommandTypes.CANCEL_TASK: 2,
+}
@@ -15,6 +15,22 @@ class Command(Model):
     """
 
     __tablename__ = "command"
+    # partial indexes of the unprocessed commands, looked up per AGV / task when validating commands
+    __table_args__ = (
+        db.Index(
+            "ix_command_pending_agv",
+            "agv_id",
+            "type",
+            sqlite_where=db.text("processed = 0"),
+            postgresql_where=db.text("NOT processed"),
+        ),
+        db.Index(
+            "ix_command_pending_task",
+            "task_id",
+            sqlite_where=db.text("processed = 0"),
+            postgresql_where=db.text("NOT processed"),
+        ),
+    )
     id = Column(db.Integer, primary_key=True)
     agv_id = Column(db.Integer, nullable=True)
     task_id = Column(db.Integer, nullable=True)
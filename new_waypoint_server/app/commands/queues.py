@@ -0,0 +1,131 @@
+import threading
+import time
+
+from app.tasks.priority_queue import IndexedPriorityQueue
+
+from .constants import COMMAND_PRECEDENCE
+
+
+class CommandQueues:
+    """
+    Process-local per AGV and per task priority queues of the ids of unprocessed commands, keyed by
+    (COMMAND_PRECEDENCE, id). Checking whether an AGV has a pending command is O(1) and never touches the
+    database, which remains the durable record of commands (the queues are rebuilt from it on startup).
+
+    Commands must be pushed when they are created, and removed once they are processed or deleted. Every push
+    wakes the threads waiting (see wait) for a command to be queued. Commands created outside of the process
+    (ie - by another server process or the CLI) never reach the queues that way, they are picked up by
+    periodically looking up the unprocessed commands of each AGV within the database (see sync_due).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queued = threading.Condition(self._lock)
+        self._agv_queues = {}
+        self._task_queues = {}
+        self._entries = {}
+        self._synced_at = {}
+
+    def _queue_for(self, agv_id, task_id):
+        if agv_id is not None:
+            return self._agv_queues, agv_id
+        return self._task_queues, task_id
+
+    def push(self, command):
+        if command.agv_id is None and command.task_id is None:
+            # relavent to no AGV, it would never be processed
+            return
+        with self._lock:
+            self._remove(command.id)
+            queues, key = self._queue_for(command.agv_id, command.task_id)
+            queues.setdefault(key, IndexedPriorityQueue()).push(
+                command.id, (COMMAND_PRECEDENCE[command.type], command.id)
+            )
+            self._entries[command.id] = (queues, key)
+            self._queued.notify_all()
+
+    def _remove(self, command_id):
+        entry = self._entries.pop(command_id, None)
+        if entry is None:
+            return
+        queues, key = entry
+        queue = queues[key]
+        queue.remove(command_id)
+        # empty queues are dropped, so an AGV without commands is a single failed lookup
+        if not len(queue):
+            del queues[key]
+
+    def remove(self, command_id):
+        with self._lock:
+            self._remove(command_id)
+
+    def discard_agv(self, agv_id):
+        """Removes every command queued for the AGV (commands queued for its task are kept)"""
+        with self._lock:
+            for command_id in list(self._agv_queues.get(agv_id, ())):
+                self._remove(command_id)
+
+    def rebuild(self, commands):
+        """Replaces the contents of the queues with the provided unprocessed commands"""
+        with self._lock:
+            self._agv_queues, self._task_queues, self._entries = {}, {}, {}
+            self._synced_at = {}
+        for command in commands:
+            self.push(command)
+
+    def clear(self):
+        self.rebuild([])
+
+    def _has_pending(self, agv_id, task_id):
+        return agv_id in self._agv_queues or (task_id is not None and task_id in self._task_queues)
+
+    def has_pending(self, agv):
+        return self._has_pending(agv.id, agv.current_task_id)
+
+    def sync_due(self, agv_id, interval):
+        """
+        Returns whether the AGV's commands were last looked up within the database over interval seconds ago,
+        in which case the lookup is considered done as of now
+        """
+        now = time.monotonic()
+        with self._lock:
+            synced_at = self._synced_at.get(agv_id)
+            if synced_at is not None and now - synced_at < interval:
+                return False
+            self._synced_at[agv_id] = now
+            return True
+
+    def wait(self, agv_id, task_id, timeout):
+        """
+        Blocks until a command is queued for the AGV or its task, or timeout seconds pass, returns whether a
+        command is queued
+        """
+        with self._queued:
+            return self._queued.wait_for(lambda: self._has_pending(agv_id, task_id), timeout)
+
+    def peek(self, agv):
+        """Returns the id of the next command the AGV should process (or None)"""
+        with self._lock:
+            heads = [
+                queue.peek()
+                for queue in (
+                    self._agv_queues.get(agv.id),
+                    self._task_queues.get(agv.current_task_id)
+                    if agv.current_task_id is not None
+                    else None,
+                )
+                if queue is not None
+            ]
+            if not heads:
+                return None
+            _, command_id = min(heads)
+            return command_id
+
+    def __contains__(self, command_id):
+        return command_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+command_queues = CommandQueues()
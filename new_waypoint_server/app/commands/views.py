@@ -1,11 +1,13 @@
 from app.core import validators
-from app.database import db
+from app.database import db, delete_in_chunks, on_commit
 from flask import current_app, jsonify, make_response, request
 from flask_api import status
 from flask_restful import Resource
 
 from . import commands_api
+from .constants import CommandTypes
 from .models import Command
+from .queues import command_queues
 from .serializers import CommandSerializer
 
 
@@ -18,6 +20,8 @@ class CommandCreateView(Resource):
             return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
         command = serializer.load(data, session=db.session)
         command.save()
+        # waiting requests look the command up as soon as it is queued, it must be committed by then
+        on_commit(command_queues.push, command)
         return make_response(jsonify(CommandSerializer().dump(command)), status.HTTP_201_CREATED)
 
 
@@ -53,17 +57,63 @@ class CommandListView(Resource):
         data = serializer.dump(queryset)
         return make_response(jsonify(data), status.HTTP_200_OK)
 
+    def _get_delete_criteria(self, agv_id, task_id, type, processed):
+        """Returns the criteria of the commands to delete, or None when a query parameter is invalid"""
+        if not self._query_parameters_valid(type):
+            return None
+        criteria = []
+        try:
+            if agv_id is not None:
+                criteria.append(Command.agv_id == int(agv_id))
+            if task_id is not None:
+                criteria.append(Command.task_id == int(task_id))
+        except ValueError:
+            return None
+        if type is not None:
+            criteria.append(Command.type == CommandTypes(type))
+        if processed is not None:
+            if processed.lower() not in ("true", "false"):
+                return None
+            criteria.append(Command.processed == (processed.lower() == "true"))
+        return criteria
+
     def delete(self):
-        commands = Command.query.all()
-        if not commands:
+        criteria = self._get_delete_criteria(
+            request.args.get("agv_id", None),
+            request.args.get("task_id", None),
+            request.args.get("type", None),
+            request.args.get("processed", None),
+        )
+        if criteria is None:
             return make_response(
-                jsonify({"message": "No Commands currently exist to delete"}), status.HTTP_202_ACCEPTED
+                jsonify({"message": "Invalid query parameters"}), status.HTTP_400_BAD_REQUEST
             )
 
-        for command in commands:
-            command.delete()
+        def dequeue_commands(command_ids):
+            for command_id in command_ids:
+                command_queues.remove(command_id)
 
-        return make_response(jsonify({"message": "All Commands successfully deleted"}), status.HTTP_200_OK)
+        num_deleted = delete_in_chunks(
+            Command,
+            criteria,
+            current_app.config["BULK_DELETE_CHUNK_SIZE"],
+            after_commit=dequeue_commands,
+        )
+        if not num_deleted:
+            message = (
+                "No Commands currently exist to delete"
+                if not criteria
+                else "No Commands match the filters"
+            )
+            return make_response(
+                jsonify({"message": message, "num_deleted": 0}), status.HTTP_202_ACCEPTED
+            )
+        message = (
+            "All Commands successfully deleted" if not criteria else "Commands successfully deleted"
+        )
+        return make_response(
+            jsonify({"message": message, "num_deleted": num_deleted}), status.HTTP_200_OK
+        )
 
 
 class CommandDetailView(Resource):
@@ -91,6 +141,7 @@ class CommandDetailView(Resource):
                 jsonify({"message": "Command was not registered within the waypoint server"}),
                 status.HTTP_400_BAD_REQUEST,
             )
+        command_queues.remove(command.id)
         command.delete()
         return make_response(jsonify({"message": "Command successfully deleted"}), status.HTTP_200_OK)
 
@@ -8,11 +8,15 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
-class DevelopmentConfig:
-    """Config for Development Waypoint Server"""
+class Config:
+    """Settings shared by every Waypoint Server config, each config overrides only what differs"""
 
     SECRET_KEY = os.environ.get("SECRET_KEY", None)
     SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI", "sqlite:///server.db")
+    # connections kept open to a SQLite database file (None opens one per request), and the PRAGMAs run on
+    # every new connection
+    SQLITE_POOL_SIZE = None
+    SQLITE_PRAGMAS = {}
     PORT = int(os.environ.get("PORT", 5000))
     HOST = "0.0.0.0"
     X_COORD_LOWER_BOUND = -1000
@@ -20,44 +24,78 @@ class DevelopmentConfig:
     Y_COORD_LOWER_BOUND = -1000
     Y_COORD_UPPER_BOUND = 1000
     TASK_SCHEDULER = TaskSchedulers.GREEDY
+    # seconds a fleet-wide task assignment round stays valid for (used by batch task schedulers)
+    TASK_ASSIGNMENT_CACHE_TTL = 5
+    # side length of the grid cells used to spatially index the starting waypoints of INCOMPLETE tasks
+    TASK_INDEX_CELL_SIZE = 10.0
+    # seconds between lookups of the tasks changed by other server processes (None disables)
+    TASK_INDEX_REFRESH_INTERVAL = 1.0
+    # fraction of its current task's waypoints a BUSY AGV visits before its next task is reserved (None disables)
+    TASK_PREASSIGNMENT_ROUTE_FRACTION = 0.75
+    # seconds a reserved task stays withheld once its AGV stops reporting progress on its current task, and the
+    # seconds before reserving is retried when no task was available
+    TASK_RESERVATION_TTL = 30
+    TASK_RESERVATION_RETRY_INTERVAL = 5
+    # seconds task creation may spend optimizing the visiting order of waypoints (when requested)
+    ROUTE_OPTIMIZATION_TIME_BUDGET = 0.05
+    # most waypoints a task may have its visiting order optimized for
+    ROUTE_OPTIMIZATION_MAX_WAYPOINTS = 500
+    # tasks with at least this many waypoints store them as a single packed route instead of rows (None disables)
+    PACKED_ROUTE_MIN_WAYPOINTS = 1000
+    # tasks validated and inserted per transaction by bulk task imports
+    TASK_IMPORT_CHUNK_SIZE = 1000
+    # rows deleted per transaction by bulk deletes (ie - deleting every task)
+    BULK_DELETE_CHUNK_SIZE = 1000
+    # seconds AGV pose telemetry may be held in memory before it is written to the database (0 writes through)
+    AGV_STATE_DURABILITY_WINDOW = 1.0
+    # longest an AGV may wait on /agv_request_handlers/wait_for_command/ for a command to be issued (seconds)
+    COMMAND_LONG_POLL_MAX_TIMEOUT = 30
+    # seconds between database lookups of the unprocessed commands of an AGV without queued commands, picking up
+    # commands issued by other server processes or the CLI (None disables)
+    COMMAND_QUEUE_SYNC_INTERVAL = 1.0
+    # most events per second sent to each /agvs/stream/ subscriber, and the seconds between keep-alive comments
+    TELEMETRY_STREAM_MAX_RATE = 5
+    TELEMETRY_STREAM_KEEPALIVE_INTERVAL = 15
+    # UDP port every server process ingests binary telemetry messages on (None disables)
+    TELEMETRY_UDP_PORT = None
     MAP = "2D_SIMULATION"
     # TODO: Add Pose Assignment / Coordinate Standarization
     POSE_ASSIGMENT_METHOD = None
 
 
-class DeploymentConfig:
+class DevelopmentConfig(Config):
+    """Config for Development Waypoint Server"""
+
+
+class DeploymentConfig(Config):
     """Config for Deployed Waypoint Server"""
 
-    SECRET_KEY = os.environ.get("SECRET_KEY", None)
-    SQLALCHEMY_DATABASE_URI = os.environ.get("SQLALCHEMY_DATABASE_URI", "sqlite:///server.db")
-    PORT = int(os.environ.get("PORT", 5000))
-    HOST = "0.0.0.0"
-    X_COORD_LOWER_BOUND = -1000
-    X_COORD_UPPER_BOUND = 1000
-    Y_COORD_LOWER_BOUND = -1000
-    Y_COORD_UPPER_BOUND = 1000
-    TASK_SCHEDULER = TaskSchedulers.GREEDY
-    MAP = "2D_SIMULATION"
-    # TODO: Add Pose Assignment / Coordinate Standarization
-    POSE_ASSIGMENT_METHOD = None
+    # WAL lets readers proceed while a request writes and only fsyncs on checkpoints (a power loss may roll back
+    # the last commits, never corrupt the database), the busy timeout makes concurrent writers wait on each
+    # other instead of failing, the cache (negative is KiB) and memory map keep the working set out of the
+    # file system
+    SQLITE_POOL_SIZE = 8
+    SQLITE_PRAGMAS = {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "mmap_size": 268435456,
+    }
 
 
 # TODO: Consider deleting this config class, it is practically useless
-class TestingConfig:
+class TestingConfig(Config):
     """Config for Internal Testing Waypoint Server"""
 
-    SECRET_KEY = os.environ.get("SECRET_KEY", None)
     SQLALCHEMY_DATABASE_URI = "sqlite://"
-    PORT = int(os.environ.get("PORT", 5000))
     HOST = "127.0.0.1"
     X_COORD_LOWER_BOUND = 0
     X_COORD_UPPER_BOUND = 11
     Y_COORD_LOWER_BOUND = 0
     Y_COORD_UPPER_BOUND = 11
-    TASK_SCHEDULER = TaskSchedulers.GREEDY
-    MAP = "2D_SIMULATION"
-    # TODO: Add Pose Assignment / Coordinate Standarization
-    POSE_ASSIGMENT_METHOD = None
+    # poses are written through, tests covering the write-behind path set a window of their own
+    AGV_STATE_DURABILITY_WINDOW = 0
 
 
 class ConfigType(Enum):
@@ -0,0 +1,14 @@
+import sqlalchemy as sa
+from alembic import op
+
+# helpers shared by the alembic migrations (see migrations/versions)
+# NOTE: the Waypoint Server also calls db.create_all() on startup, so the columns and indexes a migration adds may
+# already exist, migrations check for them before adding them
+
+
+def existing_columns(table_name):
+    return {column["name"] for column in sa.inspect(op.get_bind()).get_columns(table_name)}
+
+
+def existing_indexes(table_name):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table_name)}
@@ -1,34 +1,48 @@
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
 from .extentions import db
 
 # Alias common SQLAlchemy names
 Column = db.Column
 relationship = db.relationship
 
+# session.info keys of the callbacks run once the session's current transaction is committed (see on_commit)
+ON_COMMIT_KEY = "database.on_commit"
+COMMITTED_KEY = "database.committed"
+
 class CRUDMixin(object):
-    """Mixin that adds convenience methods for CRUD (create, read, update, delete) operations."""
+    """
+    Mixin that adds convenience methods for CRUD (create, read, update, delete) operations.
+
+    Changes are only committed when asked to: every request is a single unit of work, committed once after
+    its view returns (see commit_unit_of_work). Code running outside of a request commits on its own.
+    """
 
     @classmethod
     def create(cls, **kwargs):
-        """Create a new record and save it the database."""
+        """Create a new record and add it to the session."""
         instance = cls(**kwargs)
         return instance.save()
 
-    def update(self, commit=True, **kwargs):
+    def update(self, commit=False, **kwargs):
         """Update specific fields of a record."""
         for attr, value in kwargs.items():
             setattr(self, attr, value)
+        db.session.add(self)
         if commit:
-            return self.save()
+            db.session.commit()
         return self
 
-    def save(self, commit=True):
-        """Save the record."""
+    def save(self, commit=False):
+        """Save the record, flushing it so a new record is assigned its id."""
         db.session.add(self)
+        db.session.flush()
         if commit:
             db.session.commit()
         return self
 
-    def delete(self, commit: bool = True) -> None:
+    def delete(self, commit: bool = False) -> None:
         """Remove the record from the database."""
         db.session.delete(self)
         if commit:
@@ -39,3 +53,71 @@ class Model(CRUDMixin, db.Model):
     """Base model class that includes CRUD convenience methods."""
 
     __abstract__ = True
+
+
+def delete_in_chunks(model, criteria, chunk_size, before_delete=None, after_commit=None):
+    """
+    Deletes the rows of model matching criteria with a single set based DELETE per chunk_size rows, every chunk
+    is committed on its own so the database's write lock is only held for a chunk at a time.
+    before_delete(ids) issues the statements the deletion depends on (ie - deleting child rows) within the
+    chunk's transaction, after_commit(ids) updates in memory state once the chunk is deleted.
+    Returns the number of rows deleted
+    """
+    num_deleted, last_id = 0, None
+    while True:
+        query = db.session.query(model.id).filter(*criteria)
+        if last_id is not None:
+            query = query.filter(model.id > last_id)
+        ids = [id for (id,) in query.order_by(model.id.asc()).limit(chunk_size)]
+        if not ids:
+            break
+        if before_delete is not None:
+            before_delete(ids)
+        num_deleted += model.query.filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        if after_commit is not None:
+            after_commit(ids)
+        last_id = ids[-1]
+    # rows deleted by statement are left behind in the session, they must be reloaded
+    db.session.expire_all()
+    return num_deleted
+
+
+def on_commit(callback, *args):
+    """
+    Calls callback(*args) once the session's current transaction is committed, callbacks of a transaction that
+    is rolled back (or closed) are dropped. Process-local state (ie - the task index or the command queues)
+    must only be handed rows every connection can read: a row found in memory but not in the database is
+    taken as deleted elsewhere and dropped
+    """
+    db.session.info.setdefault(ON_COMMIT_KEY, []).append((callback, args))
+
+
+@event.listens_for(Session, "after_commit")
+def _mark_committed(session):
+    if ON_COMMIT_KEY in session.info:
+        session.info[COMMITTED_KEY] = True
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _run_on_commit_callbacks(session, transaction):
+    # no SQL may be emitted within after_commit, the callbacks (ie - loading expired attributes) run once the
+    # transaction has ended
+    if transaction.parent is not None:
+        return
+    callbacks = session.info.pop(ON_COMMIT_KEY, [])
+    if session.info.pop(COMMITTED_KEY, False):
+        for callback, args in callbacks:
+            callback(*args)
+
+
+def commit_unit_of_work(response):
+    """
+    after_request hook committing everything the request changed in a single transaction, server errors
+    roll the request's changes back instead
+    """
+    if response.status_code >= 500:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    return response
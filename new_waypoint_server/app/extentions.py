@@ -2,6 +2,7 @@ from flask_marshmallow import Marshmallow
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 
-db = SQLAlchemy()
+# a session lives for a single request (or unit of work), what it loaded stays valid once committed
+db = SQLAlchemy(session_options={"expire_on_commit": False})
 ma = Marshmallow()
 migrate = Migrate()
@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def solve_min_cost_assignment(cost_matrix):
+    """
+    Solves the rectangular linear assignment problem (min-cost bipartite matching) using the
+    Hungarian algorithm (shortest augmenting path variant), with the inner column scan vectorized in NumPy.
+
+    Returns (row_indices, col_indices) such that every row (or every column if there are fewer columns
+    than rows) is matched exactly once and the sum of cost_matrix[row_indices, col_indices] is minimal.
+    Runs in O(n^2 * m) where n = min(rows, cols) and m = max(rows, cols).
+    """
+    cost = np.asarray(cost_matrix, dtype=np.float64)
+    if cost.ndim != 2:
+        raise ValueError("cost_matrix must be two dimensional")
+
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    num_rows, num_cols = cost.shape
+    if num_rows == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+
+    # potentials and matching use 1-indexed rows/columns, index 0 is a sentinel column
+    row_potential = np.zeros(num_rows + 1)
+    col_potential = np.zeros(num_cols + 1)
+    col_match = np.zeros(num_cols + 1, dtype=np.int64)
+    col_way = np.zeros(num_cols + 1, dtype=np.int64)
+
+    for row in range(1, num_rows + 1):
+        col_match[0] = row
+        current_col = 0
+        min_slack = np.full(num_cols + 1, np.inf)
+        col_used = np.zeros(num_cols + 1, dtype=bool)
+        while True:
+            col_used[current_col] = True
+            current_row = col_match[current_col]
+            free_cols = ~col_used[1:]
+            slack = cost[current_row - 1] - row_potential[current_row] - col_potential[1:]
+            improved = free_cols & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            col_way[1:][improved] = current_col
+
+            masked_slack = np.where(free_cols, min_slack[1:], np.inf)
+            next_col = int(np.argmin(masked_slack)) + 1
+            delta = masked_slack[next_col - 1]
+
+            row_potential[col_match[col_used]] += delta
+            col_potential[col_used] -= delta
+            min_slack[~col_used] -= delta
+
+            current_col = next_col
+            if col_match[current_col] == 0:
+                break
+
+        # augment along the alternating path discovered above
+        while current_col != 0:
+            previous_col = col_way[current_col]
+            col_match[current_col] = col_match[previous_col]
+            current_col = previous_col
+
+    matched_cols = np.nonzero(col_match[1:])[0]
+    matched_rows = col_match[1:][matched_cols] - 1
+    if transposed:
+        matched_rows, matched_cols = matched_cols, matched_rows
+    order = np.argsort(matched_rows)
+    return matched_rows[order], matched_cols[order]
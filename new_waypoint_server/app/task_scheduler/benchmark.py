@@ -0,0 +1,218 @@
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from app.agvs.constants import AGVDriveTrainType, AGVState
+from app.agvs.models import AGV
+from app.database import db
+from app.tasks.constants import Priority, TaskStatus
+from app.tasks.index import load_indexed_tasks, task_index
+from app.tasks.models import Task
+
+from .scheduler import MinCostMatchingTaskScheduler
+from .scoring import TaskFeatures
+
+# side length (in metres) of the square floor synthetic AGVs and waypoints are placed on
+BENCHMARK_AREA_SIZE = 200.0
+# mean number of waypoints beyond the first of a synthetic task, and the mean distance between them
+MEAN_EXTRA_WAYPOINTS = 3
+MEAN_WAYPOINT_SPACING = 8.0
+# fraction of synthetic tasks reserved for a drive train, and for a specific AGV
+DRIVE_TRAIN_TASK_FRACTION = 0.2
+AGV_TASK_FRACTION = 0.05
+PRIORITY_WEIGHTS = {Priority.HIGH: 0.1, Priority.MEDIUM: 0.6, Priority.LOW: 0.3}
+# runs scoring the whole fleet against the whole backlog at once are skipped beyond this many AGV / task
+# pairs (the cost matrix alone takes 8 bytes a pair)
+MAX_FLEET_PAIRS = 20_000_000
+
+
+def generate_fleet(rng, fleet_size):
+    """Returns mappings of fleet_size READY AGVs spread uniformly over the benchmark floor"""
+    drive_train_types = list(AGVDriveTrainType)
+    positions = rng.uniform(0.0, BENCHMARK_AREA_SIZE, size=(fleet_size, 2))
+    return [
+        {
+            "id": agv_id,
+            "ip_address": f"10.0.{agv_id // 256}.{agv_id % 256}",
+            "status": AGVState.READY,
+            "drive_train_type": drive_train_types[agv_id % len(drive_train_types)],
+            "power": 100,
+            "x": float(x),
+            "y": float(y),
+            "theta": 0.0,
+        }
+        for agv_id, (x, y) in enumerate(positions, start=1)
+    ]
+
+
+def random_task_path(rng, num_waypoints):
+    """(num_waypoints, 2) coordinates of a random walk over the benchmark floor"""
+    steps = rng.normal(0.0, MEAN_WAYPOINT_SPACING, size=(num_waypoints - 1, 2))
+    start = rng.uniform(0.0, BENCHMARK_AREA_SIZE, size=2)
+    return np.clip(np.vstack([start, start + np.cumsum(steps, axis=0)]), 0.0, BENCHMARK_AREA_SIZE)
+
+
+def generate_backlog(rng, backlog_size, fleet_size):
+    """
+    Returns (task mappings, {task id: (end x, end y)}) for backlog_size INCOMPLETE tasks, each a random walk
+    of 1 + Poisson(MEAN_EXTRA_WAYPOINTS) waypoints. Waypoints themselves are never stored, only the path
+    metrics the schedulers consume (see Task.compute_path_metrics)
+    """
+    drive_train_types = list(AGVDriveTrainType)
+    priorities = rng.choice(
+        list(PRIORITY_WEIGHTS), size=backlog_size, p=list(PRIORITY_WEIGHTS.values())
+    )
+    restrictions = rng.uniform(size=backlog_size)
+    num_waypoints = 1 + rng.poisson(MEAN_EXTRA_WAYPOINTS, size=backlog_size)
+    created_at = datetime.utcnow()
+
+    task_mappings, task_ends = [], {}
+    for task_id in range(1, backlog_size + 1):
+        count = int(num_waypoints[task_id - 1])
+        path = random_task_path(rng, count)
+        restriction = restrictions[task_id - 1]
+        task_mappings.append(
+            {
+                "id": task_id,
+                "priority": priorities[task_id - 1],
+                "status": TaskStatus.INCOMPLETE,
+                "drive_train_type": drive_train_types[task_id % len(drive_train_types)]
+                if restriction < DRIVE_TRAIN_TASK_FRACTION
+                else None,
+                "agv_id": int(rng.integers(1, fleet_size + 1))
+                if 1.0 - restriction < AGV_TASK_FRACTION
+                else None,
+                "num_waypoints": count,
+                "path_dist_lower_bound": float(
+                    np.hypot(*np.diff(path, axis=0).T).sum() if count > 1 else 0.0
+                ),
+                "start_x": float(path[0, 0]),
+                "start_y": float(path[0, 1]),
+                "created_at": created_at - timedelta(seconds=int(rng.integers(0, 3600))),
+            }
+        )
+        task_ends[task_id] = (float(path[-1, 0]), float(path[-1, 1]))
+    return task_mappings, task_ends
+
+
+def load_scenario(fleet_size, backlog_size, seed):
+    """Replaces the contents of the current database with a synthetic fleet and backlog"""
+    rng = np.random.default_rng(seed)
+    agv_mappings = generate_fleet(rng, fleet_size)
+    task_mappings, task_ends = generate_backlog(rng, backlog_size, fleet_size)
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    db.session.bulk_insert_mappings(AGV, agv_mappings)
+    db.session.bulk_insert_mappings(Task, task_mappings)
+    db.session.commit()
+    task_index.rebuild(Task.query.filter_by(status=TaskStatus.INCOMPLETE).all())
+    return task_ends
+
+
+def _latency_stats(latencies):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    if not len(latencies):
+        return {"decisions_per_sec": 0.0, "p50_ms": None, "p99_ms": None}
+    return {
+        "decisions_per_sec": len(latencies) / latencies.sum() if latencies.sum() else float("inf"),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+def benchmark_decisions(scheduler, fleet_size, backlog_size, num_decisions, seed=0):
+    """
+    Simulates num_decisions task requests (AGVs asking in round robin order, as they would through the
+    TaskAssignmentController) timing candidate retrieval together with generate_optimal_assignment.
+    Every AGV completes its task instantly, ending up at the task's last waypoint
+    """
+    if issubclass(scheduler, MinCostMatchingTaskScheduler):
+        if fleet_size * backlog_size > MAX_FLEET_PAIRS:
+            return {"mode": "decision", "skipped": f"more than {MAX_FLEET_PAIRS} AGV / task pairs"}
+        scheduler.clear_assignment_cache()
+    task_ends = load_scenario(fleet_size, backlog_size, seed)
+    agvs = AGV.query.order_by(AGV.id.asc()).all()
+
+    latencies, travel_distance, num_idle = [], 0.0, 0
+    for decision in range(num_decisions):
+        agv = agvs[decision % len(agvs)]
+        start = time.perf_counter()
+        tasks = load_indexed_tasks(scheduler.retrieve_candidate_task_ids(agv))
+        task = scheduler.generate_optimal_assignment(agv, tasks)
+        latencies.append(time.perf_counter() - start)
+
+        if task is None:
+            num_idle += 1
+            continue
+        travel_distance += float(np.hypot(task.start_x - agv.x, task.start_y - agv.y))
+        travel_distance += task.path_dist_lower_bound
+        task.status = TaskStatus.COMPLETE
+        agv.x, agv.y = task_ends[task.id]
+        db.session.commit()
+        task_index.sync(task)
+
+    return {
+        "mode": "decision",
+        "decisions": num_decisions,
+        "idle_decisions": num_idle,
+        "travel_distance": travel_distance,
+        **_latency_stats(latencies),
+    }
+
+
+def benchmark_round(scheduler, fleet_size, backlog_size, seed=0):
+    """Times a single generate_optimal_assignments call assigning the whole fleet at once"""
+    if fleet_size * backlog_size > MAX_FLEET_PAIRS:
+        return {"mode": "round", "skipped": f"more than {MAX_FLEET_PAIRS} AGV / task pairs"}
+    load_scenario(fleet_size, backlog_size, seed)
+    agvs = AGV.query.order_by(AGV.id.asc()).all()
+    tasks = load_indexed_tasks(task_index.task_ids())
+
+    start = time.perf_counter()
+    assignments = scheduler.generate_optimal_assignments(agvs, tasks)
+    latency = time.perf_counter() - start
+
+    # travel costs are recomputed without priority tiers, leaving the distance driven
+    assigned_agvs = [agv for agv in agvs if agv.id in assignments]
+    assigned_tasks = [assignments[agv.id] for agv in assigned_agvs]
+    travel_costs = TaskFeatures(assigned_tasks).travel_costs(
+        [(agv.x, agv.y) for agv in assigned_agvs]
+    )
+    return {
+        "mode": "round",
+        "decisions": len(assignments),
+        "idle_decisions": fleet_size - len(assignments),
+        "travel_distance": float(np.trace(travel_costs)) if assigned_tasks else 0.0,
+        # every decision of the round is only available once the whole round is solved
+        **_latency_stats([latency] * len(assignments)),
+    }
+
+
+def run_scheduler_benchmarks(schedulers, fleet_sizes, backlog_sizes, num_decisions, seed=0):
+    """
+    Benchmarks every {name: TaskScheduler} against every fleet / backlog size combination (the same seed
+    produces the same scenario for every scheduler), returning one result dictionary per run
+    """
+    results = []
+    for fleet_size in fleet_sizes:
+        for backlog_size in backlog_sizes:
+            for name, scheduler in schedulers.items():
+                scenario = {
+                    "scheduler": name,
+                    "fleet_size": fleet_size,
+                    "backlog_size": backlog_size,
+                    "seed": seed,
+                }
+                decisions = min(num_decisions, backlog_size)
+                results.append(
+                    {
+                        **scenario,
+                        **benchmark_decisions(scheduler, fleet_size, backlog_size, decisions, seed),
+                    }
+                )
+                results.append(
+                    {**scenario, **benchmark_round(scheduler, fleet_size, backlog_size, seed)}
+                )
+    return results
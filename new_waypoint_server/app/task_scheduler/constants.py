@@ -3,3 +3,12 @@ from app.core.enums import BaseEnum
 
 class TaskSchedulers:
     GREEDY = "GREEDY"
+    MIN_COST_MATCHING = "MIN_COST_MATCHING"
+    AGING_EDF = "AGING_EDF"
+
+
+# number of nearest tasks retrieved from the spatial task index for single AGV greedy scheduling
+NEAREST_TASK_CANDIDATES = 8
+
+# cost used to mark an AGV / Task pairing as impossible (ie - mismatched drive train or assigned AGV)
+INFEASIBLE_ASSIGNMENT_COST = 1e12
@@ -1,45 +1,202 @@
+import threading
+import time
 from abc import ABC, abstractmethod
 
-from app.tasks.constants import Priority
+import numpy as np
+from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.tasks.index import load_indexed_tasks, task_index, task_urgency
+from flask import current_app
 
-from .constants import TaskSchedulers
+from .assignment import solve_min_cost_assignment
+from .constants import INFEASIBLE_ASSIGNMENT_COST, NEAREST_TASK_CANDIDATES, TaskSchedulers
+from .scoring import TaskFeatures
 
 
 class TaskScheduler(ABC):
     """An abstract class used for implementing task scheduling algorithms within the Waypoint Server"""
 
+    @classmethod
+    def retrieve_candidate_task_ids(cls, agv):
+        """Returns the ids of the INCOMPLETE tasks the scheduler has to consider for the AGV"""
+        candidate_ids = task_index.candidate_ids(agv)
+        return [task_id for task_ids in candidate_ids.values() for task_id in task_ids]
+
     @abstractmethod
-    def generate_optimal_assignments(agv, tasks):
+    def generate_optimal_assignments(cls, agvs, tasks):
+        """Returns a dictionary mapping AGV ids to the Task each AGV should execute next"""
         pass
 
     @abstractmethod
-    def generate_optimal_assignment(agv, tasks):
+    def generate_optimal_assignment(cls, agv, tasks):
+        """Returns the Task the provided AGV should execute next (or None)"""
         pass
 
+    @classmethod
+    def generate_projected_assignment(cls, agv, tasks):
+        """
+        Returns the Task a projected AGV (ie - an AGV that is not READY yet, see reserve_next_task) should
+        execute next (or None), leaving the assignments of the rest of the fleet untouched
+        """
+        return cls.generate_optimal_assignment(agv, tasks)
+
 
 class GreedyTaskSchedulerSJF(TaskScheduler):
+    @classmethod
+    def retrieve_candidate_task_ids(cls, agv):
+        # only the few tasks with the shortest total path within the highest priority are relavent,
+        # a handful more than one are retrieved in case the index holds tasks claimed elsewhere
+        nearest = task_index.nearest_candidates(agv, agv.x, agv.y, k=NEAREST_TASK_CANDIDATES)
+        return [task_id for cost, task_id in nearest]
+
+    @classmethod
+    def generate_optimal_assignments(cls, agvs, tasks):
+        # AGVs pick one after another, each taking its shortest job among the remaining tasks
+        if not agvs or not tasks:
+            return {}
+        cost_matrix = TaskFeatures(tasks).cost_matrix(agvs)
+        assignments = {}
+        for agv_index, agv in enumerate(agvs):
+            task_column = int(np.argmin(cost_matrix[agv_index]))
+            if cost_matrix[agv_index, task_column] >= INFEASIBLE_ASSIGNMENT_COST:
+                continue
+            assignments[agv.id] = tasks[task_column]
+            cost_matrix[:, task_column] = INFEASIBLE_ASSIGNMENT_COST
+        return assignments
+
+    @classmethod
+    def generate_optimal_assignment(cls, agv, tasks):
+        # the priority tier costs rank every HIGH priority task ahead of MEDIUM and LOW ones, within
+        # the highest available priority the task with the shortest total path distance wins
+        if not tasks:
+            return None
+        costs = TaskFeatures(tasks).costs_for_agv(agv)
+        task_column = int(np.argmin(costs))
+        if costs[task_column] >= INFEASIBLE_ASSIGNMENT_COST:
+            return None
+        return tasks[task_column]
+
+
+class MinCostMatchingTaskScheduler(TaskScheduler):
+    """
+    Assigns tasks to the whole READY fleet at once by solving a min-cost bipartite matching between
+    AGVs and INCOMPLETE tasks. The resulting assignments are cached so that subsequent task requests
+    from the other AGVs of the same round simply pop their precomputed task.
+    """
+
+    _assignment_cache = {}
+    _assignment_cache_expiry = 0.0
+    _assignment_cache_lock = threading.Lock()
+
+    @classmethod
+    def generate_optimal_assignments(cls, agvs, tasks):
+        if not agvs or not tasks:
+            return {}
+        cost_matrix = TaskFeatures(tasks).cost_matrix(agvs)
+        agv_indices, task_indices = solve_min_cost_assignment(cost_matrix)
+        return {
+            agvs[agv_index].id: tasks[task_column]
+            for agv_index, task_column in zip(agv_indices, task_indices)
+            if cost_matrix[agv_index, task_column] < INFEASIBLE_ASSIGNMENT_COST
+        }
+
     @classmethod
     def generate_optimal_assignment(cls, agv, tasks):
         if not tasks:
             return None
-        high_priority_tasks = [task for task in tasks if task.priority == Priority.HIGH]
-        med_priority_tasks = [task for task in tasks if task.priority == Priority.MEDIUM]
-        low_priority_tasks = [task for task in tasks if task.priority == Priority.LOW]
+        candidate_tasks = {task.id: task for task in tasks}
 
-        ordered_tasks = [
-            task_list
-            for task_list in [high_priority_tasks, med_priority_tasks, low_priority_tasks]
-            if len(task_list) > 0
-        ]
-        tasks = ordered_tasks[0]
+        with cls._assignment_cache_lock:
+            if time.monotonic() < cls._assignment_cache_expiry and agv.id in cls._assignment_cache:
+                cached_task_id = cls._assignment_cache.pop(agv.id)
+                # a cached task may have been claimed or cancelled since the round was computed
+                if cached_task_id is None or cached_task_id in candidate_tasks:
+                    return candidate_tasks.get(cached_task_id)
 
-        start_x, start_y = agv.x, agv.y
+            ready_agvs, assignments = cls._generate_fleet_assignments(agv)
+            cls._assignment_cache = {
+                fleet_agv.id: getattr(assignments.get(fleet_agv.id), "id", None)
+                for fleet_agv in ready_agvs
+            }
+            cls._assignment_cache_expiry = (
+                time.monotonic() + current_app.config["TASK_ASSIGNMENT_CACHE_TTL"]
+            )
+            return assignments.get(agv.id)
 
-        sorted_tasks = list(
-            sorted(tasks, key=lambda task: task.total_path_dist_lower_bound(start_x, start_y))
+    @classmethod
+    def generate_projected_assignment(cls, agv, tasks):
+        # the projected AGV is matched along with the READY fleet, but the round is not cached: the fleet's
+        # assignments would account for a task only reserved for the projected AGV
+        if not tasks:
+            return None
+        return cls._generate_fleet_assignments(agv)[1].get(agv.id)
+
+    @classmethod
+    def _generate_fleet_assignments(cls, agv):
+        """Matches the AGV and the rest of the READY fleet, returns (the other READY AGVs, assignments)"""
+        ready_agvs = AGV.query.filter(AGV.status == AGVState.READY, AGV.id != agv.id).all()
+        incomplete_tasks = load_indexed_tasks(task_index.task_ids())
+        return ready_agvs, cls.generate_optimal_assignments([agv] + ready_agvs, incomplete_tasks)
+
+    @classmethod
+    def clear_assignment_cache(cls):
+        with cls._assignment_cache_lock:
+            cls._assignment_cache = {}
+            cls._assignment_cache_expiry = 0.0
+
+
+class AgingTaskSchedulerEDF(TaskScheduler):
+    """
+    Earliest deadline first scheduling over the task_urgency of each task: the earlier of the task's own
+    deadline and its creation time plus its priority's wait allowance. Lower priority tasks are thereby
+    aged into precedence rather than starved by a sustained stream of HIGH priority tasks. Ties (ie -
+    tasks created together) go to the task with the shortest total path.
+    """
+
+    @classmethod
+    def retrieve_candidate_task_ids(cls, agv):
+        # the index keeps every retrieval scope in a priority queue ordered by urgency, a handful more than
+        # one task is retrieved in case the index holds tasks claimed elsewhere
+        most_urgent = task_index.most_urgent_candidates(agv, k=NEAREST_TASK_CANDIDATES)
+        return [task_id for urgency, task_id in most_urgent]
+
+    @classmethod
+    def _urgencies(cls, tasks):
+        return np.fromiter(
+            (task_urgency(task) for task in tasks), dtype=np.float64, count=len(tasks)
         )
 
-        return sorted_tasks[0]
+    @classmethod
+    def generate_optimal_assignments(cls, agvs, tasks):
+        # the most urgent tasks are dispatched first, each to the nearest AGV still without a task
+        if not agvs or not tasks:
+            return {}
+        cost_matrix = TaskFeatures(tasks).cost_matrix(agvs, tier_cost=0.0)
+        assignments = {}
+        for task_column in np.argsort(cls._urgencies(tasks), kind="stable"):
+            agv_index = int(np.argmin(cost_matrix[:, task_column]))
+            if cost_matrix[agv_index, task_column] >= INFEASIBLE_ASSIGNMENT_COST:
+                continue
+            assignments[agvs[agv_index].id] = tasks[task_column]
+            cost_matrix[agv_index, :] = INFEASIBLE_ASSIGNMENT_COST
+            if len(assignments) == len(agvs):
+                break
+        return assignments
+
+    @classmethod
+    def generate_optimal_assignment(cls, agv, tasks):
+        if not tasks:
+            return None
+        costs = TaskFeatures(tasks).costs_for_agv(agv, tier_cost=0.0)
+        feasible = costs < INFEASIBLE_ASSIGNMENT_COST
+        if not feasible.any():
+            return None
+        urgencies = np.where(feasible, cls._urgencies(tasks), np.inf)
+        return tasks[int(np.lexsort((costs, urgencies))[0])]
 
 
-TASK_SCHEDULER_MAP = {TaskSchedulers.GREEDY: GreedyTaskSchedulerSJF}
+TASK_SCHEDULER_MAP = {
+    TaskSchedulers.GREEDY: GreedyTaskSchedulerSJF,
+    TaskSchedulers.MIN_COST_MATCHING: MinCostMatchingTaskScheduler,
+    TaskSchedulers.AGING_EDF: AgingTaskSchedulerEDF,
+}
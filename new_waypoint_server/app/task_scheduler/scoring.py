@@ -0,0 +1,131 @@
+from datetime import datetime
+
+import numpy as np
+from app.agvs.constants import AGVDriveTrainType
+from app.tasks.constants import Priority
+
+from .constants import INFEASIBLE_ASSIGNMENT_COST
+
+PRIORITY_TIERS = {Priority.HIGH: 0, Priority.MEDIUM: 1, Priority.LOW: 2}
+DRIVE_TRAIN_CODES = {
+    drive_train_type: code for code, drive_train_type in enumerate(AGVDriveTrainType)
+}
+
+# sentinel code used for tasks without an assigned AGV or drive train
+UNRESTRICTED = -1
+
+
+def _agv_arrays(agvs):
+    positions = np.array([(agv.x, agv.y) for agv in agvs], dtype=np.float64).reshape(-1, 2)
+    ids = np.array([agv.id for agv in agvs], dtype=np.int64)
+    drive_trains = np.array(
+        [DRIVE_TRAIN_CODES.get(agv.drive_train_type, UNRESTRICTED) for agv in agvs], dtype=np.int64
+    )
+    return positions, ids, drive_trains
+
+
+class TaskFeatures:
+    """
+    Columnar (structure of arrays) snapshot of candidate tasks used to score tasks against one AGV or
+    a whole fleet with vectorized NumPy operations instead of per task Python loops.
+
+    start_xy : (m, 2) starting waypoint coordinates (NaN for tasks without waypoints)
+    path_dists : (m,) path distance lower bounds
+    priority_tiers : (m,) 0 for HIGH, 1 for MEDIUM, 2 for LOW
+    ages : (m,) seconds since each task was created
+    agv_ids / drive_trains : (m,) eligibility restrictions (UNRESTRICTED when not restricted)
+    """
+
+    def __init__(self, tasks, now=None):
+        now = now if now is not None else datetime.utcnow()
+        self.tasks = list(tasks)
+        num_tasks = len(self.tasks)
+        self.ids = np.fromiter((task.id for task in self.tasks), dtype=np.int64, count=num_tasks)
+        self.start_xy = np.array(
+            [
+                (np.nan, np.nan) if task.start_x is None else (task.start_x, task.start_y)
+                for task in self.tasks
+            ],
+            dtype=np.float64,
+        ).reshape(-1, 2)
+        self.path_dists = np.fromiter(
+            (task.path_dist_lower_bound or 0.0 for task in self.tasks),
+            dtype=np.float64,
+            count=num_tasks,
+        )
+        self.priority_tiers = np.fromiter(
+            (PRIORITY_TIERS[task.priority] for task in self.tasks), dtype=np.int64, count=num_tasks
+        )
+        self.ages = np.fromiter(
+            (
+                (now - task.created_at).total_seconds() if task.created_at is not None else 0.0
+                for task in self.tasks
+            ),
+            dtype=np.float64,
+            count=num_tasks,
+        )
+        self.agv_ids = np.fromiter(
+            (UNRESTRICTED if task.agv_id is None else task.agv_id for task in self.tasks),
+            dtype=np.int64,
+            count=num_tasks,
+        )
+        self.drive_trains = np.fromiter(
+            (DRIVE_TRAIN_CODES.get(task.drive_train_type, UNRESTRICTED) for task in self.tasks),
+            dtype=np.int64,
+            count=num_tasks,
+        )
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def travel_costs(self, positions):
+        """(n, m) lower bound distance of driving from each position to each task's start and completing it"""
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        offsets = positions[:, np.newaxis, :] - self.start_xy[np.newaxis, :, :]
+        costs = np.hypot(offsets[..., 0], offsets[..., 1]) + self.path_dists
+        # tasks without waypoints cannot be navigated to
+        return np.where(np.isnan(costs), np.inf, costs)
+
+    def eligibility(self, agv_ids, agv_drive_trains):
+        """
+        (n, m) mask of which AGVs may execute which tasks, mirroring the task retrieval rules:
+        a task assigned to an AGV only goes to that AGV, then the task's drive train must match
+        """
+        agv_ids = np.asarray(agv_ids, dtype=np.int64)[:, np.newaxis]
+        agv_drive_trains = np.asarray(agv_drive_trains, dtype=np.int64)[:, np.newaxis]
+        return np.where(
+            self.agv_ids != UNRESTRICTED,
+            self.agv_ids == agv_ids,
+            (self.drive_trains == UNRESTRICTED) | (self.drive_trains == agv_drive_trains),
+        )
+
+    def cost_matrix(self, agvs, tier_cost=None, age_weight=0.0):
+        """
+        (n, m) scheduling costs of every AGV / task pairing: travel cost, plus tier_cost per priority level
+        below HIGH, minus age_weight per second waited. Ineligible or unnavigatable pairings cost
+        INFEASIBLE_ASSIGNMENT_COST
+
+        NOTE: by default the tier cost is derived from the feasible costs (see priority_tier_cost), so every
+        assignment exhausts the higher priority tasks before considering lower ones however long their paths
+        """
+        positions, agv_ids, agv_drive_trains = _agv_arrays(agvs)
+        costs = self.travel_costs(positions) - self.ages * age_weight
+        feasible = self.eligibility(agv_ids, agv_drive_trains) & np.isfinite(costs)
+        if tier_cost is None:
+            tier_cost = priority_tier_cost(costs[feasible], min(len(agvs), len(self)))
+        costs = costs + self.priority_tiers * tier_cost
+        return np.where(feasible, costs, INFEASIBLE_ASSIGNMENT_COST)
+
+    def costs_for_agv(self, agv, tier_cost=None, age_weight=0.0):
+        """(m,) scheduling costs of every task for a single AGV (see cost_matrix)"""
+        return self.cost_matrix([agv], tier_cost=tier_cost, age_weight=age_weight)[0]
+
+
+def priority_tier_cost(costs, num_assignments):
+    """
+    Returns the cost of a priority level that outweighs any difference in the (feasible) costs summed over
+    num_assignments pairings, so minimizing the total cost orders assignments by (priority, cost)
+    """
+    if not len(costs):
+        return 1.0
+    return float(costs.max() - costs.min()) * num_assignments + 1.0
@@ -0,0 +1,337 @@
+import heapq
+import math
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+from app.agv_request_handlers.controllers import AGVUpdateController, TaskAssignmentController
+from app.agvs.constants import AGVDriveTrainType, AGVState
+from app.agvs.models import AGV
+from app.agvs.state_store import agv_state_store
+from app.agvs.telemetry import fleet_telemetry
+from app.agvs.update_sequences import update_sequences
+from app.commands.constants import CommandTypes
+from app.commands.models import Command
+from app.commands.queues import command_queues
+from app.database import db
+from app.tasks.constants import Priority
+from app.tasks.index import task_index
+from app.tasks.models import Task, Waypoint
+from app.tasks.reservations import task_reservations
+from flask import current_app
+from flask_api import status
+
+from .benchmark import (
+    AGV_TASK_FRACTION,
+    BENCHMARK_AREA_SIZE,
+    DRIVE_TRAIN_TASK_FRACTION,
+    MEAN_EXTRA_WAYPOINTS,
+    PRIORITY_WEIGHTS,
+    random_task_path,
+)
+
+# simulated time zero, task creation times and deadlines are stored relative to it
+SIMULATION_EPOCH = datetime(2000, 1, 1)
+
+# seconds an AGV spends at each waypoint (ie - loading / unloading)
+DEFAULT_DWELL_TIME = 5.0
+
+# event kinds, ordered so that simultaneous events are processed arrivals first
+TASK_ARRIVAL, COMMAND, WAYPOINT_REACHED = range(3)
+
+
+def generate_arrival_trace(rng, duration, tasks_per_hour, fleet_size):
+    """
+    Returns a trace of Poisson task arrivals over duration seconds: a list of {"time": seconds,
+    "priority", "drive_train_type", "agv_id", "waypoints"} dictionaries, shaped like task creation requests
+    """
+    drive_train_types = list(AGVDriveTrainType)
+    trace, time = [], 0.0
+    while True:
+        time += rng.exponential(3600.0 / tasks_per_hour)
+        if time >= duration:
+            return trace
+        path = random_task_path(rng, 1 + int(rng.poisson(MEAN_EXTRA_WAYPOINTS)))
+        restriction = rng.uniform()
+        trace.append(
+            {
+                "time": time,
+                "priority": str(
+                    rng.choice(list(PRIORITY_WEIGHTS), p=list(PRIORITY_WEIGHTS.values()))
+                ),
+                "drive_train_type": str(
+                    drive_train_types[int(rng.integers(len(drive_train_types)))]
+                )
+                if restriction < DRIVE_TRAIN_TASK_FRACTION
+                else None,
+                "agv_id": int(rng.integers(1, fleet_size + 1))
+                if 1.0 - restriction < AGV_TASK_FRACTION
+                else None,
+                "waypoints": [{"x": float(x), "y": float(y)} for x, y in path],
+            }
+        )
+
+
+class SimulatedAGV:
+    def __init__(self, agv_id, speed, x, y):
+        self.id = agv_id
+        self.speed = speed
+        self.x, self.y = x, y
+        self.waypoints = []
+        self.next_waypoint = 0
+        self.task_id = None
+        self.stopped = False
+        # bumped whenever the AGV abandons its route, invalidating its scheduled waypoint events
+        self.route_version = 0
+        self.busy_since = None
+        self.busy_time = 0.0
+        self.distance = 0.0
+
+
+class FleetSimulator:
+    """
+    Headless discrete-event simulation of a fleet executing a task arrival trace. AGVs talk to the server
+    exactly as the real ones do, only through AGVUpdateController.update_agv (which processes any pending
+    Command first) and TaskAssignmentController.get_task_for_agv, against whatever database and
+    TASK_SCHEDULER the current app is configured with. Between those calls AGVs drive straight from
+    waypoint to waypoint at their own speed, so hours of operation take seconds to simulate.
+
+    Idle AGVs request a task as soon as one arrives (the AGV idle the longest asks first), which models
+    AGVs polling the server continuously.
+    """
+
+    def __init__(self, agv_speeds, trace, dwell_time=DEFAULT_DWELL_TIME, seed=0):
+        rng = np.random.default_rng(seed)
+        positions = rng.uniform(0.0, BENCHMARK_AREA_SIZE, size=(len(agv_speeds), 2))
+        self.agvs = {
+            agv_id: SimulatedAGV(agv_id, speed, float(x), float(y))
+            for agv_id, (speed, (x, y)) in enumerate(zip(agv_speeds, positions), start=1)
+        }
+        self.trace = sorted(trace, key=lambda entry: entry["time"])
+        self.dwell_time = dwell_time
+        self.time = 0.0
+        self._events = []
+        self._event_count = 0
+        self._idle_agvs = OrderedDict()
+        self._arrival_times = {}
+        self._claim_times = {}
+        self._completed_tasks = 0
+
+    def _schedule(self, time, kind, payload):
+        # the event count breaks ties between simultaneous events of the same kind in scheduling order
+        heapq.heappush(self._events, (time, kind, self._event_count, payload))
+        self._event_count += 1
+
+    def _reset_database(self):
+        db.session.remove()
+        db.drop_all()
+        db.create_all()
+        task_index.clear()
+        task_reservations.clear()
+        agv_state_store.clear()
+        update_sequences.clear()
+        fleet_telemetry.clear()
+        command_queues.clear()
+        drive_train_types = list(AGVDriveTrainType)
+        for agv in self.agvs.values():
+            AGV(
+                id=agv.id,
+                status=AGVState.READY,
+                x=agv.x,
+                y=agv.y,
+                drive_train_type=drive_train_types[agv.id % len(drive_train_types)],
+            ).save()
+        db.session.commit()
+
+    def run(self, duration):
+        """Simulates duration seconds of operation, returning the fleet performance metrics"""
+        # fleet assignment rounds are cached for wall clock seconds, which are meaningless in simulated time
+        current_app.config["TASK_ASSIGNMENT_CACHE_TTL"] = 0
+        self._reset_database()
+        for entry in self.trace:
+            kind = COMMAND if "command" in entry else TASK_ARRIVAL
+            self._schedule(entry["time"], kind, entry)
+        for agv in self.agvs.values():
+            self._become_ready(agv)
+
+        while self._events and self._events[0][0] <= duration:
+            self.time, kind, _, payload = heapq.heappop(self._events)
+            if kind == TASK_ARRIVAL:
+                self._create_task(payload)
+                self._dispatch_idle_agvs()
+            elif kind == COMMAND:
+                self._issue_command(payload)
+            else:
+                agv_id, route_version = payload
+                agv = self.agvs[agv_id]
+                if agv.route_version == route_version:
+                    self._reach_waypoint(agv)
+
+        self.time = duration
+        return self._metrics(duration)
+
+    def _create_task(self, entry):
+        # mirrors TaskCreateView, without the request validation
+        task = Task(
+            priority=Priority(entry.get("priority") or Priority.MEDIUM.value),
+            agv_id=entry.get("agv_id"),
+            drive_train_type=AGVDriveTrainType(entry["drive_train_type"])
+            if entry.get("drive_train_type")
+            else None,
+        )
+        task.created_at = SIMULATION_EPOCH + timedelta(seconds=self.time)
+        if entry.get("deadline") is not None:
+            task.deadline = SIMULATION_EPOCH + timedelta(seconds=entry["deadline"])
+        task.save()
+        for order, waypoint in enumerate(entry["waypoints"]):
+            task.waypoints.append(
+                Waypoint(x=waypoint["x"], y=waypoint["y"], order=waypoint.get("order", order))
+            )
+        task.compute_path_metrics()
+        task.save(commit=True)
+        task_index.sync(task)
+        self._arrival_times[task.id] = self.time
+
+    def _issue_command(self, entry):
+        agv_id = entry.get("agv_id")
+        command = Command(
+            agv_id=agv_id, task_id=entry.get("task_id"), type=CommandTypes(entry["command"])
+        ).save(commit=True)
+        command_queues.push(command)
+        agv = self.agvs.get(agv_id)
+        # BUSY AGVs pick their commands up with their next update
+        if agv is not None and agv.id in self._idle_agvs:
+            self._become_ready(agv)
+        elif agv is not None and agv.stopped:
+            self._handle_command(agv, self._send_update(agv, AGVState.STOPPED))
+
+    def _send_update(self, agv, agv_status, **data):
+        """Posts an AGV state update, returns the type of the command processed instead (or None)"""
+        _, _, command_json = AGVUpdateController.update_agv(
+            {"id": agv.id, "status": agv_status, "x": agv.x, "y": agv.y, "theta": 0.0, **data}
+        )
+        # every simulated request is committed, as commit_unit_of_work would
+        db.session.commit()
+        return CommandTypes(command_json["type"]) if command_json else None
+
+    def _handle_command(self, agv, command_type):
+        if command_type is None:
+            return
+        self._abandon_route(agv)
+        if command_type is CommandTypes.STOP_AGV:
+            agv.stopped = True
+            self._idle_agvs.pop(agv.id, None)
+        else:
+            agv.stopped = False
+            self._become_ready(agv)
+
+    def _abandon_route(self, agv):
+        agv.route_version += 1
+        if agv.busy_since is not None:
+            agv.busy_time += self.time - agv.busy_since
+        agv.busy_since, agv.task_id, agv.waypoints = None, None, []
+
+    def _become_ready(self, agv):
+        command_type = self._send_update(agv, AGVState.READY)
+        if command_type is not None:
+            self._handle_command(agv, command_type)
+            return
+        self._idle_agvs[agv.id] = None
+        self._request_task(agv)
+
+    def _dispatch_idle_agvs(self):
+        for agv_id in list(self._idle_agvs):
+            if self._request_task(self.agvs[agv_id]):
+                return
+
+    def _request_task(self, agv):
+        status_code, task_json = TaskAssignmentController.get_task_for_agv(
+            {"id": agv.id, "status": AGVState.READY}
+        )
+        db.session.commit()
+        if status_code != status.HTTP_200_OK:
+            return False
+        del self._idle_agvs[agv.id]
+        agv.task_id, agv.busy_since = task_json["id"], self.time
+        self._claim_times[agv.task_id] = self.time
+        agv.waypoints = [
+            (waypoint.order, waypoint.x, waypoint.y)
+            for waypoint in Waypoint.query.filter_by(task_id=agv.task_id).order_by(
+                Waypoint.order.asc()
+            )
+        ]
+        agv.next_waypoint = 0
+        self._schedule_next_waypoint(agv)
+        return True
+
+    def _schedule_next_waypoint(self, agv):
+        _, x, y = agv.waypoints[agv.next_waypoint]
+        travel_time = math.hypot(x - agv.x, y - agv.y) / agv.speed
+        self._schedule(
+            self.time + travel_time + self.dwell_time,
+            WAYPOINT_REACHED,
+            (agv.id, agv.route_version),
+        )
+
+    def _reach_waypoint(self, agv):
+        _, x, y = agv.waypoints[agv.next_waypoint]
+        agv.distance += math.hypot(x - agv.x, y - agv.y)
+        agv.x, agv.y = x, y
+        agv.next_waypoint += 1
+
+        if agv.next_waypoint < len(agv.waypoints):
+            command_type = self._send_update(
+                agv,
+                AGVState.BUSY,
+                current_task_id=agv.task_id,
+                current_waypoint_order=agv.waypoints[agv.next_waypoint][0],
+            )
+            if command_type is not None:
+                self._handle_command(agv, command_type)
+            else:
+                self._schedule_next_waypoint(agv)
+            return
+
+        command_type = self._send_update(agv, AGVState.DONE, current_task_id=agv.task_id)
+        if command_type is not None:
+            self._handle_command(agv, command_type)
+            return
+        self._completed_tasks += 1
+        self._abandon_route(agv)
+        self._become_ready(agv)
+
+    def _metrics(self, duration):
+        busy_time = sum(
+            agv.busy_time + (self.time - agv.busy_since if agv.busy_since is not None else 0.0)
+            for agv in self.agvs.values()
+        )
+        waits = np.array(
+            [
+                claim_time - self._arrival_times[task_id]
+                for task_id, claim_time in self._claim_times.items()
+            ]
+        )
+        return {
+            "duration_hours": duration / 3600.0,
+            "tasks_arrived": len(self._arrival_times),
+            "tasks_completed": self._completed_tasks,
+            "tasks_unclaimed": len(self._arrival_times) - len(self._claim_times),
+            "throughput_per_hour": self._completed_tasks / (duration / 3600.0),
+            "agv_utilization": busy_time / (duration * len(self.agvs)),
+            "queue_wait_p50_s": float(np.percentile(waits, 50)) if len(waits) else None,
+            "queue_wait_p90_s": float(np.percentile(waits, 90)) if len(waits) else None,
+            "queue_wait_p99_s": float(np.percentile(waits, 99)) if len(waits) else None,
+            "total_distance": sum(agv.distance for agv in self.agvs.values()),
+        }
+
+
+def simulate_schedulers(
+    scheduler_names, agv_speeds, trace, duration, dwell_time=DEFAULT_DWELL_TIME, seed=0
+):
+    """Replays the same trace with the same fleet under every named TASK_SCHEDULER"""
+    results = []
+    for scheduler_name in scheduler_names:
+        current_app.config["TASK_SCHEDULER"] = scheduler_name
+        simulator = FleetSimulator(agv_speeds, trace, dwell_time=dwell_time, seed=seed)
+        results.append({"scheduler": scheduler_name, **simulator.run(duration)})
+    return results
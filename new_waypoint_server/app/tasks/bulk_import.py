@@ -0,0 +1,331 @@
+import codecs
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+from app.agvs.constants import AGVDriveTrainType
+from app.agvs.models import AGV
+from app.database import db
+from flask import current_app
+from marshmallow import ValidationError, fields
+
+from .constants import Priority, TaskStatus
+from .index import task_index
+from .models import Task, Waypoint
+from .packed_route import parse_routes, routes_metrics
+
+# bytes read from the imported stream at a time
+READ_SIZE = 65536
+
+WAYPOINT_COLUMNS = ("x", "y", "theta", "order", "task_id")
+# the columns of the imported tasks, the remaining ones keep their defaults
+TASK_COLUMNS = (
+    "priority",
+    "status",
+    "drive_train_type",
+    "agv_id",
+    "deadline",
+    "created_at",
+    "updated_at",
+    "num_waypoints",
+    "path_dist_lower_bound",
+    "start_x",
+    "start_y",
+    "last_waypoint_order",
+    "route",
+)
+
+TASK_FIELDS = {"priority", "status", "drive_train_type", "agv_id", "deadline", "waypoints"}
+
+# deadlines are stored as naive UTC times (like TaskCreateSerializer)
+DEADLINE_FIELD = fields.NaiveDateTime(timezone=timezone.utc)
+
+
+class MalformedImport(ValueError):
+    pass
+
+
+def _read_chunks(stream):
+    return iter(lambda: stream.read(READ_SIZE), b"")
+
+
+def _iter_ndjson(chunks):
+    """Yields (line number, record, error) for every non blank line of NDJSON"""
+    line_number, remainder = 0, b""
+    for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _parse_line(line_number, line)
+    if remainder.strip():
+        yield _parse_line(line_number + 1, remainder)
+
+
+def _parse_line(line_number, line):
+    try:
+        return line_number, json.loads(line), None
+    except ValueError:
+        return line_number, None, "Line is not valid JSON"
+
+
+def _iter_json_array(chunks):
+    """Yields (index, record, None) for every element of a JSON array, decoding one element at a time"""
+    decoder, text_decoder = json.JSONDecoder(), codecs.getincrementaldecoder("utf-8")()
+    buffer, position, eof = "", 0, False
+
+    def read_more():
+        # drops the consumed part of the buffer, returns False once the stream is exhausted
+        nonlocal buffer, position, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        eof = chunk is None
+        try:
+            buffer = buffer[position:] + text_decoder.decode(chunk or b"", final=eof)
+        except UnicodeDecodeError:
+            raise MalformedImport("Body must be UTF-8 encoded")
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position < len(buffer) or not read_more():
+                return position < len(buffer)
+
+    skip_whitespace()
+    # the opening bracket (see iter_task_records)
+    position, index = position + 1, 0
+    if skip_whitespace() and buffer[position] == "]":
+        return
+    while True:
+        if not skip_whitespace():
+            raise MalformedImport("JSON array is not closed")
+        while True:
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except ValueError:
+                end = None
+            # a value running to the end of the buffer (ie - a number) may continue in the next chunk
+            if end is not None and (end < len(buffer) or eof):
+                break
+            if not read_more():
+                raise MalformedImport(f"Element {index} is not valid JSON")
+        yield index, record, None
+        position, index = end, index + 1
+
+        if not skip_whitespace():
+            raise MalformedImport("JSON array is not closed")
+        if buffer[position] == "]":
+            return
+        if buffer[position] != ",":
+            raise MalformedImport(f"Expected ',' or ']' after element {index - 1}")
+        position += 1
+
+
+def iter_task_records(stream):
+    """
+    Parses the tasks of a stream holding either NDJSON (one task per line) or a JSON array of tasks, reading
+    it in chunks. Yields (position, record, error): positions are line numbers (from 1) for NDJSON and
+    indexes (from 0) for arrays, lines that are not valid JSON are yielded with an error. Raises
+    MalformedImport when a JSON array is malformed
+    """
+    chunks = _read_chunks(stream)
+    for chunk in chunks:
+        stripped = chunk.lstrip()
+        if not stripped:
+            continue
+        chunks = _prepend(stripped, chunks)
+        if stripped.startswith(b"["):
+            return _iter_json_array(chunks)
+        return _iter_ndjson(chunks)
+    return iter(())
+
+
+def _prepend(chunk, chunks):
+    yield chunk
+    yield from chunks
+
+
+def _enum_value(enum, value):
+    try:
+        return enum[value]
+    except (KeyError, TypeError):
+        raise ValueError
+
+
+def validate_task_record(record, registered_agv_ids):
+    """
+    Performs the checks of TaskCreateSerializer without marshmallow (the waypoints are checked by
+    parse_routes), returns the task's column values or raises ValueError with the reason the task is invalid
+    """
+    if not isinstance(record, dict):
+        raise ValueError("Task must be a JSON object")
+    unknown_fields = set(record) - TASK_FIELDS
+    if unknown_fields:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown_fields))}")
+
+    values = {"priority": Priority.MEDIUM, "status": TaskStatus.INCOMPLETE}
+    for field, enum in [
+        ("priority", Priority),
+        ("status", TaskStatus),
+        ("drive_train_type", AGVDriveTrainType),
+    ]:
+        if record.get(field) is not None:
+            try:
+                values[field] = _enum_value(enum, record[field])
+            except ValueError:
+                raise ValueError(f"Invalid {field}: {record[field]}")
+    agv_id = record.get("agv_id")
+    if agv_id is not None:
+        if not isinstance(agv_id, int) or isinstance(agv_id, bool):
+            raise ValueError("agv_id must be an integer")
+        if agv_id not in registered_agv_ids:
+            raise ValueError("Unable to create task assigned to unregistered AGV")
+        values["agv_id"] = agv_id
+    if record.get("deadline") is not None:
+        try:
+            values["deadline"] = DEADLINE_FIELD.deserialize(record["deadline"])
+        except ValidationError:
+            raise ValueError("deadline must be an ISO 8601 datetime")
+    return values
+
+
+def _executemany(table, columns, rows):
+    """
+    Inserts rows (tuples of the values of columns) with a single executemany. The rows are handed to the
+    driver once the bind processors of the column types (ie - enums and datetimes) are applied column by
+    column, skipping SQLAlchemy's per row parameter processing
+    """
+    connection = db.session.connection()
+    dialect = connection.dialect
+    statement = (
+        table.insert()
+        .values({name: db.bindparam(name) for name in columns})
+        .compile(dialect=dialect)
+    )
+    processors = [
+        table.c[name].type.dialect_impl(dialect).bind_processor(dialect) for name in columns
+    ]
+    if any(processors):
+        processed_columns = [
+            column if processor is None else [processor(value) for value in column]
+            for processor, column in zip(processors, zip(*rows))
+        ]
+        rows = list(zip(*processed_columns))
+    if not statement.positional:
+        rows = [dict(zip(columns, row)) for row in rows]
+    elif list(statement.positiontup) != list(columns):
+        positions = [columns.index(name) for name in statement.positiontup]
+        rows = [tuple(row[position] for position in positions) for row in rows]
+    connection.exec_driver_sql(str(statement), rows)
+
+
+def _insert_tasks(rows):
+    """Inserts the task rows (dictionaries of TASK_COLUMNS) with a single executemany, returns their ids"""
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        # the transaction is the only writer of a SQLite database, rows inserted without an id are
+        # assigned consecutive rowids
+        _executemany(
+            Task.__table__,
+            TASK_COLUMNS,
+            [tuple(row[name] for name in TASK_COLUMNS) for row in rows],
+        )
+        last_id = connection.execute(db.text("SELECT last_insert_rowid()")).scalar()
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+    return [
+        connection.execute(Task.__table__.insert(), row).inserted_primary_key[0] for row in rows
+    ]
+
+
+def import_task_chunk(records):
+    """
+    Validates and inserts a chunk of (position, record, error) tuples in a single transaction, returns the
+    ids of the created tasks and the errors keyed by the position of the invalid tasks
+    """
+    errors = {position: error for position, _, error in records if error is not None}
+    records = [(position, record) for position, record, error in records if error is None]
+    agv_ids = {
+        record.get("agv_id")
+        for _, record in records
+        if isinstance(record, dict) and isinstance(record.get("agv_id"), int)
+    }
+    registered_agv_ids = {
+        agv_id for (agv_id,) in AGV.query.with_entities(AGV.id).filter(AGV.id.in_(agv_ids))
+    }
+
+    tasks = []
+    for position, record in records:
+        try:
+            tasks.append((position, record, validate_task_record(record, registered_agv_ids)))
+        except ValueError as error:
+            errors[position] = str(error)
+    routes, route_errors = parse_routes([record.get("waypoints") for _, record, _ in tasks])
+    for ind, message in route_errors.items():
+        errors[tasks[ind][0]] = message
+    tasks = [(values, route) for (_, _, values), route in zip(tasks, routes) if route is not None]
+    if not tasks:
+        return [], errors
+
+    min_packed_waypoints = current_app.config["PACKED_ROUTE_MIN_WAYPOINTS"]
+    created_at = datetime.utcnow()
+    task_rows = []
+    metrics = routes_metrics([route for _, route in tasks])
+    for (values, route), route_metrics in zip(tasks, metrics):
+        packed = min_packed_waypoints is not None and len(route) >= min_packed_waypoints
+        task_rows.append(
+            {
+                "agv_id": None,
+                "drive_train_type": None,
+                "deadline": None,
+                **values,
+                **route_metrics,
+                "created_at": created_at,
+                "updated_at": created_at,
+                "route": route.tobytes() if packed else None,
+            }
+        )
+    task_ids = _insert_tasks(task_rows)
+    waypoint_rows = [
+        (x, y, theta, order, task_id)
+        for task_id, task_row, (_, route) in zip(task_ids, task_rows, tasks)
+        if task_row["route"] is None
+        for x, y, theta, order in route.tolist()
+    ]
+    if waypoint_rows:
+        _executemany(Waypoint.__table__, WAYPOINT_COLUMNS, waypoint_rows)
+    db.session.commit()
+
+    for task_id, task_row in zip(task_ids, task_rows):
+        # the index only reads the attributes of a task, a full Task is not needed
+        task_index.sync(SimpleNamespace(id=task_id, **task_row))
+    return task_ids, errors
+
+
+def import_tasks(stream, chunk_size):
+    """
+    Imports the tasks of an NDJSON or JSON array stream (see iter_task_records) chunk_size tasks at a time,
+    every chunk is committed on its own. Returns the number of tasks created and the errors keyed by the
+    position of the invalid tasks
+    """
+    num_created, errors, chunk = 0, {}, []
+    records = iter_task_records(stream)
+    while True:
+        try:
+            entry = next(records, None)
+        except MalformedImport as error:
+            errors["stream"] = str(error)
+            entry = None
+        if entry is not None:
+            chunk.append(entry)
+        if chunk and (entry is None or len(chunk) == chunk_size):
+            task_ids, chunk_errors = import_task_chunk(chunk)
+            num_created, chunk = num_created + len(task_ids), []
+            errors.update(chunk_errors)
+        if entry is None:
+            return num_created, errors
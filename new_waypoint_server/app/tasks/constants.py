@@ -11,3 +11,7 @@ class TaskStatus(BaseEnum):
     INCOMPLETE = "INCOMPLETE"
     IN_PROGRESS = "IN_PROGRESS"
     COMPLETE = "COMPLETE"
+
+
+# seconds a task of each priority waits before it is as urgent as a newly created HIGH priority task
+PRIORITY_WAIT_ALLOWANCE = {Priority.HIGH: 0, Priority.MEDIUM: 300, Priority.LOW: 900}
@@ -0,0 +1,231 @@
+import threading
+from datetime import datetime, timedelta
+
+from .constants import PRIORITY_WAIT_ALLOWANCE, Priority, TaskStatus
+from .models import Task
+from .priority_queue import IndexedPriorityQueue
+from .spatial_index import SpatialGrid
+
+# SQLite limits the number of bound parameters per statement, so id lookups are issued in chunks
+TASK_LOOKUP_CHUNK_SIZE = 500
+
+PRIORITY_ORDER = (Priority.HIGH, Priority.MEDIUM, Priority.LOW)
+
+DEFAULT_CELL_SIZE = 10.0
+
+EPOCH = datetime(1970, 1, 1)
+
+# seconds a change may take to be committed after its updated_at and still be picked up by refresh_task_index
+TASK_INDEX_REFRESH_OVERLAP = 5.0
+
+
+class TaskScope:
+    AGV = "AGV"
+    DRIVE_TRAIN = "DRIVE_TRAIN"
+    GENERAL = "GENERAL"
+
+
+def task_scope_key(task):
+    """The single retrieval scope an INCOMPLETE task is visible under (see TaskAssignmentController)"""
+    if task.agv_id is not None:
+        return (TaskScope.AGV, task.agv_id)
+    if task.drive_train_type is not None:
+        return (TaskScope.DRIVE_TRAIN, task.drive_train_type)
+    return (TaskScope.GENERAL, None)
+
+
+def task_urgency(task):
+    """
+    Deadline (in seconds since the epoch) a task is scheduled by, the earlier of its own deadline and its
+    creation time plus the wait allowance of its priority. A waiting task therefore eventually outranks
+    every newly created task, whatever their priorities
+    """
+    created_at = task.created_at or EPOCH
+    urgency = (created_at - EPOCH).total_seconds() + PRIORITY_WAIT_ALLOWANCE[task.priority]
+    if task.deadline is not None:
+        urgency = min(urgency, (task.deadline - EPOCH).total_seconds())
+    return urgency
+
+
+def agv_scope_keys(agv):
+    """All retrieval scopes an AGV is allowed to pick INCOMPLETE tasks from"""
+    return [
+        (TaskScope.AGV, agv.id),
+        (TaskScope.DRIVE_TRAIN, agv.drive_train_type),
+        (TaskScope.GENERAL, None),
+    ]
+
+
+class TaskIndex:
+    """
+    Process-local index over INCOMPLETE tasks, bucketed by retrieval scope (assigned AGV, drive train
+    or general) and priority. The database remains the source of truth, the index is rebuilt from it at
+    startup and kept consistent by the views / controllers that create, assign, cancel or complete tasks.
+
+    Every bucket is a SpatialGrid over the starting waypoints of its tasks, allowing nearest task
+    queries without ranking the whole bucket. Alongside, every retrieval scope keeps its navigatable tasks
+    (tasks with a starting waypoint) in an IndexedPriorityQueue keyed by task_urgency, allowing most urgent
+    task queries.
+
+    Tasks created, claimed or returned to the pool by other server processes are picked up by periodically
+    looking up the tasks changed since the index was last refreshed (see refresh_task_index).
+    """
+
+    def __init__(self, cell_size=DEFAULT_CELL_SIZE):
+        self._lock = threading.RLock()
+        self._cell_size = cell_size
+        self._buckets = {}
+        self._queues = {}
+        self._entries = {}
+        self._refreshed_at = None
+
+    def rebuild(self, tasks, cell_size=None):
+        with self._lock:
+            if cell_size is not None:
+                self._cell_size = cell_size
+            self.clear()
+            for task in tasks:
+                self.sync(task)
+            self._refreshed_at = datetime.utcnow()
+
+    def clear(self):
+        with self._lock:
+            self._buckets = {}
+            self._queues = {}
+            self._entries = {}
+            self._refreshed_at = None
+
+    def refresh_due(self, interval):
+        """
+        Returns the (UTC) time the index was last refreshed from the database at if that was over interval
+        seconds ago, in which case the index is considered refreshed as of now. Returns None otherwise
+        """
+        now = datetime.utcnow()
+        with self._lock:
+            refreshed_at = self._refreshed_at
+            if refreshed_at is not None and (now - refreshed_at).total_seconds() < interval:
+                return None
+            self._refreshed_at = now
+            return refreshed_at
+
+    def sync(self, task):
+        """Reflect the current state of a task within the index (only INCOMPLETE tasks are indexed)"""
+        with self._lock:
+            self.discard(task.id)
+            if task.status != TaskStatus.INCOMPLETE:
+                return
+            bucket_key = (task_scope_key(task), task.priority)
+            bucket = self._buckets.get(bucket_key)
+            if bucket is None:
+                bucket = self._buckets[bucket_key] = SpatialGrid(self._cell_size)
+            bucket.insert(task.id, task.start_x, task.start_y, task.path_dist_lower_bound or 0.0)
+            self._entries[task.id] = bucket_key
+            # tasks without waypoints can never be assigned, they must not crowd out the most urgent ones
+            if task.start_x is None:
+                return
+            queue = self._queues.get(bucket_key[0])
+            if queue is None:
+                queue = self._queues[bucket_key[0]] = IndexedPriorityQueue()
+            queue.push(task.id, task_urgency(task))
+
+    def discard(self, task_id):
+        with self._lock:
+            bucket_key = self._entries.pop(task_id, None)
+            if bucket_key is None:
+                return
+            bucket = self._buckets[bucket_key]
+            bucket.remove(task_id)
+            if not bucket:
+                del self._buckets[bucket_key]
+            queue = self._queues.get(bucket_key[0])
+            if queue is not None and task_id in queue:
+                queue.remove(task_id)
+                if not queue:
+                    del self._queues[bucket_key[0]]
+
+    def candidate_ids(self, agv):
+        """Returns {Priority: [task ids]} (highest priority first) of every task the AGV may execute"""
+        with self._lock:
+            candidates = {}
+            for priority in PRIORITY_ORDER:
+                task_ids = []
+                for scope_key in agv_scope_keys(agv):
+                    task_ids.extend(self._buckets.get((scope_key, priority), ()))
+                if task_ids:
+                    candidates[priority] = task_ids
+            return candidates
+
+    def nearest_candidates(self, agv, x, y, k=1):
+        """
+        Returns up to k (cost, task id) tuples of the tasks the AGV may execute within the highest
+        priority holding any navigatable task, where cost is the lower bound distance of driving from
+        (x, y) to the task's start and completing its path (see Task.total_path_dist_lower_bound)
+        """
+        with self._lock:
+            for priority in PRIORITY_ORDER:
+                nearest = []
+                for scope_key in agv_scope_keys(agv):
+                    bucket = self._buckets.get((scope_key, priority))
+                    if bucket is not None:
+                        nearest.extend(bucket.nearest(x, y, k))
+                if nearest:
+                    return sorted(nearest)[:k]
+            return []
+
+    def most_urgent_candidates(self, agv, k=1):
+        """Returns up to k (urgency, task id) tuples of the most urgent tasks the AGV may execute"""
+        with self._lock:
+            most_urgent = []
+            for scope_key in agv_scope_keys(agv):
+                queue = self._queues.get(scope_key)
+                if queue is not None:
+                    most_urgent.extend(queue.smallest(k))
+            return sorted(most_urgent)[:k]
+
+    def task_ids(self):
+        with self._lock:
+            return list(self._entries)
+
+    def __contains__(self, task_id):
+        return task_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+
+task_index = TaskIndex()
+
+
+def load_indexed_tasks(task_ids):
+    """
+    Loads the INCOMPLETE tasks for the provided ids by primary key (preserving the provided order),
+    dropping any id the index holds that is no longer INCOMPLETE within the database
+    """
+    tasks_by_id = {}
+    for start in range(0, len(task_ids), TASK_LOOKUP_CHUNK_SIZE):
+        chunk = task_ids[start : start + TASK_LOOKUP_CHUNK_SIZE]
+        for task in Task.query.filter(Task.id.in_(chunk), Task.status == TaskStatus.INCOMPLETE):
+            tasks_by_id[task.id] = task
+
+    stale_task_ids = [task_id for task_id in task_ids if task_id not in tasks_by_id]
+    for task_id in stale_task_ids:
+        task_index.discard(task_id)
+    return [tasks_by_id[task_id] for task_id in task_ids if task_id in tasks_by_id]
+
+
+def refresh_task_index(interval, exclude_task_ids=()):
+    """
+    Syncs the tasks changed since the task index was last refreshed (ie - by another server process), at most
+    once every interval seconds (None disables). The tasks of exclude_task_ids (ie - reserved tasks) are left
+    as they are
+    """
+    if interval is None:
+        return
+    refreshed_at = task_index.refresh_due(interval)
+    if refreshed_at is None:
+        return
+    changed_since = refreshed_at - timedelta(seconds=TASK_INDEX_REFRESH_OVERLAP)
+    exclude_task_ids = set(exclude_task_ids)
+    for task in Task.query.filter(Task.updated_at >= changed_since):
+        if task.id not in exclude_task_ids:
+            task_index.sync(task)
@@ -1,9 +1,11 @@
+from datetime import datetime
 from functools import cached_property
 
 from app.agvs.constants import AGVDriveTrainType
 from app.core.utils import euclidean_dist
 from app.database import Column, Model, db, relationship
 
+from . import packed_route
 from .constants import Priority, TaskStatus
 
 
@@ -17,10 +19,37 @@ class Task(Model):
     status : indicates which stage of processing a Task is in (ie - INCOMPLETE, IN_PROGRESS, COMPLETE)
     drive_train_type : indicates the Task is reserved for an AGV with a specific drive train (can be MECANUM, ACKERMANN)
     waypoints : relational link to the waypoints (locations on a 2D plane) associated with this task
+    route : the packed waypoints of a task with many waypoints (see packed_route), such tasks have no waypoint rows
     agv_id : indicates which AGV this task is assigned to
+    num_waypoints : the number of waypoints associated with this task
+    path_dist_lower_bound : the straight line distance travelled visiting the task's waypoints in order
+    start_x : the x-coordinate of the task's starting waypoint
+    start_y : the y-coordinate of the task's starting waypoint
+    created_at : the (UTC) time the task was created at, used by schedulers to account for queueing time
+    updated_at : the (UTC) time the task was last changed at, other server processes look up changed tasks by it
+    deadline : an optional (UTC) time the task should be started by, honoured by deadline aware schedulers
+    last_waypoint_order : the order of the task's final waypoint
+    next_waypoint_order : the progress of the AGV through the task, the waypoints ordered before it are visited
+                          (None when no waypoint was visited)
+
+    NOTE: num_waypoints, path_dist_lower_bound, start_x, start_y and last_waypoint_order are computed once (see
+    compute_path_metrics) when the task's waypoints are registered, so scheduling never has to load a task's waypoints
+
+    NOTE: route is loaded only when accessed, use route_array to read the waypoints of a task whatever their storage
+
+    NOTE: waypoints are visited strictly in order, so the progress through a task is a single cursor, updating it
+    never touches the task's waypoints
     """
 
     __tablename__ = "task"
+    __table_args__ = (
+        # INCOMPLETE tasks are loaded by priority to build the task index, tasks are listed by status
+        db.Index("ix_task_status_priority", "status", "priority"),
+        # every AGV query joins its tasks
+        db.Index("ix_task_agv_id", "agv_id"),
+        # the task index of every server process periodically looks up the tasks changed elsewhere
+        db.Index("ix_task_updated_at", "updated_at"),
+    )
     id = Column(db.Integer, primary_key=True)
     priority = Column(db.Enum(Priority), default=Priority.MEDIUM, nullable=False)
     status = Column(db.Enum(TaskStatus), default=TaskStatus.INCOMPLETE, nullable=False)
@@ -30,57 +59,87 @@ class Task(Model):
         backref="task",
     )
     agv_id = Column(db.Integer, db.ForeignKey("agv.id"))
-
-    @cached_property
-    def num_waypoints(self):
-        if not self.waypoints:
-            return 0
-        return len(self.waypoints)
-
-    @cached_property
-    def starting_waypoint(self):
-        return Waypoint.query.filter_by(task_id=self.id, order=0).first()
+    num_waypoints = Column(db.Integer, default=0, nullable=False)
+    path_dist_lower_bound = Column(db.Float, default=0.0, nullable=False)
+    start_x = Column(db.Float, nullable=True)
+    start_y = Column(db.Float, nullable=True)
+    created_at = Column(db.DateTime, default=datetime.utcnow)
+    updated_at = Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    deadline = Column(db.DateTime, nullable=True)
+    last_waypoint_order = Column(db.Integer, nullable=True)
+    next_waypoint_order = Column(db.Integer, nullable=True)
+    route = db.deferred(Column(db.LargeBinary, nullable=True))
 
     @property
     def get_next_unvisited_waypoint(self):
-        return (
-            Waypoint.query.filter_by(task_id=self.id, visited=False)
-            .order_by(Waypoint.order.asc())
-            .first()
-        )
+        if self.route is not None:
+            route = self.route_array()
+            ind = packed_route.num_visited(route, self.next_waypoint_order)
+            if ind == len(route):
+                return None
+            # a transient stand in for the packed waypoint, it is never added to the session
+            x, y, theta, order = route[ind].tolist()
+            return Waypoint(x=x, y=y, theta=theta, order=order)
+        query = Waypoint.query.filter_by(task_id=self.id)
+        if self.next_waypoint_order is not None:
+            query = query.filter(Waypoint.order >= self.next_waypoint_order)
+        return query.order_by(Waypoint.order.asc()).first()
+
+    def route_array(self, waypoints=None):
+        """
+        Function returns the waypoints of the task as an array sorted by order (see packed_route.ROUTE_DTYPE),
+        packed routes are read without copying, waypoints may be provided when the task's waypoint rows are
+        already loaded
+        """
+        if self.route is not None:
+            return packed_route.unpack_route(self.route)
+        return packed_route.waypoints_to_route(self.waypoints if waypoints is None else waypoints)
 
-    @cached_property
-    def path_dist_lower_bound(self):
-        if not self.waypoints:
-            return 0
-        task_waypoints = (
-            Waypoint.query.filter_by(task_id=self.id).order_by(Waypoint.order.asc()).all()
-        )
-        total_dist = 0
-        for ind in range(1, len(task_waypoints)):
-            previous_waypoint, current_waypoint = task_waypoints[ind - 1], task_waypoints[ind]
-            total_dist += euclidean_dist(
-                previous_waypoint.x, current_waypoint.x, previous_waypoint.y, current_waypoint.y
-            )
-        return total_dist
+    def is_waypoint_visited(self, order):
+        return self.next_waypoint_order is not None and order < self.next_waypoint_order
+
+    def visit_waypoints_before(self, waypoint_order=None):
+        """
+        Function marks the waypoints ordered before waypoint_order (every waypoint when it is None) as visited,
+        the progress through the task never moves backwards
+        """
+        if self.last_waypoint_order is None:
+            return
+        end_order = self.last_waypoint_order + 1
+        next_order = end_order if waypoint_order is None else min(waypoint_order, end_order)
+        if self.next_waypoint_order is None or next_order > self.next_waypoint_order:
+            self.next_waypoint_order = next_order
+
+    def reset_progress(self):
+        """Function marks every waypoint of the task as unvisited"""
+        self.next_waypoint_order = None
 
     @cached_property
     def starting_waypoint(self):
         first_order_num = min([waypoint.order for waypoint in self.waypoints])
         return list(filter(lambda task: task.order == first_order_num, self.waypoints))[0]
 
+    def compute_path_metrics(self):
+        """
+        Function (re)computes the stored path metrics of the task from its waypoints,
+        it must be called whenever the waypoints of a task are registered or changed
+        """
+        for attr, value in packed_route.route_metrics(self.route_array()).items():
+            setattr(self, attr, value)
+
     def total_path_dist_lower_bound(self, start_x, start_y):
         """
         Function returns a lower bound path distance from a given starting point
         to the ending point of the task's defined waypoint path
         """
-        starting_waypoint = self.starting_waypoint
         return (
-            euclidean_dist(starting_waypoint.x, start_x, starting_waypoint.y, start_y)
+            euclidean_dist(self.start_x, start_x, self.start_y, start_y)
             + self.path_dist_lower_bound
         )
 
-    def __init__(self, priority=None, status=None, agv_id=None, drive_train_type=None):
+    def __init__(
+        self, priority=None, status=None, agv_id=None, drive_train_type=None, deadline=None
+    ):
         if priority is not None and type(priority) is Priority:
             self.priority = priority
         if status is not None and type(status) is TaskStatus:
@@ -89,6 +148,8 @@ class Task(Model):
             self.agv_id = agv_id
         if drive_train_type is not None:
             self.drive_train_type = drive_train_type
+        if deadline is not None:
+            self.deadline = deadline
 
     def __repr__(self):
         return f"TASK:{self.id}| AGV:{self.agv_id}| status:{self.status}| priority:{self.priority}| drive_train_type: {self.drive_train_type}  | path dist LB: {self.path_dist_lower_bound}"
@@ -103,27 +164,32 @@ class Waypoint(Model):
     y : the y-coordinate position of the Waypoint
     theta : the rotational direction of the Waypoint (in radians)
     order : indicates when this Waypoint should be visited (in comparison to other waypoints in the same Task)
-    visited : indicates whether the Waypoint was navigated to by the AGV
+    visited : indicates whether the Waypoint was navigated to by the AGV (derived from the progress of its Task)
     task_id : indicates which Task this waypoint belongs to
     """
 
     __tablename__ = "waypoint"
+    # the waypoints of a task are loaded in order, and looked up from the task's progress onwards
+    __table_args__ = (db.Index("ix_waypoint_task_order", "task_id", "order"),)
     id = Column(db.Integer, primary_key=True)
     x = Column(db.Float)
     y = Column(db.Float)
     theta = Column(db.Float)
     order = Column(db.Integer, default=0)
-    visited = Column(db.Boolean, default=False)
     task_id = Column(db.Integer, db.ForeignKey("task.id"))
 
+    # NOTE: visited is accepted for backwards compatibility only, new waypoints are never visited
     def __init__(self, x=None, y=None, theta=None, order=None, visited=None, task=None):
         self.x = x if x is not None else 0.0
         self.y = y if y is not None else 0.0
         self.theta = theta if theta is not None else 0.0
         self.order = order if order is not None else 0
-        self.visted = visited if visited is not None else False
         if task is not None:
             self.task = task
 
+    @property
+    def visited(self):
+        return self.task is not None and self.task.is_waypoint_visited(self.order)
+
     def __repr__(self):
         return f"WAYPOINT:{self.id}| TASK:{self.task_id} | (x:{self.x},y:{self.y}, 0:{self.theta}) | order:{self.order} | visited:{self.visited}"
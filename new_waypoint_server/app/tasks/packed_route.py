@@ -0,0 +1,190 @@
+import numpy as np
+from flask import current_app
+
+# a packed route is one record per waypoint, sorted by order, stored as the raw bytes of a NumPy array
+ROUTE_DTYPE = np.dtype([("x", "<f8"), ("y", "<f8"), ("theta", "<f8"), ("order", "<i8")])
+# waypoint orders are stored in Integer columns elsewhere (ie - the progress of a task)
+MAX_ORDER = 2**31 - 1
+
+
+class InvalidRoute(ValueError):
+    pass
+
+
+# checks applied to the (x, y, theta, order) columns of waypoints, in the order their errors are reported
+def _invalid_waypoints(columns):
+    x, y, theta, order = columns.T
+    with np.errstate(invalid="ignore"):
+        yield ~np.isfinite(columns).all(axis=1), "x, y, theta and order must be finite numbers"
+        yield (
+            (x > current_app.config["X_COORD_UPPER_BOUND"])
+            | (x < current_app.config["X_COORD_LOWER_BOUND"])
+            | (y > current_app.config["Y_COORD_UPPER_BOUND"])
+            | (y < current_app.config["Y_COORD_LOWER_BOUND"])
+        ), "X or Y coordinate is out of bounds for the allowable range of navigatable coordinates"
+        yield np.abs(
+            theta
+        ) > np.pi, "theta is out of bounds from the allowable range of values: [-pi, pi]"
+        yield (order != np.round(order)) | (np.abs(order) > MAX_ORDER), "order must be an integer"
+
+
+def _waypoint_row(waypoint):
+    if not isinstance(waypoint, dict):
+        raise KeyError("x")
+    theta = waypoint.get("theta")
+    return waypoint["x"], waypoint["y"], 0.0 if theta is None else theta, waypoint["order"]
+
+
+def parse_routes(waypoint_lists):
+    """
+    Validates the waypoints of many tasks at once (dictionaries shaped like WaypointCreateSerializer input),
+    performing the checks of WaypointCreateSerializer without marshmallow. Returns the route of every list of
+    waypoints (None for invalid lists), along with the errors keyed by the position of the invalid lists
+    """
+    routes, errors = [None] * len(waypoint_lists), {}
+    positions, parsed = [], []
+    for ind, waypoints in enumerate(waypoint_lists):
+        if not waypoints or not isinstance(waypoints, list):
+            errors[ind] = "No valid waypoints provided"
+            continue
+        try:
+            columns = np.array(
+                [_waypoint_row(waypoint) for waypoint in waypoints], dtype=np.float64
+            )
+        except KeyError:
+            errors[ind] = "Every waypoint requires x, y and order"
+            continue
+        except (TypeError, ValueError):
+            errors[ind] = "x, y, theta and order must be numbers"
+            continue
+        positions.append(ind)
+        parsed.append(columns)
+    if not parsed:
+        return routes, errors
+
+    # the waypoints of every list are checked together, then sorted by list and order
+    columns = np.concatenate(parsed)
+    lengths = np.array([len(list_columns) for list_columns in parsed])
+    owners = np.repeat(np.arange(len(parsed)), lengths)
+    invalid = np.zeros(len(parsed), dtype=bool)
+    for invalid_waypoints, message in _invalid_waypoints(columns):
+        for owner in np.unique(owners[invalid_waypoints & ~invalid[owners]]):
+            errors[positions[owner]] = message
+            invalid[owner] = True
+
+    order = np.where(invalid[owners], 0, columns[:, 3])
+    sort_order = np.lexsort((order, owners))
+    columns, order, owners = columns[sort_order], order[sort_order], owners[sort_order]
+    repeated = (owners[1:] == owners[:-1]) & (order[1:] == order[:-1])
+    for owner in np.unique(owners[1:][repeated & ~invalid[owners[1:]]]):
+        errors[
+            positions[owner]
+        ] = "Ordering of waypoints provided invalid - repetition in order detected"
+        invalid[owner] = True
+
+    route = np.empty(len(columns), dtype=ROUTE_DTYPE)
+    route["x"], route["y"], route["theta"], route["order"] = (
+        columns[:, 0],
+        columns[:, 1],
+        columns[:, 2],
+        order,
+    )
+    ends = np.cumsum(lengths)
+    for owner, (start, end) in enumerate(zip(ends - lengths, ends)):
+        if not invalid[owner]:
+            routes[positions[owner]] = route[start:end]
+    return routes, errors
+
+
+def pack_waypoints(waypoints):
+    """Packs waypoint dictionaries into the bytes of a route, raises InvalidRoute when a waypoint is invalid"""
+    routes, errors = parse_routes([waypoints])
+    if errors:
+        raise InvalidRoute(errors[0])
+    return routes[0].tobytes()
+
+
+def unpack_route(packed_route):
+    """Returns a (read only) view of the route stored in packed_route, no waypoint is copied"""
+    return np.frombuffer(packed_route, dtype=ROUTE_DTYPE)
+
+
+def waypoints_to_route(waypoints):
+    """Returns the route of Waypoint rows"""
+    route = np.array(
+        [(waypoint.x, waypoint.y, waypoint.theta, waypoint.order) for waypoint in waypoints],
+        dtype=ROUTE_DTYPE,
+    )
+    return np.sort(route, order="order")
+
+
+def route_metrics(route):
+    """
+    Returns the path metrics of a route (num_waypoints, path_dist_lower_bound, start_x, start_y and
+    last_waypoint_order, see Task.compute_path_metrics)
+    """
+    if not len(route):
+        return {
+            "num_waypoints": 0,
+            "path_dist_lower_bound": 0.0,
+            "start_x": None,
+            "start_y": None,
+            "last_waypoint_order": None,
+        }
+    return routes_metrics([route])[0]
+
+
+def routes_metrics(routes):
+    """Returns the path metrics of many (non empty) routes at once, see route_metrics"""
+    lengths = np.array([len(route) for route in routes])
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    x, y = np.concatenate([route["x"] for route in routes]), np.concatenate(
+        [route["y"] for route in routes]
+    )
+    orders = np.concatenate([route["order"] for route in routes])
+    # the step from the final waypoint of a route to the first waypoint of the next is part of neither
+    steps = np.append(np.hypot(np.diff(x), np.diff(y)), 0.0)
+    steps[ends - 1] = 0.0
+    path_dists = np.add.reduceat(steps, starts)
+    return [
+        {
+            "num_waypoints": num_waypoints,
+            "path_dist_lower_bound": path_dist,
+            "start_x": start_x,
+            "start_y": start_y,
+            "last_waypoint_order": last_order,
+        }
+        for num_waypoints, path_dist, start_x, start_y, last_order in zip(
+            lengths.tolist(),
+            path_dists.tolist(),
+            x[starts].tolist(),
+            y[starts].tolist(),
+            orders[ends - 1].tolist(),
+        )
+    ]
+
+
+def num_visited(route, next_waypoint_order):
+    """Returns the number of waypoints of a route ordered before the progress of its task (ie - visited)"""
+    if next_waypoint_order is None:
+        return 0
+    return int(np.searchsorted(route["order"], next_waypoint_order))
+
+
+def route_to_json(route, next_waypoint_order):
+    """
+    Returns the waypoints of a route shaped like WaypointDetailSerializer output, packed waypoints have no id
+    """
+    visited_waypoints = num_visited(route, next_waypoint_order)
+    return [
+        {
+            "id": None,
+            "x": x,
+            "y": y,
+            "theta": theta,
+            "order": order,
+            "visited": ind < visited_waypoints,
+        }
+        for ind, (x, y, theta, order) in enumerate(route.tolist())
+    ]
@@ -0,0 +1,94 @@
+import heapq
+
+
+class IndexedPriorityQueue:
+    """
+    Binary min-heap of (key, item id) pairs that tracks the position of every item, so besides pushing and
+    popping, items can be re-keyed or removed in O(log n) without rebuilding the heap
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._positions = {}
+
+    def push(self, item_id, key):
+        """Inserts the item, or updates its key when it is already queued"""
+        position = self._positions.get(item_id)
+        if position is not None:
+            old_key = self._heap[position][0]
+            self._heap[position] = (key, item_id)
+            if key < old_key:
+                self._sift_up(position)
+            else:
+                self._sift_down(position)
+            return
+        self._heap.append((key, item_id))
+        self._positions[item_id] = len(self._heap) - 1
+        self._sift_up(len(self._heap) - 1)
+
+    def remove(self, item_id):
+        position = self._positions.pop(item_id, None)
+        if position is None:
+            return
+        last = self._heap.pop()
+        if position == len(self._heap):
+            return
+        self._heap[position] = last
+        self._positions[last[1]] = position
+        self._sift_up(position)
+        self._sift_down(self._positions[last[1]])
+
+    def pop(self):
+        """Removes and returns the (key, item id) pair with the lowest key"""
+        key, item_id = self._heap[0]
+        self.remove(item_id)
+        return key, item_id
+
+    def peek(self):
+        return self._heap[0] if self._heap else None
+
+    def smallest(self, k):
+        """Returns the k (key, item id) pairs with the lowest keys (lowest first) in O(k log k)"""
+        result, frontier = [], [(self._heap[0], 0)] if self._heap else []
+        while frontier and len(result) < k:
+            entry, position = heapq.heappop(frontier)
+            result.append(entry)
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(self._heap):
+                    heapq.heappush(frontier, (self._heap[child], child))
+        return result
+
+    def _swap(self, first, second):
+        heap = self._heap
+        heap[first], heap[second] = heap[second], heap[first]
+        self._positions[heap[first][1]] = first
+        self._positions[heap[second][1]] = second
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if self._heap[position] >= self._heap[parent]:
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self._heap)
+        while True:
+            smallest = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._heap[child] < self._heap[smallest]:
+                    smallest = child
+            if smallest == position:
+                return
+            self._swap(position, smallest)
+            position = smallest
+
+    def __contains__(self, item_id):
+        return item_id in self._positions
+
+    def __len__(self):
+        return len(self._heap)
+
+    def __iter__(self):
+        return iter(self._positions)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from .index import task_index
+from .models import Task
+
+
+class TaskReservations:
+    """
+    Process-local record of the INCOMPLETE task reserved as the next task of each BUSY AGV (see
+    TaskAssignmentController.reserve_next_task). Reserved tasks are withheld from the task index so no
+    other AGV is handed them, a lost reservation (ie - on restart) simply returns the task to the pool
+    once the index is rebuilt from the database.
+
+    Reservations expire ttl seconds after they were last refreshed (see touch) by the AGV reporting progress,
+    so an AGV that goes quiet or never requests its next task does not withhold it forever (see
+    release_expired_reservations). AGVs without a task available to reserve are deferred (see defer) rather
+    than running the scheduler on every update.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reservations = {}
+        self._retry_after = {}
+
+    def reserve(self, agv_id, task_id, ttl):
+        with self._lock:
+            self._reservations[agv_id] = (task_id, time.monotonic() + ttl)
+            self._retry_after.pop(agv_id, None)
+            task_index.discard(task_id)
+
+    def touch(self, agv_id, ttl):
+        """Extends the reservation of the AGV (if any) by ttl seconds from now"""
+        with self._lock:
+            reservation = self._reservations.get(agv_id)
+            if reservation is not None:
+                self._reservations[agv_id] = (reservation[0], time.monotonic() + ttl)
+
+    def pop(self, agv_id):
+        """Removes and returns the id of the task reserved for the AGV (or None)"""
+        with self._lock:
+            reservation = self._reservations.pop(agv_id, None)
+            return reservation[0] if reservation is not None else None
+
+    def expired(self):
+        """Returns the ids of the AGVs whose reservation expired"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                agv_id
+                for agv_id, (_, expires_at) in self._reservations.items()
+                if expires_at <= now
+            ]
+
+    def defer(self, agv_id, interval):
+        """Defers reserving a task for the AGV by interval seconds (ie - no task was available)"""
+        with self._lock:
+            self._retry_after[agv_id] = time.monotonic() + interval
+
+    def is_deferred(self, agv_id):
+        with self._lock:
+            retry_after = self._retry_after.get(agv_id)
+            if retry_after is not None and retry_after <= time.monotonic():
+                del self._retry_after[agv_id]
+                retry_after = None
+            return retry_after is not None
+
+    def discard_tasks(self, task_ids):
+        """Drops the reservations of the provided tasks (ie - deleted tasks)"""
+        task_ids = set(task_ids)
+        with self._lock:
+            self._reservations = {
+                agv_id: reservation
+                for agv_id, reservation in self._reservations.items()
+                if reservation[0] not in task_ids
+            }
+
+    def task_ids(self):
+        with self._lock:
+            return [task_id for task_id, _ in self._reservations.values()]
+
+    def clear(self):
+        with self._lock:
+            self._reservations = {}
+            self._retry_after = {}
+
+    def __contains__(self, agv_id):
+        return agv_id in self._reservations
+
+
+task_reservations = TaskReservations()
+
+
+def release_reservation(agv_id):
+    """Drops the reservation held by the AGV, returning the reserved task to the task index"""
+    task_id = task_reservations.pop(agv_id)
+    if task_id is None:
+        return
+    task = Task.query.filter_by(id=task_id).first()
+    if task is not None:
+        task_index.sync(task)
+
+
+def release_expired_reservations():
+    """Returns the tasks of every expired reservation to the task index"""
+    for agv_id in task_reservations.expired():
+        release_reservation(agv_id)
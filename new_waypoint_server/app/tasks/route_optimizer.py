@@ -0,0 +1,142 @@
+import time
+
+import numpy as np
+
+# maximum length of the waypoint segments relocated by the Or-opt moves
+OR_OPT_MAX_SEGMENT_LENGTH = 3
+
+# improvements smaller than this are treated as floating point noise
+IMPROVEMENT_TOLERANCE = 1e-9
+
+
+class _RouteDistances:
+    """
+    Straight line distances between the waypoints of a route and the "depot" node of optimize_waypoint_order,
+    computed for the pairs of nodes asked for rather than held in an n x n matrix, so memory stays linear
+    in the number of waypoints and no work happens before the time budget starts running down
+    """
+
+    def __init__(self, coordinates, fix_first=False):
+        self.points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+        self.depot = len(self.points)
+        # a fixed first waypoint is tied to the depot by an edge cheaper than any route is long
+        extent = np.hypot(*np.ptp(self.points, axis=0))
+        self.fixed_edge = -((len(self.points) + 1) * extent + 1.0) if fix_first else None
+
+    def __len__(self):
+        return self.depot + 1
+
+    def __getitem__(self, pairs):
+        u, v = (np.asarray(nodes) for nodes in pairs)
+        from_depot, to_depot = u == self.depot, v == self.depot
+        offsets = self.points[np.where(from_depot, 0, u)] - self.points[np.where(to_depot, 0, v)]
+        distances = np.where(from_depot | to_depot, 0.0, np.hypot(offsets[..., 0], offsets[..., 1]))
+        if self.fixed_edge is not None:
+            fixed = (from_depot & (v == 0)) | ((u == 0) & to_depot)
+            distances = np.where(fixed, self.fixed_edge, distances)
+        return distances
+
+
+def path_length(coordinates, order):
+    """Straight line distance travelled visiting the coordinates in the provided order"""
+    points = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)[list(order)]
+    return float(np.hypot(*np.diff(points, axis=0).T).sum()) if len(points) > 1 else 0.0
+
+
+def _nearest_neighbour_tour(distances, start, deadline):
+    """
+    Visits the nearest unvisited waypoint next, once the deadline passes the remaining waypoints are
+    appended in their provided order
+    """
+    num_points = distances.depot
+    tour, unvisited = [start], np.ones(num_points, dtype=bool)
+    unvisited[start] = False
+    nodes = np.arange(num_points)
+    for _ in range(num_points - 1):
+        if time.monotonic() > deadline:
+            tour.extend(np.flatnonzero(unvisited).tolist())
+            break
+        row = np.where(unvisited, distances[tour[-1], nodes], np.inf)
+        tour.append(int(np.argmin(row)))
+        unvisited[tour[-1]] = False
+    return np.array(tour)
+
+
+def _two_opt_pass(distances, tour, deadline):
+    """Applies the best improving segment reversal per tour position, returns whether any was applied"""
+    num_points, improved = len(tour), False
+    for i in range(num_points - 2):
+        if time.monotonic() > deadline:
+            break
+        a, b = tour[i], tour[i + 1]
+        # edges (tour[j], tour[j + 1]) not adjacent to (a, b), the closing edge is adjacent when i == 0
+        j = np.arange(i + 2, num_points if i > 0 else num_points - 1)
+        if not len(j):
+            continue
+        c, d = tour[j], tour[(j + 1) % num_points]
+        deltas = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+        best = int(np.argmin(deltas))
+        if deltas[best] < -IMPROVEMENT_TOLERANCE:
+            tour[i + 1 : j[best] + 1] = tour[i + 1 : j[best] + 1][::-1]
+            improved = True
+    return improved
+
+
+def _or_opt_pass(distances, tour, deadline):
+    """Relocates (and possibly reverses) short segments to their cheapest position in the tour"""
+    num_points, improved = len(tour), False
+    for segment_length in range(1, OR_OPT_MAX_SEGMENT_LENGTH + 1):
+        if num_points - segment_length < 3:
+            break
+        for i in range(num_points):
+            if time.monotonic() > deadline:
+                return improved
+            rotated = np.roll(tour, -i)
+            segment, rest = rotated[:segment_length], rotated[segment_length:]
+            first, last = segment[0], segment[-1]
+            # rest runs from the segment's successor around to its predecessor
+            removal_gain = (
+                distances[rest[-1], first] + distances[last, rest[0]] - distances[rest[-1], rest[0]]
+            )
+            u, v = rest[:-1], rest[1:]
+            forward = distances[u, first] + distances[last, v]
+            backward = distances[u, last] + distances[first, v]
+            insertion_costs = np.minimum(forward, backward) - distances[u, v]
+            k = int(np.argmin(insertion_costs))
+            if insertion_costs[k] - removal_gain < -IMPROVEMENT_TOLERANCE:
+                if backward[k] < forward[k]:
+                    segment = segment[::-1]
+                tour[:] = np.concatenate([rest[: k + 1], segment, rest[k + 1 :]])
+                improved = True
+    return improved
+
+
+def optimize_waypoint_order(coordinates, fix_first=False, time_budget=None):
+    """
+    Returns the indices of the provided (x, y) coordinates in the order minimizing the straight line
+    distance of visiting all of them (the route is open, it ends at its last waypoint). When fix_first is
+    set, the route always starts at the first coordinate.
+
+    A nearest neighbour route is improved by 2-opt and Or-opt moves until no move improves it or
+    time_budget (seconds) runs out, the result is a good rather than a provably shortest route.
+    """
+    num_points = len(coordinates)
+    if num_points <= 2:
+        return list(range(num_points))
+    deadline = time.monotonic() + time_budget if time_budget is not None else float("inf")
+
+    # the open route is solved as a closed tour through an extra "depot" node at distance 0 from every
+    # waypoint, a fixed first waypoint is tied to the depot by an edge no tour can afford to drop
+    distances = _RouteDistances(coordinates, fix_first)
+    depot = distances.depot
+    tour = np.append(_nearest_neighbour_tour(distances, 0, deadline), depot)
+    while time.monotonic() <= deadline:
+        improved = _two_opt_pass(distances, tour, deadline)
+        improved = _or_opt_pass(distances, tour, deadline) or improved
+        if not improved:
+            break
+
+    route = np.roll(tour, -int(np.flatnonzero(tour == depot)[0]))[1:]
+    if fix_first and route[0] != 0:
+        route = route[::-1]
+    return [int(index) for index in route]
@@ -1,3 +1,5 @@
+from datetime import timezone
+
 from app.agvs.constants import AGVDriveTrainType
 from app.agvs.models import AGV
 from app.core import validators
@@ -8,6 +10,7 @@ from marshmallow import ValidationError, fields, pre_load, validates_schema
 from marshmallow_enum import EnumField
 
 from .models import Task, Waypoint
+from .packed_route import route_to_json
 
 
 class WaypointCreateSerializer(ma.SQLAlchemyAutoSchema):
@@ -19,7 +22,8 @@ class WaypointCreateSerializer(ma.SQLAlchemyAutoSchema):
     x = fields.Float(required=True)
     y = fields.Float(required=True)
     theta = fields.Float(required=False)
-    visited = fields.Boolean(required=False)
+    # accepted for backwards compatibility, new waypoints are never visited
+    visited = fields.Boolean(required=False, load_only=True)
     order = fields.Integer(required=True)
 
     @pre_load
@@ -52,7 +56,8 @@ class WaypointDetailSerializer(ma.SQLAlchemyAutoSchema):
     x = fields.Float()
     y = fields.Float()
     theta = fields.Float()
-    visited = fields.Boolean()
+    # derived from the progress of the waypoint's task
+    visited = fields.Boolean(dump_only=True)
     order = fields.Integer()
 
 
@@ -61,11 +66,26 @@ class TaskCreateSerializer(ma.SQLAlchemyAutoSchema):
         model = Task
         load_instance = True
         sql_session = db.session
+        # path metrics (derived from the provided waypoints), the progress and the creation / update times are
+        # never user input
+        exclude = (
+            "num_waypoints",
+            "path_dist_lower_bound",
+            "start_x",
+            "start_y",
+            "last_waypoint_order",
+            "next_waypoint_order",
+            "route",
+            "created_at",
+            "updated_at",
+        )
 
     status = EnumField(TaskStatus)
     priority = EnumField(Priority, required=False)
     drive_train_type = EnumField(AGVDriveTrainType, required=False)
     agv_id = fields.Integer(required=False)
+    # deadlines are stored as naive UTC times, like created_at
+    deadline = fields.NaiveDateTime(required=False, allow_none=True, timezone=timezone.utc)
 
     @validates_schema
     def perform_validation(self, data, **kwargs):
@@ -79,14 +99,30 @@ class TaskDetailSerializer(ma.SQLAlchemyAutoSchema):
         model = Task
         load_instance = True
         sql_session = db.session
+        # the waypoints of packed routes are serialized with the other waypoints
+        exclude = ("route",)
 
     id = fields.Integer(dump_only=True)
     status = EnumField(TaskStatus)
     priority = EnumField(Priority)
     drive_train_type = EnumField(AGVDriveTrainType)
-    waypoints = fields.Nested(WaypointDetailSerializer(many=True), dump_only=True)
+    waypoints = fields.Method("get_waypoints", dump_only=True)
     agv_id = fields.Integer(dump_only=True)
     num_waypoints = fields.Method("get_num_waypoints", dump_only=True)
+    path_dist_lower_bound = fields.Float(dump_only=True)
+    start_x = fields.Float(dump_only=True)
+    start_y = fields.Float(dump_only=True)
+    last_waypoint_order = fields.Integer(dump_only=True)
+    next_waypoint_order = fields.Integer(dump_only=True)
+    created_at = fields.DateTime(dump_only=True)
+    updated_at = fields.DateTime(dump_only=True)
+    deadline = fields.DateTime(dump_only=True)
+
+    def get_waypoints(self, instance):
+        # packed waypoints are only turned into JSON when a task is serialized
+        if instance.route is not None:
+            return route_to_json(instance.route_array(), instance.next_waypoint_order)
+        return WaypointDetailSerializer(many=True).dump(instance.waypoints)
 
     def get_num_waypoints(self, instance):
         return instance.num_waypoints
@@ -0,0 +1,106 @@
+import heapq
+import math
+
+
+class SpatialGrid:
+    """
+    Uniform grid over task starting points supporting incremental insertion / removal and k-nearest
+    queries. Each point carries a non-negative cost offset (ie - the task's path distance) so queries can
+    rank by "distance to the point + offset" exactly while still pruning by distance alone.
+
+    Entries without coordinates (tasks without waypoints) are tracked but never returned by queries.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self._entries = {}
+        self._cells = {}
+        self._cell_bounds = None
+
+    def _cell(self, x, y):
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def insert(self, item_id, x, y, cost_offset=0.0):
+        self.remove(item_id)
+        if x is None or y is None:
+            self._entries[item_id] = None
+            return
+        cell = self._cell(x, y)
+        self._entries[item_id] = (x, y, cost_offset, cell)
+        self._cells.setdefault(cell, {})[item_id] = None
+        # bounds only ever grow, which keeps them a valid (if conservative) search limit
+        if self._cell_bounds is None:
+            self._cell_bounds = [cell[0], cell[1], cell[0], cell[1]]
+        else:
+            bounds = self._cell_bounds
+            bounds[0], bounds[1] = min(bounds[0], cell[0]), min(bounds[1], cell[1])
+            bounds[2], bounds[3] = max(bounds[2], cell[0]), max(bounds[3], cell[1])
+
+    def remove(self, item_id):
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        cell = entry[3]
+        cell_items = self._cells[cell]
+        cell_items.pop(item_id, None)
+        if not cell_items:
+            del self._cells[cell]
+
+    def _ring_cells(self, origin, radius):
+        origin_x, origin_y = origin
+        if radius == 0:
+            yield origin
+            return
+        for offset in range(-radius, radius + 1):
+            yield (origin_x + offset, origin_y - radius)
+            yield (origin_x + offset, origin_y + radius)
+        for offset in range(-radius + 1, radius):
+            yield (origin_x - radius, origin_y + offset)
+            yield (origin_x + radius, origin_y + offset)
+
+    def nearest(self, x, y, k=1):
+        """Returns up to k (cost, item_id) tuples with the lowest "distance + cost offset", cheapest first"""
+        if not self._cells or k <= 0:
+            return []
+        origin = self._cell(x, y)
+        bounds = self._cell_bounds
+        max_radius = max(
+            origin[0] - bounds[0],
+            bounds[2] - origin[0],
+            origin[1] - bounds[1],
+            bounds[3] - origin[1],
+        )
+        best = []  # max-heap (negated costs) holding the k cheapest entries found so far
+
+        def consider(item_ids):
+            for item_id in item_ids:
+                item_x, item_y, cost_offset, _ = self._entries[item_id]
+                cost = math.hypot(item_x - x, item_y - y) + cost_offset
+                if len(best) < k:
+                    heapq.heappush(best, (-cost, item_id))
+                elif cost < -best[0][0]:
+                    heapq.heapreplace(best, (-cost, item_id))
+
+        for radius in range(max_radius + 1):
+            if 8 * radius > len(self._cells):
+                # the ring holds more cells than are occupied, scanning the occupied cells is cheaper
+                for cell, item_ids in self._cells.items():
+                    if max(abs(cell[0] - origin[0]), abs(cell[1] - origin[1])) >= radius:
+                        consider(item_ids)
+                break
+            for cell in self._ring_cells(origin, radius):
+                consider(self._cells.get(cell, ()))
+            # anything outside the rings searched so far is at least radius cells away
+            if len(best) == k and -best[0][0] <= radius * self.cell_size:
+                break
+
+        return sorted((-negated_cost, item_id) for negated_cost, item_id in best)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __contains__(self, item_id):
+        return item_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,27 +1,94 @@
 from collections import defaultdict
+from datetime import timezone
 
 import app.core.validators as validators
-from app.database import db
+from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.agvs.telemetry import fleet_telemetry
+from app.commands.models import Command
+from app.database import db, delete_in_chunks, on_commit
 from flask import current_app, jsonify, make_response, request
 from flask_api import status
 from flask_restful import Resource
+from marshmallow import ValidationError, fields
 
 from . import tasks_api
+from .bulk_import import import_tasks
 from .constants import Priority, TaskStatus
+from .index import task_index
 from .models import Task, Waypoint
+from .packed_route import InvalidRoute, pack_waypoints
+from .reservations import task_reservations
+from .route_optimizer import optimize_waypoint_order
 from .serializers import (
     TaskCreateSerializer,
     TaskDetailSerializer,
     WaypointCreateSerializer,
 )
 
+# tasks created before a (UTC) time may be deleted in bulk, naive times are UTC like task deadlines
+CREATED_BEFORE_FIELD = fields.NaiveDateTime(timezone=timezone.utc)
+
+
+class TaskDeletion:
+    """
+    Deletes whatever refers to the tasks deleted by delete_in_chunks: their waypoints and unprocessed commands
+    are deleted and the AGVs executing them return to READY (see before_delete). Once a chunk is committed its
+    tasks leave the task index, task reservations and command queues (see after_commit)
+    """
+
+    def __init__(self):
+        self.num_waypoints_deleted = 0
+        self.num_agvs_released = 0
+        self._command_ids = []
+        self._agv_ids = []
+
+    def before_delete(self, task_ids):
+        self.num_waypoints_deleted += Waypoint.query.filter(Waypoint.task_id.in_(task_ids)).delete(
+            synchronize_session=False
+        )
+        commands = Command.query.filter(Command.task_id.in_(task_ids), Command.processed == False)
+        self._command_ids = [command_id for (command_id,) in commands.with_entities(Command.id)]
+        commands.delete(synchronize_session=False)
+        # as if the AGVs had their task cancelled (see process_cancel_agv_or_task)
+        agvs = AGV.query.filter(AGV.current_task_id.in_(task_ids))
+        self._agv_ids = [agv_id for (agv_id,) in agvs.with_entities(AGV.id)]
+        agvs.update(
+            {AGV.current_task_id: None, AGV.status: AGVState.READY}, synchronize_session=False
+        )
+
+    def after_commit(self, task_ids):
+        # imported here, the command queues import the tasks package
+        from app.commands.queues import command_queues
+
+        for task_id in task_ids:
+            task_index.discard(task_id)
+        task_reservations.discard_tasks(task_ids)
+        for command_id in self._command_ids:
+            command_queues.remove(command_id)
+        for agv in AGV.query.filter(AGV.id.in_(self._agv_ids)).populate_existing():
+            fleet_telemetry.publish(agv)
+        self.num_agvs_released += len(self._agv_ids)
+
 
 class TaskCreateView(Resource):
+    def _packs_route(self, waypoints):
+        # the waypoints of tasks with at least PACKED_ROUTE_MIN_WAYPOINTS waypoints are stored as a packed route
+        min_waypoints = current_app.config["PACKED_ROUTE_MIN_WAYPOINTS"]
+        return min_waypoints is not None and len(waypoints) >= min_waypoints
+
     def _validate_waypoints(self, data):
         waypoints = data.get("waypoints", None)
         if not waypoints:
             return {"error": "No valid waypoints provided"}
 
+        if self._packs_route(waypoints):
+            try:
+                pack_waypoints(waypoints)
+            except InvalidRoute as error:
+                return {"error": str(error)}
+            return None
+
         # perform validation on each provided waypoint
         serializer = WaypointCreateSerializer()
         order_uniqueness_identifier = defaultdict(lambda: 0)
@@ -36,24 +103,66 @@ class TaskCreateView(Resource):
                 "error": "Ordering of waypoints provided invalid - repetition in order detected"
             }
 
+    def _optimize_waypoint_order(self, waypoints, fix_first_waypoint):
+        # reorders the waypoints (in place) along the shortest route found within the time budget, a fixed
+        # first waypoint is the one listed first
+        route = optimize_waypoint_order(
+            [(waypoint["x"], waypoint["y"]) for waypoint in waypoints],
+            fix_first=fix_first_waypoint,
+            time_budget=current_app.config["ROUTE_OPTIMIZATION_TIME_BUDGET"],
+        )
+        for order, index in enumerate(route):
+            waypoints[index]["order"] = order
+
     def _create_task_waypoints(self, task, waypoints):
+        if self._packs_route(waypoints):
+            task.route = pack_waypoints(waypoints)
+            return
         serializer = WaypointCreateSerializer()
         for waypoint in waypoints:
             waypoint = serializer.load(waypoint, session=db.session)
             task.waypoints.append(waypoint)
-            task.save()
 
     def post(self):
         serializer = TaskCreateSerializer()
         data = request.get_json()
+        optimize_order = data.pop("optimize_order", False)
+        fix_first_waypoint = data.pop("fix_first_waypoint", False)
+        if not isinstance(optimize_order, bool) or not isinstance(fix_first_waypoint, bool):
+            return make_response(
+                jsonify({"error": "optimize_order and fix_first_waypoint must be booleans"}),
+                status.HTTP_400_BAD_REQUEST,
+            )
+        if optimize_order:
+            max_waypoints = current_app.config["ROUTE_OPTIMIZATION_MAX_WAYPOINTS"]
+            if len(data.get("waypoints") or []) > max_waypoints:
+                return make_response(
+                    jsonify(
+                        {"error": f"optimize_order supports at most {max_waypoints} waypoints"}
+                    ),
+                    status.HTTP_400_BAD_REQUEST,
+                )
+            # the submitted order (if any) is replaced by the optimized one
+            for order, waypoint in enumerate(data.get("waypoints") or []):
+                waypoint["order"] = order
+
         errors = self._validate_waypoints(data)
         if errors:
             return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
 
         waypoints = data.pop("waypoints")
+        errors = serializer.validate(data, session=db.session)
+        if errors:
+            return make_response(jsonify(errors), status.HTTP_400_BAD_REQUEST)
+        if optimize_order:
+            self._optimize_waypoint_order(waypoints, fix_first_waypoint)
         task = serializer.load(data, session=db.session)
         task.save()
         self._create_task_waypoints(task, waypoints)
+        task.compute_path_metrics()
+        task.save()
+        # requests served meanwhile would look the task up, miss it and drop it from the task index
+        on_commit(task_index.sync, task)
 
         return make_response(jsonify(TaskDetailSerializer().dump(task)), status.HTTP_201_CREATED)
 
@@ -92,20 +201,59 @@ class TaskListView(Resource):
         data = serializer.dump(queryset)
         return make_response(jsonify(data), status.HTTP_200_OK)
 
+    def _get_delete_criteria(self, priority, status, created_before):
+        """Returns the criteria of the tasks to delete, or None when a query parameter is invalid"""
+        if not self._query_parameters_valid(priority, status):
+            return None
+        criteria = []
+        if priority is not None:
+            criteria.append(Task.priority == Priority(priority))
+        if status is not None:
+            criteria.append(Task.status == TaskStatus(status))
+        if created_before is not None:
+            try:
+                criteria.append(Task.created_at < CREATED_BEFORE_FIELD.deserialize(created_before))
+            except ValidationError:
+                return None
+        return criteria
+
     def delete(self):
-        tasks = Task.query.all()
-        if not tasks:
+        query_status, query_priority, created_before = (
+            request.args.get("status", None),
+            request.args.get("priority", None),
+            request.args.get("created_before", None),
+        )
+        criteria = self._get_delete_criteria(query_priority, query_status, created_before)
+        if criteria is None:
             return make_response(
-                jsonify({"message": "No Tasks currently exist to delete"}),
-                status.HTTP_202_ACCEPTED,
+                jsonify({"message": "Invalid query parameters"}), status.HTTP_400_BAD_REQUEST
             )
 
-        for task in tasks:
-            task.delete()
-
-        return make_response(
-            jsonify({"message": "All Tasks successfully deleted"}), status.HTTP_200_OK
+        # tasks are deleted (along with their waypoints) a chunk at a time, never loaded
+        deletion = TaskDeletion()
+        num_deleted = delete_in_chunks(
+            Task,
+            criteria,
+            current_app.config["BULK_DELETE_CHUNK_SIZE"],
+            before_delete=deletion.before_delete,
+            after_commit=deletion.after_commit,
         )
+        counts = {
+            "num_deleted": num_deleted,
+            "num_waypoints_deleted": deletion.num_waypoints_deleted,
+            "num_agvs_released": deletion.num_agvs_released,
+        }
+        if not num_deleted:
+            message = (
+                "No Tasks currently exist to delete"
+                if not criteria
+                else "No Tasks match the filters"
+            )
+            return make_response(jsonify({"message": message, **counts}), status.HTTP_202_ACCEPTED)
+        if not criteria:
+            task_reservations.clear()
+        message = "All Tasks successfully deleted" if not criteria else "Tasks successfully deleted"
+        return make_response(jsonify({"message": message, **counts}), status.HTTP_200_OK)
 
 
 class TaskDetailView(Resource):
@@ -132,10 +280,30 @@ class TaskDetailView(Resource):
                 jsonify({"message": "Task does not exist within the waypoint server"}),
                 status.HTTP_400_BAD_REQUEST,
             )
-        task.delete()
+        deletion = TaskDeletion()
+        delete_in_chunks(
+            Task,
+            [Task.id == task.id],
+            1,
+            before_delete=deletion.before_delete,
+            after_commit=deletion.after_commit,
+        )
         return make_response(jsonify({"message": "AGV successfully deleted"}), status.HTTP_200_OK)
 
 
+class TaskImportView(Resource):
+    def post(self):
+        # the body (NDJSON or a JSON array of tasks) is parsed as it is read, never buffered as a whole
+        num_created, errors = import_tasks(
+            request.stream, current_app.config["TASK_IMPORT_CHUNK_SIZE"]
+        )
+        errors = {str(position): error for position, error in errors.items()}
+        return make_response(
+            jsonify({"num_created": num_created, "errors": errors}), status.HTTP_200_OK
+        )
+
+
 tasks_api.add_resource(TaskCreateView, "/")
+tasks_api.add_resource(TaskImportView, "/import/")
 tasks_api.add_resource(TaskDetailView, "/<int:id>/")
 tasks_api.add_resource(TaskListView, "/tasks/")
@@ -1,10 +1,13 @@
 import sys
 
 from app.agvs.constants import AGVState
+from app.agvs.models import AGV
 from app.app import create_app
 from app.config import ConfigType
 from app.database import db
-from app.tests.utils import create_agv
+from app.tasks.index import task_index
+from app.tasks.models import Task
+from app.tests.utils import create_agv, create_task, create_waypoint
 from flask_api import status
 from flask_testing import TestCase
 
@@ -111,6 +114,22 @@ class TestAGVCrud(TestCase):
         response = self.client.delete(f"{self.base_url}{agv.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+    def test_delete_agv_releases_tasks(self):
+        agv = create_agv(status=AGVState.READY)
+        other_agv = create_agv(status=AGVState.READY)
+        task = create_task(agv_id=agv.id, waypoints=[create_waypoint(x=1, y=1)])
+        db.session.commit()
+
+        response = self.client.delete(f"{self.base_url}{agv.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(task.agv_id)
+
+        # the task is no longer withheld for the deleted AGV
+        data = {"id": other_agv.id, "status": str(AGVState.READY), "x": 0.0, "y": 0.0, "theta": 0.0}
+        response = self.client.get("agv_request_handlers/request_task/", json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["id"], task.id)
+
     def test_list_agvs(self):
         agv_params_list = [
             {
@@ -167,6 +186,34 @@ class TestAGVCrud(TestCase):
         response_data = response.get_json()
         self.assertEqual(response_data, [])
 
+    def test_delete_filtered_agvs(self):
+        self.app.config["BULK_DELETE_CHUNK_SIZE"] = 2
+        stopped_agvs = [create_agv(status=AGVState.STOPPED) for i in range(3)]
+        agv = create_agv(status=AGVState.READY)
+        released_task = create_task(agv_id=stopped_agvs[0].id)
+        task = create_task(agv_id=agv.id)
+        task_index.clear()
+        db.session.commit()
+
+        response = self.client.delete(f"{self.base_url}agvs/", query_string={"status": "LOST"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.delete(f"{self.base_url}agvs/", query_string={"status": "STOPPED"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.get_json(),
+            {"message": "AGVs successfully deleted", "num_deleted": 3, "num_tasks_released": 1},
+        )
+        self.assertEqual([remaining.id for remaining in AGV.query.all()], [agv.id])
+        # the tasks of deleted AGVs are released to the general pool
+        self.assertEqual(Task.query.filter_by(id=released_task.id).first().agv_id, None)
+        self.assertEqual(Task.query.filter_by(id=task.id).first().agv_id, agv.id)
+        self.assertEqual(task_index.task_ids(), [released_task.id])
+
+        response = self.client.delete(f"{self.base_url}agvs/", query_string={"status": "STOPPED"})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.get_json()["message"], "No AGVs match the filters")
+
     def tearDown(self):
         db.session.remove()
         db.drop_all()
@@ -1,13 +1,21 @@
 import sys
+import threading
+import time
+from types import SimpleNamespace
 from unittest.mock import patch
 
 from app.agvs.constants import AGVState
+from app.agvs.update_sequences import update_sequences
 from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.config import ConfigType
 from app.database import db
-from app.tests.utils import create_agv
+from app.tests.utils import create_agv, create_command
 from flask_api import status
 from flask_testing import TestCase
+from sqlalchemy import text
 
 
 class TestAGVHandlers(TestCase):
@@ -85,8 +93,219 @@ class TestAGVHandlers(TestCase):
         response_data = response.get_json()
         self.assertEqual(response_data["_schema"][0], "Invalid data for AGV:READY Update")
 
+    def test_batch_update_state(self):
+        agvs = [create_agv(status=AGVState.READY) for _ in range(3)]
+        data = [
+            {
+                "id": agv.id,
+                "status": str(AGVState.READY),
+                "x": float(ind),
+                "y": float(ind),
+                "theta": 0.0,
+            }
+            for ind, agv in enumerate(agvs)
+        ]
+
+        response = self.client.post(f"{self.base_url}update_state/batch/", json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.get_json()
+        self.assertEqual([update["id"] for update in response_data], [agv.id for agv in agvs])
+        for update in response_data:
+            self.assertTrue(update["update_successful"])
+            self.assertIsNone(update["command"])
+        self.assertEqual([agv.x for agv in agvs], [0.0, 1.0, 2.0])
+
+    def test_batch_update_state_validation(self):
+        agv = create_agv(status=AGVState.READY)
+        data = {
+            "id": agv.id,
+            "status": str(AGVState.READY),
+            "x": agv.x,
+            "y": agv.y,
+            "theta": agv.theta,
+        }
+
+        response = self.client.post(f"{self.base_url}update_state/batch/", json=data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # errors are reported per update, keyed by the position of the update in the batch
+        response = self.client.post(
+            f"{self.base_url}update_state/batch/", json=[data, {**data, "id": -1}]
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response_data = response.get_json()
+        self.assertEqual(
+            response_data["1"]["_schema"][0], "AGV with provided ROS_DOMAIN_ID is not registered!"
+        )
+
+        response = self.client.post(f"{self.base_url}update_state/batch/", json=[data, data])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sequenced_update_state(self):
+        agv = create_agv(status=AGVState.READY)
+        command = create_command(agv_id=agv.id, type=CommandTypes.STOP_AGV)
+        data = {"id": agv.id, "status": str(AGVState.READY), "x": 1.0, "y": 1.0, "theta": 0.0}
+        url = f"{self.base_url}update_state/"
+
+        response = self.client.post(url, json={**data, "seq": 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["command"]["id"], command.id)
+
+        # a retry is answered with the original response, the STOP command is not lost with it
+        with patch("app.agv_request_handlers.views.AGVUpdateController") as mock:
+            response = self.client.post(url, json={**data, "seq": 5})
+            mock.update_agv.assert_not_called()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["command"]["id"], command.id)
+
+        response = self.client.post(url, json={**data, "status": str(AGVState.STOPPED), "seq": 6})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # an update delivered late does not rewind the AGV
+        response = self.client.post(url, json={**data, "x": 2.0, "seq": 4})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(response.get_json()["update_successful"])
+        self.assertEqual(agv.x, 1.0)
+
+        # unnumbered updates are always applied
+        response = self.client.post(url, json={**data, "status": str(AGVState.STOPPED), "x": 3.0})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(agv.x, 3.0)
+
+        response = self.client.post(url, json={**data, "id": create_agv().id, "seq": -1})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sequenced_update_state_after_restart(self):
+        agv = create_agv(status=AGVState.READY)
+        data = {"id": agv.id, "status": str(AGVState.READY), "x": 1.0, "y": 1.0, "theta": 0.0}
+        url = f"{self.base_url}update_state/"
+        response = self.client.post(url, json={**data, "seq": 10})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # a rebooted AGV numbers its updates from 0 again, within a newer epoch
+        response = self.client.post(url, json={**data, "x": 2.0, "seq": 0, "epoch": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(agv.x, 2.0)
+
+        # the updates of the previous epoch are stale whatever their seq
+        response = self.client.post(url, json={**data, "x": 3.0, "seq": 11})
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(agv.x, 2.0)
+
+    def test_failed_sequenced_update_can_be_retried(self):
+        agv = create_agv(status=AGVState.READY)
+        data = {"id": agv.id, "status": str(AGVState.READY), "x": 1.0, "y": 1.0, "theta": 0.0}
+        url = f"{self.base_url}update_state/"
+        response = self.client.post(url, json={**data, "seq": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with patch("app.agv_request_handlers.views.AGVUpdateController") as mock:
+            mock.update_agv.side_effect = RuntimeError("database unavailable")
+            response = self.client.post(url, json={**data, "x": 2.0, "seq": 2})
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # the failed update was never applied, its retry is applied rather than rejected as stale
+        response = self.client.post(url, json={**data, "x": 2.0, "seq": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(agv.x, 2.0)
+        self.assertEqual(update_sequences.latest(agv.id), (0, 2))
+
+    def test_sequenced_batch_update_state(self):
+        agvs = [create_agv(status=AGVState.READY) for _ in range(2)]
+        data = [
+            {
+                "id": agv.id,
+                "status": str(AGVState.READY),
+                "x": 1.0,
+                "y": 1.0,
+                "theta": 0.0,
+                "seq": 1,
+            }
+            for agv in agvs
+        ]
+        url = f"{self.base_url}update_state/batch/"
+        response = self.client.post(url, json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # the first AGV's update is a retry, the second AGV's a newer one
+        data[1].update(x=2.0, seq=2)
+        response = self.client.post(url, json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [update["update_successful"] for update in response.get_json()], [True, True]
+        )
+        self.assertEqual([agv.x for agv in agvs], [1.0, 2.0])
+
+        data[1].update(x=3.0, seq=1)
+        response = self.client.post(url, json=data)
+        self.assertEqual(
+            [update["update_successful"] for update in response.get_json()], [True, False]
+        )
+        self.assertEqual(agvs[1].x, 2.0)
+
+    def test_wait_for_command(self):
+        agv = create_agv(status=AGVState.READY)
+
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=0")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertIsNone(response.get_json()["command"])
+
+        command = create_command(agv_id=agv.id, type=CommandTypes.STOP_AGV)
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=0")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["command"]["id"], command.id)
+        self.assertEqual(agv.status, AGVState.STOPPED)
+
+    def test_wait_for_command_wakes_on_queued_command(self):
+        # the command is only found through the queues
+        self.app.config["COMMAND_QUEUE_SYNC_INTERVAL"] = None
+        agv = create_agv(status=AGVState.STOPPED)
+        command = Command(agv_id=agv.id, type=CommandTypes.START_AGV).save()
+        # the command is queued from another thread while the request waits, as CommandCreateView would
+        queued_command = SimpleNamespace(
+            id=command.id, agv_id=agv.id, task_id=None, type=CommandTypes.START_AGV
+        )
+        threading.Timer(0.1, command_queues.push, [queued_command]).start()
+
+        start = time.monotonic()
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=10")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["command"]["type"], str(CommandTypes.START_AGV))
+        self.assertEqual(agv.status, AGVState.READY)
+
+    def test_wait_for_command_finds_commands_issued_elsewhere(self):
+        self.app.config["COMMAND_QUEUE_SYNC_INTERVAL"] = 0.2
+        agv = create_agv(status=AGVState.READY)
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=0")
+        self.assertIsNone(response.get_json()["command"])
+
+        # mimic another server process (or a database tool) issuing the command, it is never queued here
+        db.session.execute(
+            text("INSERT INTO command (agv_id, type, processed) VALUES (:agv_id, 'STOP_AGV', 0)"),
+            {"agv_id": agv.id},
+        )
+        db.session.commit()
+        self.assertIsNone(command_queues.peek(agv))
+
+        start = time.monotonic()
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=10")
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["command"]["type"], str(CommandTypes.STOP_AGV))
+        self.assertEqual(agv.status, AGVState.STOPPED)
+
+    def test_wait_for_command_validation(self):
+        response = self.client.get(f"{self.base_url}wait_for_command/?id=-1&timeout=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        agv = create_agv()
+        response = self.client.get(f"{self.base_url}wait_for_command/?id={agv.id}&timeout=-1")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def setUp(self):
         db.create_all()
+        command_queues.clear()
+        update_sequences.clear()
 
     def tearDown(self):
         db.session.remove()
@@ -0,0 +1,101 @@
+from app.agv_request_handlers.controllers import AGVUpdateController
+from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.agvs.state_store import agv_state_store
+from app.app import create_app
+from app.config import ConfigType
+from app.database import db
+from app.tests.utils import create_agv
+from flask_api import status
+from flask_testing import TestCase
+from sqlalchemy import text
+
+
+class TestAGVStateStore(TestCase):
+    def create_app(self):
+        app = create_app(ConfigType.TESTING)
+        app.config["AGV_STATE_DURABILITY_WINDOW"] = 60
+        return app
+
+    def setUp(self):
+        db.create_all()
+        agv_state_store.clear()
+
+    def _stored_pose(self, agv_id):
+        return tuple(
+            db.session.execute(
+                text("SELECT x, y, theta FROM agv WHERE id = :id"), {"id": agv_id}
+            ).one()
+        )
+
+    def _send_update(self, agv_id, agv_status, x):
+        data = {"id": agv_id, "status": agv_status, "x": x, "y": 1.0, "theta": 0.5}
+        result = AGVUpdateController.update_agv(data)
+        # committed, as the request would be
+        db.session.commit()
+        return result
+
+    def test_pose_updates_stay_in_memory(self):
+        agv = create_agv(status=AGVState.READY, x=0.0, y=0.0)
+        self.assertEqual(self._send_update(agv.id, AGVState.READY, 2.0), (True, None, None))
+
+        self.assertIn(agv.id, agv_state_store)
+        self.assertEqual(self._stored_pose(agv.id), (0.0, 0.0, 0.0))
+
+        # readers loading the AGV from the database see the pending pose
+        db.session.expire_all()
+        agv = AGV.query.filter_by(id=agv.id).first()
+        self.assertEqual((agv.x, agv.y, agv.theta), (2.0, 1.0, 0.5))
+        response = self.client.get(f"agvs/{agv.id}/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["x"], 2.0)
+
+    def test_status_transition_writes_pending_poses(self):
+        first_agv = create_agv(status=AGVState.READY)
+        second_agv = create_agv(status=AGVState.READY)
+        self._send_update(first_agv.id, AGVState.READY, 2.0)
+        self._send_update(second_agv.id, AGVState.STOPPED, 3.0)
+
+        self.assertNotIn(first_agv.id, agv_state_store)
+        self.assertEqual(self._stored_pose(first_agv.id), (2.0, 1.0, 0.5))
+        self.assertEqual(self._stored_pose(second_agv.id), (3.0, 1.0, 0.5))
+        self.assertEqual(AGV.query.filter_by(id=second_agv.id).first().status, AGVState.STOPPED)
+
+    def test_pending_poses_written_after_durability_window(self):
+        agv = create_agv(status=AGVState.READY)
+        self._send_update(agv.id, AGVState.READY, 2.0)
+        self.assertIn(agv.id, agv_state_store)
+
+        self.app.config["AGV_STATE_DURABILITY_WINDOW"] = 1e-9
+        self._send_update(agv.id, AGVState.READY, 4.0)
+        self.assertNotIn(agv.id, agv_state_store)
+        self.assertEqual(self._stored_pose(agv.id), (4.0, 1.0, 0.5))
+
+    def test_pending_poses_flushed_without_further_updates(self):
+        agv = create_agv(status=AGVState.READY, x=0.0, y=0.0)
+        db.session.commit()
+        data = {"id": agv.id, "status": str(AGVState.READY), "x": 2.0, "y": 1.0, "theta": 0.5}
+        response = self.client.post("agv_request_handlers/update_state/", json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._stored_pose(agv.id), (0.0, 0.0, 0.0))
+        self.assertEqual(self.client.get(f"agvs/{agv.id}/").get_json()["x"], 2.0)
+
+        # poses written by a transaction that is rolled back stay pending
+        agv_state_store.write_pending()
+        db.session.rollback()
+        self.assertIn(agv.id, agv_state_store)
+        self.assertEqual(self._stored_pose(agv.id), (0.0, 0.0, 0.0))
+
+        # the flusher only writes the poses once they are due
+        agv_state_store.flush(self.app, due_only=True)
+        self.assertIn(agv.id, agv_state_store)
+        self.app.config["AGV_STATE_DURABILITY_WINDOW"] = 1e-9
+        agv_state_store.flush(self.app, due_only=True)
+        self.assertNotIn(agv.id, agv_state_store)
+        self.assertEqual(self._stored_pose(agv.id), (2.0, 1.0, 0.5))
+        self.assertEqual(self.client.get(f"agvs/{agv.id}/").get_json()["x"], 2.0)
+
+    def tearDown(self):
+        agv_state_store.clear()
+        db.session.remove()
+        db.drop_all()
@@ -1,13 +1,26 @@
+import time
 from unittest.mock import patch
 
-from app.agv_request_handlers.controllers import AGVUpdateController
+from app.agv_request_handlers.controllers import (
+    AGVUpdateController,
+    CommandProcessingController,
+    TaskAssignmentController,
+)
 from app.agvs.constants import AGVState
 from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.queues import command_queues
 from app.config import ConfigType
 from app.database import db
+from app.task_scheduler.constants import TaskSchedulers
+from app.task_scheduler.scheduler import MinCostMatchingTaskScheduler
 from app.tasks.constants import TaskStatus
+from app.tasks.index import task_index
 from app.tasks.models import Waypoint
-from app.tests.utils import create_agv, create_task, create_waypoint
+from app.tasks.packed_route import pack_waypoints
+from app.tasks.reservations import task_reservations
+from app.tasks.serializers import TaskDetailSerializer
+from app.tests.utils import create_agv, create_command, create_task, create_waypoint
 from flask_testing import TestCase
 
 
@@ -17,6 +30,8 @@ class TestAGVUpdateController(TestCase):
 
     def setUp(self):
         db.create_all()
+        task_reservations.clear()
+        command_queues.clear()
 
     def test_update_agv_ready(self):
         agv = create_agv(status=AGVState.READY)
@@ -68,6 +83,39 @@ class TestAGVUpdateController(TestCase):
         waypoint = Waypoint.query.filter_by(task_id=task.id, order=2).first()
         self.assertEqual(waypoint.visited, False)
 
+    def test_task_progress_cursor(self):
+        agv = create_agv(status=AGVState.BUSY)
+        waypoints = [create_waypoint(order=order) for order in [2, 4, 6]]
+        task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id, waypoints=waypoints)
+        agv.update(current_task_id=task.id)
+        self.assertEqual(task.get_next_unvisited_waypoint.order, 2)
+
+        data = {"id": agv.id, "status": AGVState.BUSY, "x": 1.0, "y": 1.0, "theta": 0.0}
+        AGVUpdateController.update_agv(
+            {**data, "current_task_id": task.id, "current_waypoint_order": 5}
+        )
+        self.assertEqual(task.next_waypoint_order, 5)
+        self.assertEqual(task.get_next_unvisited_waypoint.order, 6)
+        # updates delivered late never move the progress backwards
+        AGVUpdateController.update_agv(
+            {**data, "current_task_id": task.id, "current_waypoint_order": 3}
+        )
+        self.assertEqual(task.next_waypoint_order, 5)
+        self.assertEqual(
+            [waypoint["visited"] for waypoint in TaskDetailSerializer().dump(task)["waypoints"]],
+            [True, True, False],
+        )
+
+        # a BUSY update without a current waypoint visits every waypoint
+        AGVUpdateController.update_agv({**data, "current_task_id": task.id})
+        self.assertEqual(task.next_waypoint_order, 7)
+        self.assertIsNone(task.get_next_unvisited_waypoint)
+
+        create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
+        AGVUpdateController.update_agv(data)
+        self.assertIsNone(task.next_waypoint_order)
+        self.assertFalse(any(waypoint.visited for waypoint in task.waypoints))
+
     def test_update_agv_done(self):
         agv = create_agv(status=AGVState.DONE)
         waypoints = [create_waypoint(order=order) for order in [1, 2]]
@@ -118,6 +166,224 @@ class TestAGVUpdateController(TestCase):
         for attr in agv_attrs:
             self.assertEqual(data.get(attr, None), getattr(agv, attr))
 
+    def test_update_agvs(self):
+        ready_agv, busy_agv, done_agv, stopped_agv = [
+            create_agv(status=agv_status)
+            for agv_status in [AGVState.READY, AGVState.BUSY, AGVState.BUSY, AGVState.READY]
+        ]
+        busy_task = create_task(
+            status=TaskStatus.IN_PROGRESS,
+            agv_id=busy_agv.id,
+            waypoints=[create_waypoint(order=order) for order in [1, 2, 3]],
+        )
+        done_task = create_task(
+            status=TaskStatus.IN_PROGRESS,
+            agv_id=done_agv.id,
+            waypoints=[create_waypoint(order=order) for order in [1, 2]],
+        )
+        busy_agv.update(current_task_id=busy_task.id)
+        done_agv.update(current_task_id=done_task.id)
+        create_command(agv_id=stopped_agv.id, type=CommandTypes.STOP_AGV)
+
+        updates = [
+            {"id": ready_agv.id, "status": AGVState.READY, "x": 0.5, "y": 1.5, "theta": 0.5},
+            {
+                "id": busy_agv.id,
+                "status": AGVState.BUSY,
+                "x": 1.0,
+                "y": 2.0,
+                "theta": 1.0,
+                "current_task_id": busy_task.id,
+                "current_waypoint_order": 2,
+            },
+            {
+                "id": done_agv.id,
+                "status": AGVState.DONE,
+                "x": 1.5,
+                "y": 2.5,
+                "theta": 1.5,
+                "current_task_id": done_task.id,
+            },
+            {"id": stopped_agv.id, "status": AGVState.READY, "x": 2.0, "y": 3.0, "theta": 2.0},
+        ]
+        results = AGVUpdateController.update_agvs(updates)
+
+        self.assertEqual(results[:3], [(True, None, None)] * 3)
+        # the AGV with a pending command receives the command instead of having its update applied
+        self.assertEqual(results[3][2]["type"], str(CommandTypes.STOP_AGV))
+        self.assertEqual(stopped_agv.status, AGVState.STOPPED)
+
+        for agv, data in zip([ready_agv, busy_agv, done_agv], updates):
+            for attr in ["status", "x", "y", "theta"]:
+                self.assertEqual(data[attr], getattr(agv, attr))
+
+        visited = {
+            waypoint.order: waypoint.visited
+            for waypoint in Waypoint.query.filter_by(task_id=busy_task.id)
+        }
+        self.assertEqual(visited, {1: True, 2: False, 3: False})
+
+        self.assertEqual(done_task.status, TaskStatus.COMPLETE)
+        self.assertTrue(all(waypoint.visited for waypoint in done_task.waypoints))
+        self.assertIsNone(done_agv.current_task_id)
+        self.assertNotIn(done_task.id, task_index)
+
+    def test_update_agvs_reserves_next_task(self):
+        agv, task = self._create_reservation_scenario()
+        data = {
+            "id": agv.id,
+            "status": AGVState.BUSY,
+            "x": 2,
+            "y": 0,
+            "theta": 0,
+            "current_task_id": task.id,
+            "current_waypoint_order": 3,
+        }
+        AGVUpdateController.update_agvs([data])
+        self.assertIn(agv.id, task_reservations)
+        self.assertNotIn(self.task_near_final_waypoint.id, task_index)
+
+    def test_packed_route_reserves_next_task(self):
+        agv, task = self._create_reservation_scenario(packed=True)
+        self.assertEqual(Waypoint.query.filter_by(task_id=task.id).count(), 0)
+
+        self._send_busy_update(agv, task, waypoint_order=2)
+        self.assertNotIn(agv.id, task_reservations)
+        self.assertEqual(task.get_next_unvisited_waypoint.x, 3)
+
+        data = {
+            "id": agv.id,
+            "status": AGVState.BUSY,
+            "x": 2,
+            "y": 0,
+            "theta": 0,
+            "current_task_id": task.id,
+            "current_waypoint_order": 3,
+        }
+        AGVUpdateController.update_agvs([data])
+        self.assertIn(agv.id, task_reservations)
+        self.assertNotIn(self.task_near_final_waypoint.id, task_index)
+
+    def _create_reservation_scenario(self, packed=False):
+        agv = create_agv(status=AGVState.BUSY, x=0, y=0)
+        route = [{"x": x, "y": 0, "order": order} for order, x in enumerate([1, 2, 3, 10])]
+        if packed:
+            task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id)
+            task.route = pack_waypoints(route)
+            task.compute_path_metrics()
+        else:
+            waypoints = [create_waypoint(**waypoint) for waypoint in route]
+            task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id, waypoints=waypoints)
+        agv.update(current_task_id=task.id)
+        # the next task is scored from the current task's final waypoint, not the AGV's position
+        self.task_near_agv = create_task(waypoints=[create_waypoint(x=0, y=0)])
+        self.task_near_final_waypoint = create_task(waypoints=[create_waypoint(x=11, y=0)])
+        return agv, task
+
+    def _send_busy_update(self, agv, task, waypoint_order):
+        data = {
+            "id": agv.id,
+            "status": AGVState.BUSY,
+            "x": 2,
+            "y": 0,
+            "theta": 0,
+            "current_task_id": task.id,
+            "current_waypoint_order": waypoint_order,
+        }
+        with patch("app.agv_request_handlers.controllers.CommandProcessingController") as mock:
+            mock.get_next_command.return_value = None
+            AGVUpdateController.update_agv(data)
+
+    def test_update_agv_busy_reserves_next_task(self):
+        agv, task = self._create_reservation_scenario()
+
+        # half of the route is not far enough along to reserve a task
+        self._send_busy_update(agv, task, waypoint_order=2)
+        self.assertNotIn(agv.id, task_reservations)
+
+        self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertIn(agv.id, task_reservations)
+        self.assertNotIn(self.task_near_final_waypoint.id, task_index)
+
+        agv.update(current_task_id=None, status=AGVState.READY)
+        status_code, task_data = TaskAssignmentController.get_task_for_agv(
+            {"id": agv.id, "status": AGVState.READY}
+        )
+        self.assertEqual(status_code, 200)
+        self.assertEqual(task_data["id"], self.task_near_final_waypoint.id)
+        self.assertNotIn(agv.id, task_reservations)
+
+    def test_stopping_agv_releases_reserved_task(self):
+        agv, task = self._create_reservation_scenario()
+        self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertIn(agv.id, task_reservations)
+
+        CommandProcessingController.process_stop_agv(agv)
+        self.assertNotIn(agv.id, task_reservations)
+        self.assertIn(self.task_near_final_waypoint.id, task_index)
+
+    def test_expired_reservation_is_released(self):
+        agv, task = self._create_reservation_scenario()
+        self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertIn(agv.id, task_reservations)
+
+        # progress on the current task keeps the reservation alive
+        later = time.monotonic() + self.app.config["TASK_RESERVATION_TTL"] / 2
+        with patch("app.tasks.reservations.time.monotonic", return_value=later):
+            self._send_busy_update(agv, task, waypoint_order=3)
+        much_later = later + self.app.config["TASK_RESERVATION_TTL"] - 1
+        with patch("app.tasks.reservations.time.monotonic", return_value=much_later):
+            self.assertEqual(task_reservations.expired(), [])
+
+        # an AGV that is DONE without ever requesting its next task loses the reservation
+        data = {
+            "id": agv.id,
+            "status": AGVState.DONE,
+            "x": 10,
+            "y": 0,
+            "theta": 0,
+            "current_task_id": task.id,
+        }
+        with patch("app.tasks.reservations.time.monotonic", return_value=much_later + 2):
+            AGVUpdateController.update_agvs([data])
+        self.assertNotIn(agv.id, task_reservations)
+        self.assertIn(self.task_near_final_waypoint.id, task_index)
+
+    def test_reservation_retries_are_throttled(self):
+        agv, task = self._create_reservation_scenario()
+        task_index.clear()
+        self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertNotIn(agv.id, task_reservations)
+
+        # the scheduler is not run again until the retry interval passes
+        task_index.sync(self.task_near_final_waypoint)
+        with patch(
+            "app.agv_request_handlers.controllers.TaskAssignmentController.retrieve_relavent_tasks"
+        ) as mock:
+            self._send_busy_update(agv, task, waypoint_order=3)
+            mock.assert_not_called()
+        self.assertNotIn(agv.id, task_reservations)
+
+        later = time.monotonic() + self.app.config["TASK_RESERVATION_RETRY_INTERVAL"]
+        with patch("app.tasks.reservations.time.monotonic", return_value=later):
+            self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertIn(agv.id, task_reservations)
+
+    def test_projected_assignment_leaves_fleet_assignments_cached(self):
+        self.app.config["TASK_SCHEDULER"] = TaskSchedulers.MIN_COST_MATCHING
+        MinCostMatchingTaskScheduler.clear_assignment_cache()
+        agv, task = self._create_reservation_scenario()
+        ready_agv = create_agv(status=AGVState.READY, x=0, y=0)
+        other_ready_agv = create_agv(status=AGVState.READY, x=0, y=11)
+        TaskAssignmentController.get_task_for_agv({"id": ready_agv.id, "status": AGVState.READY})
+        cached_assignments = dict(MinCostMatchingTaskScheduler._assignment_cache)
+        self.assertEqual(list(cached_assignments), [other_ready_agv.id])
+
+        self._send_busy_update(agv, task, waypoint_order=3)
+        self.assertIn(agv.id, task_reservations)
+        self.assertEqual(MinCostMatchingTaskScheduler._assignment_cache, cached_assignments)
+        MinCostMatchingTaskScheduler.clear_assignment_cache()
+
     def tearDown(self):
         db.session.remove()
         db.drop_all()
@@ -0,0 +1,136 @@
+import json
+import socket
+
+from app.agv_request_handlers.binary_protocol import (
+    HEADER,
+    SAMPLE,
+    MalformedMessage,
+    decode_updates,
+    encode_updates,
+)
+from app.agv_request_handlers.controllers import COMMAND_PENDING_MESSAGE
+from app.agv_request_handlers.udp_listener import start_telemetry_listener
+from app.agvs.constants import AGVState
+from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.models import Command
+from app.commands.queues import command_queues
+from app.config import ConfigType
+from app.database import db
+from app.tasks.constants import TaskStatus
+from app.tasks.models import Waypoint
+from app.tests.utils import create_agv, create_command, create_task, create_waypoint
+from flask_api import status
+from flask_testing import TestCase
+
+
+class TestBinaryTelemetry(TestCase):
+    url = "agv_request_handlers/update_state/binary/"
+
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        command_queues.clear()
+
+    def test_encode_decode_updates(self):
+        updates = [
+            {"id": 1, "status": AGVState.READY, "x": 1.5, "y": 2.5, "theta": -0.5},
+            {
+                "id": 2,
+                "status": AGVState.BUSY,
+                "x": 3.0,
+                "y": 4.0,
+                "theta": 0.25,
+                "current_task_id": 7,
+                "current_waypoint_order": 3,
+            },
+        ]
+        message = encode_updates(updates)
+        self.assertEqual(len(message), HEADER.size + 2 * SAMPLE.size)
+        self.assertEqual(decode_updates(message), updates)
+
+        for malformed_message in [message[:-1], b"XX" + message[2:], message[:2]]:
+            with self.assertRaises(MalformedMessage):
+                decode_updates(malformed_message)
+
+    def test_binary_update_state(self):
+        agv = create_agv(status=AGVState.BUSY)
+        waypoints = [create_waypoint(order=order) for order in [1, 2, 3]]
+        task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id, waypoints=waypoints)
+        agv.update(current_task_id=task.id)
+        stopped_agv = create_agv(status=AGVState.READY)
+        stop_command = create_command(agv_id=stopped_agv.id, type=CommandTypes.STOP_AGV)
+
+        # samples of the same AGV are coalesced to the latest one
+        busy_update = {
+            "id": agv.id,
+            "status": AGVState.BUSY,
+            "x": 1.0,
+            "y": 1.0,
+            "theta": 0.0,
+            "current_task_id": task.id,
+        }
+        message = encode_updates(
+            [
+                {**busy_update, "current_waypoint_order": 2},
+                {"id": stopped_agv.id, "status": AGVState.READY, "x": 2.0, "y": 2.0, "theta": 0.0},
+                {**busy_update, "x": 2.0, "current_waypoint_order": 3},
+            ]
+        )
+        response = self.client.post(self.url, data=message, content_type="application/octet-stream")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response_data = response.get_json()
+        self.assertEqual([update["id"] for update in response_data], [agv.id, stopped_agv.id])
+        self.assertIsNone(response_data[0]["command"])
+        self.assertEqual(response_data[1]["command"]["id"], stop_command.id)
+
+        self.assertEqual(agv.x, 2.0)
+        visited = {
+            waypoint.order: waypoint.visited
+            for waypoint in Waypoint.query.filter_by(task_id=task.id)
+        }
+        self.assertEqual(visited, {1: True, 2: True, 3: False})
+
+    def test_binary_update_state_validation(self):
+        agv = create_agv()
+        update = {"id": agv.id, "status": AGVState.READY, "x": 1.0, "y": 1.0, "theta": 0.0}
+
+        response = self.client.post(self.url, data=encode_updates([update])[:-1])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        message = encode_updates([update, {**update, "id": agv.id + 1}, {**update, "x": 1e6}])
+        response = self.client.post(self.url, data=message)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(sorted(response.get_json()), ["1", "2"])
+
+    def test_udp_telemetry_listener(self):
+        agv = create_agv(status=AGVState.READY)
+        command = create_command(agv_id=agv.id, type=CommandTypes.STOP_AGV)
+        server = start_telemetry_listener(self.app, "127.0.0.1", 0)
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(5)
+                update = {"id": agv.id, "status": AGVState.READY, "x": 1.0, "y": 1.0, "theta": 0.0}
+                json_update = {**update, "status": str(AGVState.READY)}
+                sock.sendto(encode_updates([update]), server.server_address)
+                reply = json.loads(sock.recv(65536))
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(
+            [(response["id"], response["command"]) for response in reply], [(agv.id, None)]
+        )
+        self.assertEqual(reply[0]["debug_message"], COMMAND_PENDING_MESSAGE)
+
+        # the command is left for the AGV to request over HTTP, a lost reply does not lose it
+        db.session.expire_all()
+        self.assertFalse(Command.query.filter_by(id=command.id).first().processed)
+        self.assertEqual((agv.x, agv.status), (1.0, AGVState.READY))
+        response = self.client.post("agv_request_handlers/update_state/", json=json_update)
+        self.assertEqual(response.get_json()["command"]["id"], command.id)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
@@ -1,6 +1,8 @@
 from app.agvs.constants import AGVState
 from app.app import create_app
 from app.commands.constants import CommandTypes
+from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.config import ConfigType
 from app.database import db
 from app.tasks.constants import TaskStatus
@@ -17,6 +19,7 @@ class TestCommandCrud(TestCase):
 
     def setUp(self):
         db.create_all()
+        command_queues.clear()
 
     def test_create_command_successful(self):
         # Test the sucessful creation of AGV Commands
@@ -244,6 +247,36 @@ class TestCommandCrud(TestCase):
         response_data = response.get_json()
         self.assertEqual(response_data, [])
 
+    def test_delete_filtered_commands(self):
+        self.app.config["BULK_DELETE_CHUNK_SIZE"] = 2
+        agv = create_agv()
+        [create_command(agv_id=agv.id, processed=True) for i in range(3)]
+        create_command(agv_id=agv.id)
+        db.session.commit()
+
+        response = self.client.delete(
+            f"{self.base_url}commands/", query_string={"processed": "maybe"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.delete(
+            f"{self.base_url}commands/", query_string={"processed": "true"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.get_json(), {"message": "Commands successfully deleted", "num_deleted": 3}
+        )
+        self.assertEqual(Command.query.count(), 1)
+        self.assertTrue(command_queues.has_pending(agv))
+
+        filter_params = {"agv_id": agv.id, "type": "STOP_AGV", "processed": "false"}
+        response = self.client.delete(f"{self.base_url}commands/", query_string=filter_params)
+        self.assertEqual(response.get_json()["num_deleted"], 1)
+        self.assertFalse(command_queues.has_pending(agv))
+        response = self.client.delete(f"{self.base_url}commands/", query_string=filter_params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.get_json()["message"], "No Commands match the filters")
+
     def test_retrieve_single_command(self):
         # Test that our request is rejected for requesting a command that doesn't exist
         command_params = {"type": CommandTypes.STOP_AGV, "agv_id": 1}
@@ -3,6 +3,7 @@ from app.agvs.constants import AGVState
 from app.app import create_app
 from app.commands.constants import CommandTypes
 from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.config import ConfigType
 from app.database import db
 from app.tasks.constants import TaskStatus
@@ -82,49 +83,61 @@ class TestCommandProcessingController(TestCase):
                 expected_command_value = expected_command.get(key, None)
                 self.assertEqual(command_value, expected_command_value)
 
-    def test_remove_invalid_relavent_commands(self):
-        # this is done in order to make the originally relavent commands for cancel agv and task irrelavent
-        task = create_task(status=TaskStatus.INCOMPLETE)
-        agv = create_agv(current_task_id=task.id, status=AGVState.DONE)
-        self._create_set_of_commands(agv, task)
-
-        CommandProcessingController._remove_invalid_relavent_commands(agv)
-        commands = CommandProcessingController._retrieve_all_relavent_commands_query(agv)
-
-        # all start and stop commands should be removed
-        self.assertEqual(commands, [])
-
-    def test_retrieve_stop_agv_command(self):
+    def test_retrieve_relavent_commands_of_agv_without_task(self):
         agv = create_agv()
+        other_agv = create_agv(status=AGVState.BUSY)
+        create_command(agv_id=other_agv.id, type=CommandTypes.CANCEL_AGV)
 
-        stop_agv_command = CommandProcessingController._retrieve_stop_agv_command(agv)
-        self.assertEqual(stop_agv_command, None)
-
-        stop_command = {
-            "agv_id": agv.id,
-            "type": CommandTypes.STOP_AGV,
-        }
-        early_stop_command = create_command(**stop_command)
-        late_stop_command = create_command(**stop_command)
-
-        stop_agv_command = CommandProcessingController._retrieve_stop_agv_command(agv)
-        self.assertEqual(stop_agv_command.id, late_stop_command.id)
+        relavent_commands = CommandProcessingController._retrieve_all_relavent_commands_query(agv)
+        self.assertEqual(relavent_commands, [])
 
-    def test_retrieve_start_agv_command(self):
-        agv = create_agv()
+    def test_get_next_command_drops_invalid_commands(self):
+        # this is done in order to make the originally relavent commands for cancel agv and task irrelavent
+        task = create_task(status=TaskStatus.INCOMPLETE)
+        agv = create_agv(current_task_id=task.id, status=AGVState.DONE)
+        agv_cancel_command = create_command(agv_id=agv.id, type=CommandTypes.CANCEL_AGV)
+        task_cancel_command = create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
 
-        start_agv_command = CommandProcessingController._retrieve_start_agv_command(agv)
-        self.assertEqual(start_agv_command, None)
+        self.assertIsNone(CommandProcessingController.get_next_command(agv))
+        for command in [agv_cancel_command, task_cancel_command]:
+            self.assertTrue(Command.query.filter_by(id=command.id).first().processed)
+            self.assertNotIn(command.id, command_queues)
+        self.assertFalse(command_queues.has_pending(agv))
 
-        start_command = {
-            "agv_id": agv.id,
-            "type": CommandTypes.START_AGV,
-        }
-        early_start_command = create_command(**start_command)
-        late_start_command = create_command(**start_command)
+    def test_command_queue_precedence(self):
+        task = create_task(status=TaskStatus.IN_PROGRESS)
+        agv = create_agv(current_task_id=task.id, status=AGVState.BUSY)
+        self.assertFalse(command_queues.has_pending(agv))
+        self.assertIsNone(command_queues.peek(agv))
+
+        # STOP_AGV > START_AGV > remaining commands, in creation order within a precedence
+        task_cancel_command = create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
+        agv_cancel_command = create_command(agv_id=agv.id, type=CommandTypes.CANCEL_AGV)
+        early_start_command = create_command(agv_id=agv.id, type=CommandTypes.START_AGV)
+        late_start_command = create_command(agv_id=agv.id, type=CommandTypes.START_AGV)
+        early_stop_command = create_command(agv_id=agv.id, type=CommandTypes.STOP_AGV)
+        late_stop_command = create_command(agv_id=agv.id, type=CommandTypes.STOP_AGV)
+        create_command(agv_id=-1, type=CommandTypes.STOP_AGV)
+
+        self.assertTrue(command_queues.has_pending(agv))
+        expected_order = [
+            early_stop_command,
+            late_stop_command,
+            early_start_command,
+            late_start_command,
+            task_cancel_command,
+            agv_cancel_command,
+        ]
+        for command in expected_order:
+            self.assertEqual(command_queues.peek(agv), command.id)
+            command_queues.remove(command.id)
+        self.assertFalse(command_queues.has_pending(agv))
 
-        start_agv_command = CommandProcessingController._retrieve_start_agv_command(agv)
-        self.assertEqual(start_agv_command.id, late_start_command.id)
+        # only the AGV's own commands are discarded, not those of its task
+        create_command(agv_id=agv.id, type=CommandTypes.CANCEL_AGV)
+        task_cancel_command = create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
+        command_queues.discard_agv(agv.id)
+        self.assertEqual(command_queues.peek(agv), task_cancel_command.id)
 
     def test_get_next_command(self):
         task = create_task(status=TaskStatus.IN_PROGRESS)
@@ -163,6 +176,7 @@ class TestCommandProcessingController(TestCase):
 
     def setUp(self):
         db.create_all()
+        command_queues.clear()
 
     def tearDown(self):
         db.session.remove()
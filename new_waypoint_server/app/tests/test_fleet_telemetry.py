@@ -0,0 +1,79 @@
+import json
+
+from app.agv_request_handlers.controllers import AGVUpdateController
+from app.agvs.constants import AGVState
+from app.agvs.telemetry import fleet_telemetry
+from app.app import create_app
+from app.config import ConfigType
+from app.database import db
+from app.tests.utils import create_agv
+from flask_api import status
+from flask_testing import TestCase
+
+
+def parse_event(chunk):
+    event, data = chunk.decode().strip().split("\n")
+    return event[len("event: ") :], json.loads(data[len("data: ") :])
+
+
+class TestFleetTelemetry(TestCase):
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        fleet_telemetry.clear()
+
+    def _send_update(self, agv, x):
+        data = {"id": agv.id, "status": AGVState.READY, "x": x, "y": 1.0, "theta": 0.0}
+        AGVUpdateController.update_agv(data)
+
+    def test_changes_are_coalesced(self):
+        first_agv, second_agv = create_agv(), create_agv()
+        version, states = fleet_telemetry.snapshot()
+        self.assertEqual(states, [])
+
+        for x in [1.0, 2.0, 3.0]:
+            self._send_update(first_agv, x)
+        self._send_update(second_agv, 4.0)
+
+        version, changes = fleet_telemetry.wait_for_changes(version, timeout=0)
+        self.assertEqual(
+            sorted((change["id"], change["x"]) for change in changes),
+            [(first_agv.id, 3.0), (second_agv.id, 4.0)],
+        )
+        self.assertEqual(fleet_telemetry.wait_for_changes(version, timeout=0), (version, []))
+
+        fleet_telemetry.remove(first_agv.id)
+        _, changes = fleet_telemetry.wait_for_changes(version, timeout=0)
+        self.assertEqual(changes, [{"id": first_agv.id, "removed": True}])
+        self.assertEqual([state["id"] for state in fleet_telemetry.snapshot()[1]], [second_agv.id])
+
+    def test_telemetry_stream(self):
+        agv = create_agv()
+        self._send_update(agv, 1.0)
+
+        response = self.client.get("agvs/stream/?max_rate=100")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = iter(response.response)
+
+        event, data = parse_event(next(events))
+        self.assertEqual(event, "snapshot")
+        self.assertEqual(
+            [(state["id"], state["status"], state["x"]) for state in data], [(agv.id, "READY", 1.0)]
+        )
+
+        self._send_update(agv, 2.0)
+        event, data = parse_event(next(events))
+        self.assertEqual(event, "update")
+        self.assertEqual([(state["id"], state["x"]) for state in data], [(agv.id, 2.0)])
+        response.close()
+
+        response = self.client.get("agvs/stream/?max_rate=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def tearDown(self):
+        fleet_telemetry.clear()
+        db.session.remove()
+        db.drop_all()
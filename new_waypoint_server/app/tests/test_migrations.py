@@ -0,0 +1,50 @@
+import os
+import tempfile
+
+import sqlalchemy as sa
+from app.app import create_app
+from app.config import ConfigType
+from app.database import db
+from flask_migrate import downgrade, upgrade
+from flask_testing import TestCase
+
+HOT_PATH_INDEXES = {
+    "task": {"ix_task_status_priority", "ix_task_agv_id"},
+    "command": {"ix_command_pending_agv", "ix_command_pending_task"},
+}
+
+
+class TestMigrations(TestCase):
+    def create_app(self):
+        self.database_file = tempfile.NamedTemporaryFile(suffix=".db")
+        # the server creates the current schema on startup, before any migration runs
+        return create_app(
+            ConfigType.TESTING,
+            {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.database_file.name}"},
+        )
+
+    def _migrate(self, migration, revision="head"):
+        migration(
+            directory=os.path.join(os.path.dirname(self.app.root_path), "migrations"),
+            revision=revision,
+        )
+
+    def _indexes(self, table_name):
+        return {index["name"] for index in sa.inspect(db.engine).get_indexes(table_name)}
+
+    def test_upgrade_database_created_from_current_schema(self):
+        # the hot path migration predates dropping waypoint.visited, which its index covered
+        self._migrate(upgrade)
+        for table_name, indexes in HOT_PATH_INDEXES.items():
+            self.assertLessEqual(indexes, self._indexes(table_name))
+        self.assertNotIn("ix_waypoint_task_visited_order", self._indexes("waypoint"))
+
+        # the downgraded schema has the visited column again, upgrading indexes it before dropping it
+        self._migrate(downgrade, "c4a1d07e5b92")
+        self.assertEqual(self._indexes("task"), set())
+        self._migrate(upgrade)
+        self.assertEqual(self._indexes("task"), HOT_PATH_INDEXES["task"] | {"ix_task_updated_at"})
+
+    def tearDown(self):
+        db.session.remove()
+        self.database_file.close()
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+
+from app.agv_request_handlers.controllers import AGVUpdateController, CommandProcessingController
+from app.agvs.constants import AGVState
+from app.agvs.models import AGV
+from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.queues import command_queues
+from app.config import ConfigType
+from app.core import validators
+from app.database import db
+from app.tasks.constants import TaskStatus
+from app.tests.utils import create_agv, create_command, create_task, create_waypoint
+from flask_testing import TestCase
+from sqlalchemy import event
+
+
+class TestQueryPlans(TestCase):
+    """Checks the queries issued on the hot paths (AGV updates, command polling) use indexes"""
+
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        command_queues.clear()
+
+    @contextmanager
+    def _capture_selects(self):
+        selects = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if statement.lstrip().upper().startswith("SELECT"):
+                selects.append((statement, parameters))
+
+        event.listen(db.engine, "before_cursor_execute", capture)
+        try:
+            yield selects
+        finally:
+            event.remove(db.engine, "before_cursor_execute", capture)
+
+    def assertNoTableScans(self, selects):
+        self.assertTrue(selects)
+        connection = db.session.connection()
+        for statement, parameters in selects:
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+            # scanning a (single row) subquery is fine, scanning a table is not
+            scans = [
+                detail
+                for *_, detail in plan
+                if detail.startswith("SCAN") and detail.split()[1] in db.metadata.tables
+            ]
+            self.assertEqual(scans, [], statement)
+
+    def test_agv_update_queries(self):
+        agv = create_agv(status=AGVState.BUSY)
+        waypoints = [create_waypoint(order=order) for order in [1, 2, 3]]
+        task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id, waypoints=waypoints)
+        agv.update(current_task_id=task.id)
+        data = {
+            "id": agv.id,
+            "status": AGVState.BUSY,
+            "x": 1.0,
+            "y": 1.0,
+            "theta": 0.0,
+            "current_task_id": task.id,
+            "current_waypoint_order": 3,
+        }
+        db.session.expire_all()
+
+        with self._capture_selects() as selects:
+            AGVUpdateController.update_agv(data)
+            AGVUpdateController.update_agvs([data])
+            task.get_next_unvisited_waypoint
+        self.assertNoTableScans(selects)
+
+    def test_command_queries(self):
+        agv = create_agv(status=AGVState.STOPPED)
+        task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id)
+        agv.update(current_task_id=task.id)
+        create_command(agv_id=agv.id, type=CommandTypes.START_AGV)
+        create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
+        db.session.expire_all()
+
+        with self._capture_selects() as selects:
+            agv = AGV.query.filter_by(id=agv.id).first()
+            CommandProcessingController._retrieve_all_relavent_commands_query(agv)
+            CommandProcessingController.get_next_command(agv)
+            validators.validate_command(CommandTypes.STOP_AGV, agv.id, None)
+            validators.validate_command(CommandTypes.START_AGV, agv.id, None)
+        self.assertNoTableScans(selects)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
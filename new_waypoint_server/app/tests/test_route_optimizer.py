@@ -0,0 +1,41 @@
+import itertools
+import time
+from unittest import TestCase
+
+import numpy as np
+from app.tasks.route_optimizer import optimize_waypoint_order, path_length
+
+
+class TestRouteOptimizer(TestCase):
+    def test_optimize_waypoint_order(self):
+        rng = np.random.default_rng(0)
+        for _ in range(25):
+            coordinates = rng.uniform(0, 100, size=(6, 2))
+            route = optimize_waypoint_order(coordinates)
+            self.assertEqual(sorted(route), list(range(6)))
+            nearest_neighbour_route = optimize_waypoint_order(coordinates, time_budget=0)
+            self.assertLessEqual(
+                path_length(coordinates, route), path_length(coordinates, nearest_neighbour_route)
+            )
+
+        # points on a line are visited from one end to the other
+        coordinates = [(5, 0), (0, 0), (3, 0), (1, 0), (4, 0), (2, 0)]
+        self.assertAlmostEqual(path_length(coordinates, optimize_waypoint_order(coordinates)), 5)
+
+    def test_optimize_waypoint_order_fixed_first(self):
+        coordinates = [(2, 0), (0, 0), (3, 0), (1, 0)]
+        route = optimize_waypoint_order(coordinates, fix_first=True)
+        self.assertEqual(route[0], 0)
+        shortest = min(
+            path_length(coordinates, (0,) + permutation)
+            for permutation in itertools.permutations(range(1, 4))
+        )
+        self.assertAlmostEqual(path_length(coordinates, route), shortest)
+
+    def test_optimize_waypoint_order_time_budget(self):
+        coordinates = np.random.default_rng(0).uniform(0, 100, size=(20000, 2))
+        started = time.monotonic()
+        route = optimize_waypoint_order(coordinates, fix_first=True, time_budget=0.05)
+        self.assertLess(time.monotonic() - started, 0.5)
+        self.assertEqual(sorted(route), list(range(20000)))
+        self.assertEqual(route[0], 0)
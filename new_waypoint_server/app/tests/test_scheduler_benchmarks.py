@@ -0,0 +1,20 @@
+from app.app import create_app
+from app.config import ConfigType
+from app.task_scheduler.benchmark import run_scheduler_benchmarks
+from app.task_scheduler.scheduler import TASK_SCHEDULER_MAP
+from flask_testing import TestCase
+
+
+class TestSchedulerBenchmarks(TestCase):
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def test_scheduler_benchmarks(self):
+        results = run_scheduler_benchmarks(
+            TASK_SCHEDULER_MAP, fleet_sizes=[4], backlog_sizes=[30], num_decisions=10, seed=7
+        )
+        self.assertEqual(len(results), 2 * len(TASK_SCHEDULER_MAP))
+        for result in results:
+            self.assertEqual(result["decisions"], 10 if result["mode"] == "decision" else 4)
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertGreater(result["travel_distance"], 0)
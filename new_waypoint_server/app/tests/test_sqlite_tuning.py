@@ -0,0 +1,42 @@
+import tempfile
+
+from app.app import create_app
+from app.config import ConfigType, DeploymentConfig
+from app.database import db
+from flask_testing import TestCase
+from sqlalchemy.pool import QueuePool
+
+
+class TestSQLiteTuning(TestCase):
+    def create_app(self):
+        self.directory = tempfile.TemporaryDirectory()
+        return create_app(
+            ConfigType.DEPLOYMENT,
+            {
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.directory.name}/server.db",
+                "TESTING": True,
+            },
+        )
+
+    def test_pooled_connections_are_tuned(self):
+        engine = db.get_engine(self.app)
+        self.assertIsInstance(engine.pool, QueuePool)
+        self.assertEqual(engine.pool.size(), DeploymentConfig.SQLITE_POOL_SIZE)
+
+        with engine.connect() as connection:
+
+            def pragma(name):
+                return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+            self.assertEqual(pragma("journal_mode"), "wal")
+            # synchronous = NORMAL
+            self.assertEqual(pragma("synchronous"), 1)
+            self.assertEqual(
+                pragma("busy_timeout"), DeploymentConfig.SQLITE_PRAGMAS["busy_timeout"]
+            )
+            self.assertEqual(pragma("cache_size"), DeploymentConfig.SQLITE_PRAGMAS["cache_size"])
+
+    def tearDown(self):
+        db.session.remove()
+        db.get_engine(self.app).dispose()
+        self.directory.cleanup()
@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta
+
+from app.agv_request_handlers.benchmark import run_task_claim_benchmark
+from app.agv_request_handlers.controllers import TaskAssignmentController
+from app.agvs.constants import AGVState
+from app.app import create_app
+from app.config import ConfigType
+from app.database import db
+from app.task_scheduler.constants import NEAREST_TASK_CANDIDATES
+from app.task_scheduler.scheduler import AgingTaskSchedulerEDF
+from app.tasks.constants import TaskStatus
+from app.tasks.index import task_index
+from app.tasks.models import Task
+from app.tests.utils import create_agv, create_task, create_waypoint
+from flask_testing import TestCase
+
+
+class TestTaskClaims(TestCase):
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        task_index.clear()
+
+    def test_claim_task(self):
+        task = create_task(waypoints=[create_waypoint(x=1, y=1)])
+        self.assertTrue(TaskAssignmentController._claim_task(task))
+        self.assertEqual(task.status, TaskStatus.IN_PROGRESS)
+        db.session.commit()
+
+        # mimic another server process claiming the task after it was loaded by this one
+        claimed_task = create_task(waypoints=[create_waypoint(x=2, y=2)])
+        Task.query.filter_by(id=claimed_task.id).update(
+            {"status": TaskStatus.IN_PROGRESS}, synchronize_session=False
+        )
+        self.assertFalse(TaskAssignmentController._claim_task(claimed_task))
+        self.assertNotIn(claimed_task.id, task_index)
+
+    def test_get_task_for_agv_claims_task(self):
+        agv = create_agv(status=AGVState.READY)
+        task = create_task(waypoints=[create_waypoint(x=1, y=1)])
+
+        status_code, data = TaskAssignmentController.get_task_for_agv(
+            {"id": agv.id, "status": AGVState.READY}
+        )
+        self.assertEqual(data["id"], task.id)
+        db.session.commit()
+        db.session.expire_all()
+        self.assertEqual(task.status, TaskStatus.IN_PROGRESS)
+        self.assertEqual(task.agv_id, agv.id)
+
+    def test_edf_claim_skips_unnavigatable_tasks(self):
+        agv = create_agv(status=AGVState.READY)
+        task = create_task(waypoints=[create_waypoint(x=1, y=1)])
+        task_index.sync(task)
+        # more tasks without waypoints than EDF retrieves candidates, all of them more urgent
+        for _ in range(NEAREST_TASK_CANDIDATES + 1):
+            unnavigatable_task = create_task()
+            unnavigatable_task.update(created_at=datetime.utcnow() - timedelta(days=1))
+            task_index.sync(unnavigatable_task)
+
+        claimed_task = TaskAssignmentController._claim_scheduled_task(agv, AgingTaskSchedulerEDF)
+        self.assertEqual(claimed_task.id, task.id)
+
+    def test_concurrent_workers_claim_each_task_once(self):
+        # every worker starts out with the whole backlog in its task index
+        result = run_task_claim_benchmark(num_workers=4, num_agvs=16, num_tasks=200, seed=1)
+        self.assertEqual(result["double_claims"], 0)
+        self.assertEqual(result["claims"], 200)
+        self.assertEqual(result["unclaimed_tasks"], 0)
+
+    def test_workers_claim_tasks_changed_elsewhere(self):
+        # another process creates tasks, deletes some and returns claimed ones to the pool meanwhile
+        result = run_task_claim_benchmark(
+            num_workers=3, num_agvs=6, num_tasks=20, seed=1, num_arrivals=40
+        )
+        self.assertEqual(result["double_claims"], 0)
+        self.assertEqual(result["unclaimed_tasks"], 0)
+        self.assertEqual(result["claims"], 20 + 40 - result["deleted"] + result["released"])
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
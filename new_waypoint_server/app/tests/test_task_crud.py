@@ -1,10 +1,18 @@
 import sys
+from datetime import datetime
 
+from app.agvs.constants import AGVState
 from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.config import ConfigType
 from app.database import db
 from app.tasks.constants import Priority, TaskStatus
-from app.tests.utils import create_task, create_waypoint
+from app.tasks.index import task_index
+from app.tasks.models import Task, Waypoint
+from app.tasks.reservations import task_reservations
+from app.tests.utils import create_agv, create_command, create_task, create_waypoint
 from flask_api import status
 from flask_testing import TestCase
 
@@ -36,6 +44,102 @@ class TestAGVCrud(TestCase):
         for key in expected_response.keys():
             self.assertEqual(response_data[key], expected_response[key])
 
+    def test_create_task_stores_path_metrics(self):
+        payload = {
+            "waypoints": [
+                {"x": 4, "y": 5, "order": 2},
+                {"x": 1, "y": 1, "order": 0},
+                {"x": 4, "y": 1, "order": 1},
+            ],
+        }
+        response = self.client.post(f"{self.base_url}", json=payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        task = Task.query.filter_by(id=response.get_json()["id"]).first()
+        self.assertEqual(task.num_waypoints, 3)
+        self.assertEqual((task.start_x, task.start_y), (1, 1))
+        self.assertAlmostEqual(task.path_dist_lower_bound, 7.0)
+        self.assertAlmostEqual(task.total_path_dist_lower_bound(1, 5), 11.0)
+
+    def test_create_task_optimizes_waypoint_order(self):
+        payload = {
+            "optimize_order": True,
+            "fix_first_waypoint": True,
+            "waypoints": [{"x": 0, "y": 0}, {"x": 3, "y": 0}, {"x": 1, "y": 0}, {"x": 2, "y": 0}],
+        }
+        response = self.client.post(f"{self.base_url}", json=payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        task = Task.query.filter_by(id=response.get_json()["id"]).first()
+        waypoints = Waypoint.query.filter_by(task_id=task.id).order_by(Waypoint.order.asc())
+        self.assertEqual([waypoint.x for waypoint in waypoints], [0, 1, 2, 3])
+        self.assertAlmostEqual(task.path_dist_lower_bound, 3.0)
+
+        payload["optimize_order"] = "yes"
+        response = self.client.post(f"{self.base_url}", json=payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # routes too long to optimize within the time budget are rejected
+        self.app.config["ROUTE_OPTIMIZATION_MAX_WAYPOINTS"] = 3
+        payload["optimize_order"] = True
+        response = self.client.post(f"{self.base_url}", json=payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.get_json(), {"error": "optimize_order supports at most 3 waypoints"}
+        )
+
+    def test_create_task_packed_route(self):
+        self.app.config["PACKED_ROUTE_MIN_WAYPOINTS"] = 3
+        payload = {
+            "waypoints": [
+                {"x": 4, "y": 5, "order": 2},
+                {"x": 1, "y": 1, "order": 0},
+                {"x": 4, "y": 1, "theta": 0.5, "order": 1},
+            ],
+        }
+        response = self.client.post(f"{self.base_url}", json=payload)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            response.get_json()["waypoints"],
+            [
+                {"id": None, "x": 1.0, "y": 1.0, "theta": 0.0, "order": 0, "visited": False},
+                {"id": None, "x": 4.0, "y": 1.0, "theta": 0.5, "order": 1, "visited": False},
+                {"id": None, "x": 4.0, "y": 5.0, "theta": 0.0, "order": 2, "visited": False},
+            ],
+        )
+
+        db.session.expire_all()
+        task = Task.query.filter_by(id=response.get_json()["id"]).first()
+        self.assertEqual(Waypoint.query.filter_by(task_id=task.id).count(), 0)
+        self.assertEqual((task.num_waypoints, task.start_x, task.start_y), (3, 1, 1))
+        self.assertAlmostEqual(task.path_dist_lower_bound, 7.0)
+        # the route is read in place from the stored bytes
+        route = task.route_array()
+        self.assertFalse(route.flags.owndata)
+        self.assertEqual(route["order"].tolist(), [0, 1, 2])
+
+        task.visit_waypoints_before(2)
+        response = self.client.get(f"{self.base_url}{task.id}/")
+        self.assertEqual(
+            [waypoint["visited"] for waypoint in response.get_json()["waypoints"]],
+            [True, True, False],
+        )
+
+        valid_waypoints = [{"x": 1, "y": 1, "order": 0}, {"x": 1, "y": 1, "order": 1}]
+        invalid_waypoints = [
+            {"x": 1, "y": 1},
+            {"x": 1, "y": 1, "order": 1},
+            {"x": 100, "y": 1, "order": 2},
+            {"x": "a", "y": 1, "order": 2},
+            {"x": 1, "y": 1, "order": 2.5},
+            {"x": 1, "y": 1, "theta": 4, "order": 2},
+        ]
+        for invalid_waypoint in invalid_waypoints:
+            payload = {"waypoints": valid_waypoints + [invalid_waypoint]}
+            response = self.client.post(f"{self.base_url}", json=payload)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Task.query.count(), 1)
+
     def test_task_creation_validation(self):
         # Test Task creation fails when you provide it an empty task!
         payload = {
@@ -92,6 +196,17 @@ class TestAGVCrud(TestCase):
         for key in task_params.keys():
             self.assertEqual(str(response_data[key]), str(task_params[key]))
 
+    def test_create_task_rejects_update_time(self):
+        # other server processes look changed tasks up by their update time, it is never user input
+        payload = {
+            "updated_at": "2026-01-01T00:00:00",
+            "waypoints": [{"x": 1, "y": 1, "order": 1}],
+        }
+        response = self.client.post(self.base_url, json=payload)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("updated_at", response.get_json())
+        self.assertEqual(Task.query.count(), 0)
+
     def test_delete_single_task(self):
         # Test that our request is rejected for attempting to delete a task that doesn't exist
         waypoint_params = {"x": 1, "y": 1, "order": 1}
@@ -112,6 +227,8 @@ class TestAGVCrud(TestCase):
         # Test that our request to delete a singular task is accepted under the right conditions
         response = self.client.delete(f"{self.base_url}{task.id}/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Task.query.count(), 0)
+        self.assertEqual(Waypoint.query.count(), 0)
 
     def test_list_tasks(self):
         task_params_list = [
@@ -165,6 +282,74 @@ class TestAGVCrud(TestCase):
         response_data = response.get_json()
         self.assertEqual(response_data, [])
 
+    def test_delete_filtered_tasks(self):
+        self.app.config["BULK_DELETE_CHUNK_SIZE"] = 2
+        complete_task_ids = [
+            create_task(
+                status=TaskStatus.COMPLETE,
+                waypoints=[create_waypoint(order=0), create_waypoint(order=1)],
+            ).id
+            for i in range(3)
+        ]
+        old_task = create_task(priority=Priority.HIGH, waypoints=[create_waypoint()])
+        old_task.update(created_at=datetime(2026, 1, 1))
+        task = create_task(priority=Priority.HIGH, waypoints=[create_waypoint()])
+        db.session.commit()
+
+        response = self.client.delete(f"{self.base_url}tasks/", query_string={"status": "DONE"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.delete(
+            f"{self.base_url}tasks/", query_string={"created_before": "yesterday"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # the waypoints of deleted tasks are deleted along with them
+        response = self.client.delete(f"{self.base_url}tasks/", query_string={"status": "COMPLETE"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.get_json(),
+            {
+                "message": "Tasks successfully deleted",
+                "num_deleted": 3,
+                "num_waypoints_deleted": 6,
+                "num_agvs_released": 0,
+            },
+        )
+        self.assertEqual(Waypoint.query.filter(Waypoint.task_id.in_(complete_task_ids)).count(), 0)
+
+        filter_params = {"priority": "HIGH", "created_before": "2026-01-02T00:00:00Z"}
+        response = self.client.delete(f"{self.base_url}tasks/", query_string=filter_params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["num_deleted"], 1)
+        self.assertEqual([remaining.id for remaining in Task.query.all()], [task.id])
+        self.assertEqual(task_index.task_ids(), [task.id])
+
+        response = self.client.delete(f"{self.base_url}tasks/", query_string=filter_params)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.get_json()["message"], "No Tasks match the filters")
+
+    def test_delete_in_progress_tasks(self):
+        task = create_task(priority=Priority.HIGH, waypoints=[create_waypoint()])
+        agv = create_agv(status=AGVState.BUSY, current_task_id=task.id)
+        task.update(status=TaskStatus.IN_PROGRESS, agv_id=agv.id)
+        command_id = create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK).id
+        # the next task of another BUSY AGV is reserved
+        reserved_task = create_task(priority=Priority.HIGH, waypoints=[create_waypoint()])
+        other_agv = create_agv(status=AGVState.BUSY)
+        task_reservations.reserve(other_agv.id, reserved_task.id, ttl=60)
+        db.session.commit()
+
+        response = self.client.delete(f"{self.base_url}tasks/", query_string={"priority": "HIGH"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["num_agvs_released"], 1)
+        # the AGV no longer executes a task that does not exist, nor is it sent its commands
+        self.assertEqual((agv.status, agv.current_task_id), (AGVState.READY, None))
+        self.assertIsNone(Command.query.filter_by(id=command_id).first())
+        self.assertNotIn(command_id, command_queues)
+        self.assertNotIn(other_agv.id, task_reservations)
+
     def tearDown(self):
+        task_reservations.clear()
+        command_queues.clear()
         db.session.remove()
         db.drop_all()
@@ -0,0 +1,137 @@
+import json
+import tempfile
+from datetime import datetime
+
+from app.agvs.constants import AGVDriveTrainType
+from app.app import create_app
+from app.config import ConfigType
+from app.database import db
+from app.tasks import bulk_import
+from app.tasks.constants import Priority, TaskStatus
+from app.tasks.index import task_index
+from app.tasks.models import Task, Waypoint
+from app.tests.utils import create_agv
+from flask_api import status
+from flask_testing import TestCase
+
+
+class TestTaskImport(TestCase):
+    base_url = "tasks/import/"
+
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        task_index.clear()
+
+    def _import(self, data):
+        response = self.client.post(self.base_url, data=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.get_json()
+
+    def test_import_ndjson(self):
+        self.app.config["TASK_IMPORT_CHUNK_SIZE"] = 2
+        agv = create_agv(drive_train_type=AGVDriveTrainType.ACKERMANN)
+        db.session.commit()
+        lines = [
+            json.dumps(
+                {
+                    "priority": "HIGH",
+                    "drive_train_type": "ACKERMANN",
+                    "agv_id": agv.id,
+                    "deadline": "2026-01-01T12:00:00+02:00",
+                    "waypoints": [
+                        {"x": 4, "y": 5, "order": 2},
+                        {"x": 1, "y": 1, "order": 0},
+                        {"x": 4, "y": 1, "theta": 0.5, "order": 1},
+                    ],
+                }
+            ),
+            "",
+            "{not json",
+            json.dumps({"waypoints": [{"x": 1, "y": 1, "order": 0}], "color": "red"}),
+            json.dumps({"agv_id": agv.id + 1, "waypoints": [{"x": 1, "y": 1, "order": 0}]}),
+            json.dumps({"priority": "URGENT", "waypoints": [{"x": 1, "y": 1, "order": 0}]}),
+            json.dumps({"waypoints": [{"x": 100, "y": 1, "order": 0}]}),
+            json.dumps({"waypoints": [{"x": 1, "y": 1, "order": 0}, {"x": 2, "y": 1, "order": 0}]}),
+            json.dumps({"waypoints": []}),
+            json.dumps({"waypoints": [{"x": 2, "y": 3, "order": 0}]}),
+        ]
+        response_data = self._import("\n".join(lines).encode())
+        self.assertEqual(response_data["num_created"], 2)
+        self.assertEqual(
+            response_data["errors"],
+            {
+                "3": "Line is not valid JSON",
+                "4": "Unknown field(s): color",
+                "5": "Unable to create task assigned to unregistered AGV",
+                "6": "Invalid priority: URGENT",
+                "7": "X or Y coordinate is out of bounds for the allowable range of navigatable coordinates",
+                "8": "Ordering of waypoints provided invalid - repetition in order detected",
+                "9": "No valid waypoints provided",
+            },
+        )
+
+        db.session.expire_all()
+        task, other_task = Task.query.order_by(Task.id.asc()).all()
+        self.assertEqual((task.priority, task.status), (Priority.HIGH, TaskStatus.INCOMPLETE))
+        self.assertEqual(
+            (task.drive_train_type, task.agv_id), (AGVDriveTrainType.ACKERMANN, agv.id)
+        )
+        self.assertEqual(task.deadline, datetime(2026, 1, 1, 10))
+        self.assertEqual((task.num_waypoints, task.start_x, task.start_y), (3, 1, 1))
+        self.assertAlmostEqual(task.path_dist_lower_bound, 7.0)
+        self.assertEqual(task.last_waypoint_order, 2)
+        waypoints = Waypoint.query.filter_by(task_id=task.id).order_by(Waypoint.order.asc())
+        self.assertEqual(
+            [(waypoint.x, waypoint.y, waypoint.theta) for waypoint in waypoints],
+            [(1, 1, 0), (4, 1, 0.5), (4, 5, 0)],
+        )
+        self.assertEqual((other_task.priority, other_task.num_waypoints), (Priority.MEDIUM, 1))
+        self.assertEqual(sorted(task_index.task_ids()), [task.id, other_task.id])
+
+    def test_import_json_array(self):
+        self.app.config["PACKED_ROUTE_MIN_WAYPOINTS"] = 2
+        tasks = [
+            {"waypoints": [{"x": 1, "y": 1, "order": 1}, {"x": 4, "y": 5, "order": 0}]},
+            {"waypoints": [{"x": 1, "y": 1}]},
+            {"status": "COMPLETE", "waypoints": [{"x": 2, "y": 2, "order": 0}]},
+        ]
+        # elements and numbers split across reads must be decoded as a whole
+        bulk_import.READ_SIZE = 3
+        try:
+            response_data = self._import(f" \n{json.dumps(tasks, indent=2)}\n".encode())
+        finally:
+            bulk_import.READ_SIZE = 65536
+        self.assertEqual(response_data["num_created"], 2)
+        self.assertEqual(response_data["errors"], {"1": "Every waypoint requires x, y and order"})
+
+        db.session.expire_all()
+        packed_task, task = Task.query.order_by(Task.id.asc()).all()
+        self.assertEqual(Waypoint.query.filter_by(task_id=packed_task.id).count(), 0)
+        self.assertEqual(packed_task.route_array()["x"].tolist(), [4, 1])
+        self.assertEqual((task.status, task.route), (TaskStatus.COMPLETE, None))
+        self.assertEqual(Waypoint.query.filter_by(task_id=task.id).count(), 1)
+
+        self.assertEqual(self._import(b"[]"), {"num_created": 0, "errors": {}})
+        self.assertEqual(
+            self._import(b'[{"waypoints": [{"x": 1, "y": 1, "order": 0}]} {}]'),
+            {"num_created": 1, "errors": {"stream": "Expected ',' or ']' after element 0"}},
+        )
+        self.assertEqual(
+            self._import(b'[{"waypoints": [{"x": 1, "y": 1, "order": 0}]},'),
+            {"num_created": 1, "errors": {"stream": "JSON array is not closed"}},
+        )
+
+    def test_import_tasks_command(self):
+        with tempfile.NamedTemporaryFile(suffix=".ndjson") as tasks_file:
+            tasks_file.write(b'{"waypoints": [{"x": 1, "y": 1, "order": 0}]}\n{"waypoints": 1}\n')
+            tasks_file.flush()
+            result = self.app.test_cli_runner(mix_stderr=False).invoke(
+                args=["import-tasks", tasks_file.name]
+            )
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("Imported 1 tasks (1 rejected)", result.stdout)
+        self.assertIn("2: No valid waypoints provided", result.stderr)
+        self.assertEqual(Task.query.count(), 1)
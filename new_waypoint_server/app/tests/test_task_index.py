@@ -0,0 +1,167 @@
+import math
+from datetime import datetime, timedelta
+
+from app.agv_request_handlers.controllers import TaskAssignmentController
+from app.agvs.constants import AGVDriveTrainType, AGVState
+from app.app import create_app, initialize_task_index
+from app.config import ConfigType
+from app.database import db
+from app.tasks.constants import Priority, TaskStatus
+from app.tasks.index import task_index
+from app.tasks.priority_queue import IndexedPriorityQueue
+from app.tasks.spatial_index import SpatialGrid
+from app.tests.utils import create_agv, create_task, create_waypoint
+from flask_testing import TestCase
+
+
+class TestTaskIndex(TestCase):
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        task_index.clear()
+
+    def test_task_index_candidate_buckets(self):
+        agv = create_agv(drive_train_type=AGVDriveTrainType.ACKERMANN)
+        other_agv = create_agv(drive_train_type=AGVDriveTrainType.ACKERMANN)
+        assigned_task = create_task(priority=Priority.LOW, agv_id=agv.id)
+        drive_train_task = create_task(
+            priority=Priority.HIGH, drive_train_type=AGVDriveTrainType.ACKERMANN
+        )
+        general_task = create_task(priority=Priority.HIGH)
+        create_task(priority=Priority.HIGH, drive_train_type=AGVDriveTrainType.MECANUM)
+        create_task(priority=Priority.HIGH, agv_id=other_agv.id)
+        create_task(status=TaskStatus.COMPLETE)
+
+        self.assertEqual(
+            task_index.candidate_ids(agv),
+            {
+                Priority.HIGH: [drive_train_task.id, general_task.id],
+                Priority.LOW: [assigned_task.id],
+            },
+        )
+
+        # tasks leave the index once they are no longer INCOMPLETE
+        general_task.update(status=TaskStatus.IN_PROGRESS)
+        task_index.sync(general_task)
+        self.assertNotIn(general_task.id, task_index)
+        self.assertEqual(task_index.candidate_ids(agv)[Priority.HIGH], [drive_train_task.id])
+
+    def test_task_index_rebuilt_at_startup(self):
+        tasks = [create_task() for i in range(3)]
+        tasks[0].update(status=TaskStatus.COMPLETE)
+        task_index.clear()
+
+        initialize_task_index(self.app)
+        self.assertEqual(sorted(task_index.task_ids()), [tasks[1].id, tasks[2].id])
+
+    def test_retrieve_relavent_tasks_uses_index(self):
+        agv = create_agv(status=AGVState.READY)
+        task = create_task(waypoints=[create_waypoint(x=1, y=1)])
+        stale_task = create_task(waypoints=[create_waypoint(x=2, y=2)])
+        # mimic another worker claiming a task without this process' index being told
+        stale_task.update(status=TaskStatus.IN_PROGRESS)
+
+        tasks = TaskAssignmentController.retrieve_relavent_tasks(agv)
+        self.assertEqual([relavent_task.id for relavent_task in tasks], [task.id])
+        self.assertNotIn(stale_task.id, task_index)
+
+        status_code, data = TaskAssignmentController.get_task_for_agv(
+            {"id": agv.id, "status": AGVState.READY}
+        )
+        self.assertEqual(data["id"], task.id)
+        # the claimed task leaves the index once the claim is committed, as the request would
+        self.assertIn(task.id, task_index)
+        db.session.commit()
+        self.assertNotIn(task.id, task_index)
+
+    def test_spatial_grid_nearest(self):
+        grid = SpatialGrid(cell_size=2)
+        points = {
+            task_id: (x, y, offset)
+            for task_id, (x, y, offset) in enumerate(
+                [(0, 0, 0), (3, 4, 0), (-6, 8, 0), (1, 1, 10), (20, 20, 0), (-1, -1, 0.5)]
+            )
+        }
+        for task_id, (x, y, offset) in points.items():
+            grid.insert(task_id, x, y, offset)
+        grid.insert(len(points), None, None)
+        grid.remove(0)
+
+        expected_costs = sorted(
+            (math.hypot(x - 2, y - 2) + offset, task_id)
+            for task_id, (x, y, offset) in points.items()
+            if task_id != 0
+        )
+        self.assertEqual(grid.nearest(2, 2, k=3), expected_costs[:3])
+        self.assertEqual(grid.nearest(2, 2, k=100), expected_costs)
+        self.assertEqual(len(grid), len(points))
+
+    def test_nearest_candidates_incrementally_updated(self):
+        agv = create_agv(x=0, y=0)
+        near_task = create_task(waypoints=[create_waypoint(x=1, y=1)])
+        far_task = create_task(waypoints=[create_waypoint(x=9, y=9)])
+        create_task(priority=Priority.LOW, waypoints=[create_waypoint(x=0, y=0)])
+
+        nearest = task_index.nearest_candidates(agv, agv.x, agv.y, k=1)
+        self.assertEqual([task_id for cost, task_id in nearest], [near_task.id])
+
+        # claimed tasks leave the spatial index, cancelled tasks return to it
+        near_task.update(status=TaskStatus.IN_PROGRESS)
+        task_index.sync(near_task)
+        nearest = task_index.nearest_candidates(agv, agv.x, agv.y, k=2)
+        self.assertEqual([task_id for cost, task_id in nearest], [far_task.id])
+
+        near_task.update(status=TaskStatus.INCOMPLETE)
+        task_index.sync(near_task)
+        nearest = task_index.nearest_candidates(agv, agv.x, agv.y, k=2)
+        self.assertEqual([task_id for cost, task_id in nearest], [near_task.id, far_task.id])
+        self.assertAlmostEqual(nearest[0][0], near_task.total_path_dist_lower_bound(agv.x, agv.y))
+
+    def test_indexed_priority_queue(self):
+        queue = IndexedPriorityQueue()
+        for item_id, key in enumerate([5, 3, 8, 1, 9, 2]):
+            queue.push(item_id, key)
+        self.assertEqual(queue.smallest(3), [(1, 3), (2, 5), (3, 1)])
+
+        # re-keying and removing keep the heap ordered
+        queue.push(4, 0)
+        queue.remove(3)
+        self.assertEqual(queue.pop(), (0, 4))
+        self.assertEqual([queue.pop() for _ in range(len(queue))], [(2, 5), (3, 1), (5, 0), (8, 2)])
+
+    def test_most_urgent_candidates(self):
+        agv = create_agv()
+        now = datetime.utcnow()
+        new_high_task, aged_low_task, deadline_task = [
+            create_task(priority=priority, waypoints=[create_waypoint(x=1, y=1)])
+            for priority in [Priority.HIGH, Priority.LOW, Priority.LOW]
+        ]
+        # tasks without waypoints are never assignable, however urgent
+        unnavigatable_task = create_task(priority=Priority.LOW)
+        aged_low_task.update(created_at=now - timedelta(hours=1))
+        deadline_task.update(deadline=now - timedelta(minutes=5))
+        unnavigatable_task.update(created_at=now - timedelta(days=1))
+        for task in [new_high_task, aged_low_task, deadline_task, unnavigatable_task]:
+            task_index.sync(task)
+
+        most_urgent = task_index.most_urgent_candidates(agv, k=3)
+        self.assertEqual(
+            [task_id for urgency, task_id in most_urgent],
+            [aged_low_task.id, deadline_task.id, new_high_task.id],
+        )
+
+        aged_low_task.update(status=TaskStatus.IN_PROGRESS)
+        task_index.sync(aged_low_task)
+        most_urgent = task_index.most_urgent_candidates(agv, k=1)
+        self.assertEqual([task_id for urgency, task_id in most_urgent], [deadline_task.id])
+        self.assertIn(unnavigatable_task.id, task_index)
+
+        unnavigatable_task.update(status=TaskStatus.COMPLETE)
+        task_index.sync(unnavigatable_task)
+        self.assertNotIn(unnavigatable_task.id, task_index)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
@@ -1,8 +1,21 @@
-from app.agvs.constants import AGVState
+import json
+import tempfile
+from datetime import datetime, timedelta
+
+import numpy as np
+from app.agvs.constants import AGVDriveTrainType, AGVState
 from app.app import create_app
 from app.config import ConfigType
 from app.database import db
-from app.task_scheduler.scheduler import GreedyTaskSchedulerSJF
+from app.task_scheduler.assignment import solve_min_cost_assignment
+from app.task_scheduler.constants import INFEASIBLE_ASSIGNMENT_COST
+from app.task_scheduler.scheduler import (
+    AgingTaskSchedulerEDF,
+    GreedyTaskSchedulerSJF,
+    MinCostMatchingTaskScheduler,
+)
+from app.task_scheduler.scoring import TaskFeatures
+from app.task_scheduler.simulator import FleetSimulator, generate_arrival_trace
 from app.tasks.constants import Priority
 from app.tests.utils import create_agv, create_task, create_waypoint
 from flask_testing import TestCase
@@ -36,8 +49,162 @@ class TestCommandProcessingController(TestCase):
         optimal_task = GreedyTaskSchedulerSJF.generate_optimal_assignment(agv, tasks)
         self.assertEqual(optimal_task.id, high_priority_medium_task.id)
 
+    def test_solve_min_cost_assignment(self):
+        cost_matrix = np.array([[4, 1, 3], [2, 0, 5], [3, 2, 2]])
+        rows, cols = solve_min_cost_assignment(cost_matrix)
+        self.assertEqual(list(rows), [0, 1, 2])
+        self.assertEqual(list(cols), [1, 0, 2])
+
+        # rectangular problems match every row (or column) of the smaller dimension exactly once
+        rows, cols = solve_min_cost_assignment(cost_matrix[:, :2].T)
+        self.assertEqual(list(rows), [0, 1])
+        self.assertEqual(list(cols), [1, 0])
+
+    def _create_fleet_scenario(self):
+        # a greedy (one AGV at a time) assignment sends first_agv to the shared nearest task,
+        # forcing second_agv on a long detour; the globally optimal assignment swaps them
+        self.first_agv = create_agv(status=AGVState.READY, x=3, y=0)
+        self.second_agv = create_agv(status=AGVState.READY, x=5, y=0)
+        self.middle_task = create_task(waypoints=[create_waypoint(x=4, y=0)])
+        self.far_task = create_task(waypoints=[create_waypoint(x=1, y=0)])
+        self.mecanum_task = create_task(
+            priority=Priority.HIGH,
+            drive_train_type=AGVDriveTrainType.MECANUM,
+            waypoints=[create_waypoint(x=3, y=0)],
+        )
+        return [self.first_agv, self.second_agv], [
+            self.middle_task,
+            self.far_task,
+            self.mecanum_task,
+        ]
+
+    def test_min_cost_matching_task_scheduler(self):
+        agvs, tasks = self._create_fleet_scenario()
+
+        greedy_assignments = GreedyTaskSchedulerSJF.generate_optimal_assignments(agvs, tasks)
+        self.assertEqual(greedy_assignments[self.first_agv.id].id, self.middle_task.id)
+        self.assertEqual(greedy_assignments[self.second_agv.id].id, self.far_task.id)
+
+        assignments = MinCostMatchingTaskScheduler.generate_optimal_assignments(agvs, tasks)
+        self.assertEqual(assignments[self.first_agv.id].id, self.far_task.id)
+        self.assertEqual(assignments[self.second_agv.id].id, self.middle_task.id)
+
+    def test_priority_outweighs_long_paths(self):
+        agvs = [create_agv(status=AGVState.READY, x=0, y=0) for i in range(2)]
+        # survey routes longer than any fixed tier cost must still go ahead of shorter LOW tasks
+        high_tasks = [
+            create_task(
+                priority=Priority.HIGH,
+                waypoints=[
+                    create_waypoint(x=0, y=0, order=0),
+                    create_waypoint(x=3e6, y=0, order=1),
+                ],
+            )
+            for i in range(2)
+        ]
+        low_task = create_task(priority=Priority.LOW, waypoints=[create_waypoint(x=1, y=0)])
+        tasks = [low_task] + high_tasks
+
+        task = GreedyTaskSchedulerSJF.generate_optimal_assignment(agvs[0], tasks)
+        self.assertEqual(task.id, high_tasks[0].id)
+        assignments = MinCostMatchingTaskScheduler.generate_optimal_assignments(agvs, tasks)
+        self.assertEqual(
+            {task.id for task in assignments.values()}, {high_task.id for high_task in high_tasks}
+        )
+
+    def test_min_cost_matching_caches_fleet_assignments(self):
+        agvs, tasks = self._create_fleet_scenario()
+        ackermann_tasks = [self.middle_task, self.far_task]
+
+        task = MinCostMatchingTaskScheduler.generate_optimal_assignment(
+            self.first_agv, ackermann_tasks
+        )
+        self.assertEqual(task.id, self.far_task.id)
+        self.assertEqual(
+            MinCostMatchingTaskScheduler._assignment_cache,
+            {self.second_agv.id: self.middle_task.id},
+        )
+
+        # the second AGV pops its precomputed task, leaving the round exhausted
+        task = MinCostMatchingTaskScheduler.generate_optimal_assignment(
+            self.second_agv, [self.middle_task]
+        )
+        self.assertEqual(task.id, self.middle_task.id)
+        self.assertEqual(MinCostMatchingTaskScheduler._assignment_cache, {})
+
+    def test_task_features_cost_matrix(self):
+        agvs, tasks = self._create_fleet_scenario()
+        mecanum_agv = create_agv(
+            status=AGVState.READY, x=0, y=0, drive_train_type=AGVDriveTrainType.MECANUM
+        )
+        unnavigatable_task = create_task()
+        features = TaskFeatures(tasks + [unnavigatable_task])
+
+        cost_matrix = features.cost_matrix(agvs + [mecanum_agv], tier_cost=100)
+        np.testing.assert_allclose(cost_matrix[0, :2], [101, 102])
+        np.testing.assert_allclose(cost_matrix[1, :2], [101, 104])
+        # the MECANUM task is only eligible for the MECANUM AGV, which also sees the general tasks
+        self.assertEqual(cost_matrix[0, 2], INFEASIBLE_ASSIGNMENT_COST)
+        np.testing.assert_allclose(cost_matrix[2, :3], [104, 101, 3])
+        # tasks without waypoints are never assignable
+        self.assertTrue((cost_matrix[:, 3] == INFEASIBLE_ASSIGNMENT_COST).all())
+        np.testing.assert_allclose(features.costs_for_agv(agvs[1], tier_cost=100), cost_matrix[1])
+
+    def test_aging_task_scheduler(self):
+        agv = create_agv(status=AGVState.READY, x=0, y=0)
+        second_agv = create_agv(status=AGVState.READY, x=10, y=0)
+        high_task = create_task(priority=Priority.HIGH, waypoints=[create_waypoint(x=1, y=0)])
+        low_task = create_task(priority=Priority.LOW, waypoints=[create_waypoint(x=9, y=0)])
+        tasks = [high_task, low_task]
+        self.assertEqual(AgingTaskSchedulerEDF.generate_optimal_assignment(agv, tasks), high_task)
+
+        # once the LOW priority task has waited out its allowance it is no longer starved
+        low_task.update(created_at=datetime.utcnow() - timedelta(hours=1))
+        self.assertEqual(AgingTaskSchedulerEDF.generate_optimal_assignment(agv, tasks), low_task)
+
+        # the most urgent task is dispatched to its nearest AGV first
+        assignments = AgingTaskSchedulerEDF.generate_optimal_assignments([agv, second_agv], tasks)
+        self.assertEqual(assignments, {second_agv.id: low_task, agv.id: high_task})
+
+        # deadlines take precedence over aging
+        high_task.update(deadline=datetime.utcnow() - timedelta(hours=2))
+        self.assertEqual(AgingTaskSchedulerEDF.generate_optimal_assignment(agv, tasks), high_task)
+
+    def test_fleet_simulator(self):
+        trace = generate_arrival_trace(np.random.default_rng(3), 1800, 60, fleet_size=3)
+        # the first AGV is stopped for the first 10 minutes, the second has its task cancelled
+        trace += [
+            {"time": 0, "command": "STOP_AGV", "agv_id": 1},
+            {"time": 600, "command": "START_AGV", "agv_id": 1},
+            {"time": 740, "command": "CANCEL_AGV", "agv_id": 2},
+        ]
+        simulator = FleetSimulator([1.0, 1.0, 2.0], trace)
+        metrics = simulator.run(duration=1800)
+
+        self.assertEqual(metrics["tasks_arrived"], len(trace) - 3)
+        self.assertGreater(metrics["tasks_completed"], 0)
+        self.assertLessEqual(metrics["tasks_completed"], metrics["tasks_arrived"])
+        self.assertTrue(0 < metrics["agv_utilization"] <= 1)
+        self.assertGreater(metrics["total_distance"], 0)
+        self.assertLessEqual(metrics["queue_wait_p50_s"], metrics["queue_wait_p99_s"])
+        self.assertFalse(simulator.agvs[1].stopped)
+
+    def test_simulate_fleet_command_without_claims(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as trace_file:
+            json.dump([], trace_file)
+            trace_file.flush()
+            result = self.app.test_cli_runner(mix_stderr=False).invoke(
+                args=["simulate-fleet", "--schedulers", "GREEDY", "--hours", "0.1"]
+                + ["--trace", trace_file.name]
+            )
+        self.assertEqual(result.exit_code, 0, result.stderr)
+        self.assertIn("GREEDY: 0/0 tasks", result.stderr)
+        self.assertIn("wait p50/p99=n/a/n/a", result.stderr)
+        self.assertIsNone(json.loads(result.stdout)["results"][0]["queue_wait_p50_s"])
+
     def setUp(self):
         db.create_all()
+        MinCostMatchingTaskScheduler.clear_assignment_cache()
 
     def tearDown(self):
         db.session.remove()
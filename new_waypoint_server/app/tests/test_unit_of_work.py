@@ -0,0 +1,219 @@
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from app.agvs.constants import AGVState
+from app.app import create_app
+from app.commands.constants import CommandTypes
+from app.commands.queues import command_queues
+from app.config import ConfigType
+from app.database import commit_unit_of_work, db
+from app.tasks.constants import TaskStatus
+from app.tasks.index import task_index
+from app.tasks.models import Task
+from app.tests.utils import create_agv, create_command, create_task, create_waypoint
+from flask import Response
+from flask_api import status
+from flask_testing import TestCase
+from sqlalchemy import event
+
+
+class TestUnitOfWork(TestCase):
+    """Every request is a single transaction, committed once however many rows it changes"""
+
+    base_url = "agv_request_handlers/"
+    num_waypoints = 200
+
+    def create_app(self):
+        return create_app(ConfigType.TESTING)
+
+    def setUp(self):
+        db.create_all()
+        command_queues.clear()
+
+    @contextmanager
+    def _count_statements(self):
+        counts = {"statements": 0, "commits": 0}
+
+        def count_statement(conn, cursor, statement, parameters, context, executemany):
+            counts["statements"] += 1
+
+        def count_commit(conn):
+            counts["commits"] += 1
+
+        event.listen(db.engine, "before_cursor_execute", count_statement)
+        event.listen(db.engine, "commit", count_commit)
+        try:
+            yield counts
+        finally:
+            event.remove(db.engine, "before_cursor_execute", count_statement)
+            event.remove(db.engine, "commit", count_commit)
+
+    def _create_busy_agv(self):
+        agv = create_agv(status=AGVState.BUSY)
+        waypoints = [create_waypoint(order=order) for order in range(self.num_waypoints)]
+        task = create_task(status=TaskStatus.IN_PROGRESS, agv_id=agv.id, waypoints=waypoints)
+        agv.update(current_task_id=task.id, commit=True)
+        return agv, task
+
+    def _post_update(self, agv, agv_status, **data):
+        data = {"id": agv.id, "status": str(agv_status), "x": 1.0, "y": 1.0, "theta": 0.0, **data}
+        return self.client.post(f"{self.base_url}update_state/", json=data)
+
+    def test_done_update(self):
+        agv, task = self._create_busy_agv()
+        with self._count_statements() as counts:
+            response = self._post_update(agv, AGVState.DONE, current_task_id=task.id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(counts["commits"], 1)
+        self.assertLess(counts["statements"], 15)
+
+        db.session.expire_all()
+        self.assertEqual(task.status, TaskStatus.COMPLETE)
+        self.assertTrue(all(waypoint.visited for waypoint in task.waypoints))
+        self.assertIsNone(agv.current_task_id)
+
+    def test_busy_update(self):
+        agv, task = self._create_busy_agv()
+        with self._count_statements() as counts:
+            response = self._post_update(
+                agv, AGVState.BUSY, current_task_id=task.id, current_waypoint_order=100
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(counts["commits"], 1)
+        self.assertLess(counts["statements"], 15)
+
+        db.session.expire_all()
+        self.assertEqual(task.next_waypoint_order, 100)
+
+    def test_cancel_command(self):
+        agv, task = self._create_busy_agv()
+        create_command(task_id=task.id, type=CommandTypes.CANCEL_TASK)
+        with self._count_statements() as counts:
+            response = self._post_update(agv, AGVState.BUSY, current_task_id=task.id)
+        self.assertEqual(response.get_json()["command"]["type"], str(CommandTypes.CANCEL_TASK))
+        self.assertEqual(counts["commits"], 1)
+        self.assertLess(counts["statements"], 15)
+
+        db.session.expire_all()
+        self.assertEqual(task.status, TaskStatus.INCOMPLETE)
+        self.assertFalse(any(waypoint.visited for waypoint in task.waypoints))
+
+    def test_create_task(self):
+        data = {
+            "priority": "HIGH",
+            "waypoints": [
+                {"x": 1.0, "y": 1.0, "theta": 0.0, "order": order}
+                for order in range(self.num_waypoints)
+            ],
+        }
+        with self._count_statements() as counts:
+            response = self.client.post("tasks/", json=data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        # the waypoints are inserted one by one (SQLite does not return the ids of a multi row insert)
+        self.assertEqual(counts["commits"], 1)
+        self.assertLess(counts["statements"], self.num_waypoints + 10)
+        self.assertEqual(Task.query.count(), 1)
+
+    def test_server_error_rolls_back(self):
+        agv = create_agv(status=AGVState.READY)
+        db.session.commit()
+
+        agv.update(x=5.0)
+        commit_unit_of_work(Response(status=status.HTTP_500_INTERNAL_SERVER_ERROR))
+        db.session.expire_all()
+        self.assertEqual(agv.x, 0.0)
+
+        agv.update(x=5.0)
+        commit_unit_of_work(Response(status=status.HTTP_200_OK))
+        db.session.expire_all()
+        self.assertEqual(agv.x, 5.0)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+
+
+class TestCommittedState(TestCase):
+    """
+    Requests served by other threads (on connections of their own) only read committed rows, process-local
+    state is only handed a row once it is committed
+    """
+
+    def create_app(self):
+        self.database_file = tempfile.NamedTemporaryFile(suffix=".db")
+        return create_app(
+            ConfigType.TESTING,
+            {"SQLALCHEMY_DATABASE_URI": f"sqlite:///{self.database_file.name}"},
+        )
+
+    def setUp(self):
+        # rows are only found through process-local state, never by looking them up again
+        self.app.config["COMMAND_QUEUE_SYNC_INTERVAL"] = None
+        self.app.config["TASK_INDEX_REFRESH_INTERVAL"] = None
+        command_queues.clear()
+
+    @contextmanager
+    def _slow_commits(self, delay=0.2):
+        # requests served meanwhile by other threads act on whatever the slow commit's request changed
+        def delay_commit(session):
+            time.sleep(delay)
+
+        session = db.session()
+        event.listen(session, "before_commit", delay_commit)
+        try:
+            yield
+        finally:
+            event.remove(session, "before_commit", delay_commit)
+
+    def _in_thread(self, request, *args, delay=0, **kwargs):
+        responses = []
+
+        def send_request():
+            time.sleep(delay)
+            responses.append(request(*args, **kwargs))
+
+        thread = threading.Thread(target=send_request)
+        thread.start()
+        return thread, responses
+
+    def test_created_command_reaches_waiting_agv(self):
+        agv = create_agv(status=AGVState.READY)
+        db.session.commit()
+        url = f"agv_request_handlers/wait_for_command/?id={agv.id}&timeout=5"
+        waiter, responses = self._in_thread(self.client.get, url)
+        time.sleep(0.2)
+
+        with self._slow_commits():
+            response = self.client.post("commands/", data={"agv_id": agv.id, "type": "STOP_AGV"})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        waiter.join()
+        self.assertEqual(responses[0].status_code, status.HTTP_200_OK)
+        self.assertEqual(responses[0].get_json()["command"]["id"], response.get_json()["id"])
+
+    def test_created_task_handed_out(self):
+        agv = create_agv(status=AGVState.READY)
+        db.session.commit()
+        data = {"id": agv.id, "status": str(AGVState.READY), "x": 0.0, "y": 0.0, "theta": 0.0}
+        url = "agv_request_handlers/request_task/"
+
+        # the AGV requests a task while the task is being created
+        with self._slow_commits():
+            requester, _ = self._in_thread(self.client.get, url, json=data, delay=0.1)
+            response = self.client.post(
+                "tasks/", json={"waypoints": [{"x": 1, "y": 1, "order": 0}]}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        requester.join()
+
+        response = self.client.get(url, json=data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.get_json()["id"], Task.query.one().id)
+
+    def tearDown(self):
+        task_index.clear()
+        command_queues.clear()
+        db.session.remove()
+        db.drop_all()
+        self.database_file.close()
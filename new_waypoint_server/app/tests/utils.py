@@ -2,8 +2,10 @@ from app.agvs.constants import AGVDriveTrainType, AGVState
 from app.agvs.models import AGV
 from app.commands.constants import CommandTypes
 from app.commands.models import Command
+from app.commands.queues import command_queues
 from app.database import db
 from app.tasks.constants import Priority, TaskStatus
+from app.tasks.index import task_index
 from app.tasks.models import Task, Waypoint
 
 
@@ -86,6 +88,9 @@ def create_task(priority=None, status=None, agv_id=None, drive_train_type=None,
         for waypoint in waypoints:
             task.waypoints.append(waypoint)
             task.save()
+        task.compute_path_metrics()
+        task.save()
+    task_index.sync(task)
 
     return task
 
@@ -114,7 +119,11 @@ def create_command(agv_id=None, task_id=None, type=None, processed=None):
     if processed is None:
         processed = False
 
-    command = Command(agv_id=agv_id, task_id=task_id, type=type, processed=processed)
+    command = Command(
+        agv_id=agv_id, task_id=task_id, type=CommandTypes(type), processed=processed
+    )
     command.save()
+    if not processed:
+        command_queues.push(command)
 
     return command
@@ -0,0 +1,63 @@
+"""track the progress through a task with a cursor instead of per waypoint visited flags
+
+Revision ID: 3b6f0c9d2e15
+Revises: d81e3f6a2c47
+Create Date: 2026-10-18 21:14:52.608931
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns, existing_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = '3b6f0c9d2e15'
+down_revision = 'd81e3f6a2c47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    task_columns = existing_columns('task')
+    with op.batch_alter_table('task') as batch_op:
+        if 'last_waypoint_order' not in task_columns:
+            batch_op.add_column(sa.Column('last_waypoint_order', sa.Integer(), nullable=True))
+        if 'next_waypoint_order' not in task_columns:
+            batch_op.add_column(sa.Column('next_waypoint_order', sa.Integer(), nullable=True))
+
+    if 'visited' in existing_columns('waypoint'):
+        # the cursor of a task is its first unvisited waypoint (past its final one when every waypoint is visited),
+        # tasks without visited waypoints keep a NULL cursor
+        op.execute(
+            'UPDATE task SET '
+            'last_waypoint_order = (SELECT MAX(w."order") FROM waypoint w WHERE w.task_id = task.id), '
+            'next_waypoint_order = CASE '
+            'WHEN NOT EXISTS (SELECT 1 FROM waypoint w WHERE w.task_id = task.id AND w.visited) THEN NULL '
+            'WHEN EXISTS (SELECT 1 FROM waypoint w WHERE w.task_id = task.id AND NOT w.visited) '
+            'THEN (SELECT MIN(w."order") FROM waypoint w WHERE w.task_id = task.id AND NOT w.visited) '
+            'ELSE (SELECT MAX(w."order") + 1 FROM waypoint w WHERE w.task_id = task.id) END'
+        )
+        if 'ix_waypoint_task_visited_order' in existing_indexes('waypoint'):
+            op.drop_index('ix_waypoint_task_visited_order', table_name='waypoint')
+        with op.batch_alter_table('waypoint') as batch_op:
+            batch_op.drop_column('visited')
+
+    if 'ix_waypoint_task_order' not in existing_indexes('waypoint'):
+        op.create_index('ix_waypoint_task_order', 'waypoint', ['task_id', 'order'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_waypoint_task_order', table_name='waypoint')
+    with op.batch_alter_table('waypoint') as batch_op:
+        batch_op.add_column(sa.Column('visited', sa.Boolean(), nullable=True))
+    op.execute(
+        'UPDATE waypoint SET visited = COALESCE(('
+        'SELECT waypoint."order" < task.next_waypoint_order FROM task WHERE task.id = waypoint.task_id'
+        '), false)'
+    )
+    op.create_index(
+        'ix_waypoint_task_visited_order', 'waypoint', ['task_id', 'visited', 'order'], unique=False
+    )
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('next_waypoint_order')
+        batch_op.drop_column('last_waypoint_order')
@@ -0,0 +1,30 @@
+"""store the waypoints of tasks with many waypoints as a packed route
+
+Revision ID: 6e2d94b0a1f3
+Revises: 3b6f0c9d2e15
+Create Date: 2026-10-18 22:37:06.184512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2d94b0a1f3'
+down_revision = '3b6f0c9d2e15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'route' not in existing_columns('task'):
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('route', sa.LargeBinary(), nullable=True))
+    # existing tasks keep their waypoint rows, only new tasks are created with a packed route
+
+
+def downgrade():
+    # NOTE: the waypoints of packed routes are lost, unpack them into waypoint rows beforehand
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('route')
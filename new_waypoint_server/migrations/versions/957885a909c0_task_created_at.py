@@ -0,0 +1,30 @@
+"""record task creation time
+
+Revision ID: 957885a909c0
+Revises: 95eb3a745324
+Create Date: 2026-10-18 15:21:47.803164
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns
+
+
+# revision identifiers, used by Alembic.
+revision = '957885a909c0'
+down_revision = '95eb3a745324'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'created_at' not in existing_columns('task'):
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+    # the creation time of existing tasks is unknown, they are treated as created at upgrade time
+    op.execute("UPDATE task SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+
+
+def downgrade():
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('created_at')
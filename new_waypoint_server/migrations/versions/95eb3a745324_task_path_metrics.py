@@ -0,0 +1,39 @@
+"""store precomputed path metrics on task
+
+Revision ID: 95eb3a745324
+Revises: f22fe0d57ade
+Create Date: 2026-10-18 13:02:11.417530
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns
+
+
+# revision identifiers, used by Alembic.
+revision = '95eb3a745324'
+down_revision = 'f22fe0d57ade'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    task_columns = existing_columns('task')
+    with op.batch_alter_table('task') as batch_op:
+        if 'num_waypoints' not in task_columns:
+            batch_op.add_column(sa.Column('num_waypoints', sa.Integer(), nullable=False, server_default='0'))
+        if 'path_dist_lower_bound' not in task_columns:
+            batch_op.add_column(sa.Column('path_dist_lower_bound', sa.Float(), nullable=False, server_default='0'))
+        if 'start_x' not in task_columns:
+            batch_op.add_column(sa.Column('start_x', sa.Float(), nullable=True))
+        if 'start_y' not in task_columns:
+            batch_op.add_column(sa.Column('start_y', sa.Float(), nullable=True))
+    # existing rows are populated by running: flask backfill-task-metrics
+
+
+def downgrade():
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('start_y')
+        batch_op.drop_column('start_x')
+        batch_op.drop_column('path_dist_lower_bound')
+        batch_op.drop_column('num_waypoints')
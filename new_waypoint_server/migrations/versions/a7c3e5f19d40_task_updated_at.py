@@ -0,0 +1,32 @@
+"""record the time tasks were last changed at
+
+Revision ID: a7c3e5f19d40
+Revises: 6e2d94b0a1f3
+Create Date: 2026-10-18 10:12:37.406218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns, existing_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e5f19d40'
+down_revision = '6e2d94b0a1f3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'updated_at' not in existing_columns('task'):
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+    # existing tasks are loaded by the task index on startup, they are only looked up again once changed
+    if 'ix_task_updated_at' not in existing_indexes('task'):
+        op.create_index('ix_task_updated_at', 'task', ['updated_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_task_updated_at', table_name='task')
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('updated_at')
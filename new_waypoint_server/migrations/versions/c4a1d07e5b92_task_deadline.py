@@ -0,0 +1,28 @@
+"""add optional task deadline
+
+Revision ID: c4a1d07e5b92
+Revises: 957885a909c0
+Create Date: 2026-10-18 16:40:12.552081
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a1d07e5b92'
+down_revision = '957885a909c0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'deadline' not in existing_columns('task'):
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('deadline', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('task') as batch_op:
+        batch_op.drop_column('deadline')
@@ -0,0 +1,49 @@
+"""add indexes for the hot query paths
+
+Revision ID: d81e3f6a2c47
+Revises: c4a1d07e5b92
+Create Date: 2026-10-18 18:05:41.203317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.core.migrations import existing_columns, existing_indexes
+
+
+# revision identifiers, used by Alembic.
+revision = 'd81e3f6a2c47'
+down_revision = 'c4a1d07e5b92'
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns, partial index condition)
+INDEXES = [
+    ('ix_task_status_priority', 'task', ['status', 'priority'], None),
+    ('ix_task_agv_id', 'task', ['agv_id'], None),
+    ('ix_waypoint_task_visited_order', 'waypoint', ['task_id', 'visited', 'order'], None),
+    ('ix_command_pending_agv', 'command', ['agv_id', 'type'], 'pending'),
+    ('ix_command_pending_task', 'command', ['task_id'], 'pending'),
+]
+
+
+def upgrade():
+    for name, table_name, columns, condition in INDEXES:
+        if name in existing_indexes(table_name):
+            continue
+        # tables created from a later schema may lack the indexed columns (ie - waypoint.visited was dropped)
+        if not set(columns) <= existing_columns(table_name):
+            continue
+        where = {}
+        if condition == 'pending':
+            where = {
+                'sqlite_where': sa.text('processed = 0'),
+                'postgresql_where': sa.text('NOT processed'),
+            }
+        op.create_index(name, table_name, columns, unique=False, **where)
+
+
+def downgrade():
+    for name, table_name, _, _ in reversed(INDEXES):
+        if name in existing_indexes(table_name):
+            op.drop_index(name, table_name=table_name)